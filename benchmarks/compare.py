@@ -0,0 +1,54 @@
+import argparse
+import json
+import sys
+
+
+def _index(report: dict) -> dict[tuple:dict]:
+    return {(r["shape"], r["size"], r["op"]): r for r in report["results"]}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[dict]:
+    # a result regresses when it is more than `threshold` slower than baseline
+    rows = []
+    old = _index(baseline)
+    for key, result in _index(current).items():
+        if key not in old or not old[key]["seconds"]:
+            continue
+        ratio = result["seconds"] / old[key]["seconds"]
+        rows.append(
+            {
+                "shape": key[0],
+                "size": key[1],
+                "op": key[2],
+                "baseline": old[key]["seconds"],
+                "current": result["seconds"],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['shape']:>8} {row['size']:>7} {row['op']:>16} "
+            f"{row['baseline'] * 1e3:10.2f}ms -> {row['current'] * 1e3:10.2f}ms "
+            f"x{row['ratio']:.2f} {flag}"
+        )
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import random
+
+# each generator returns (number of nodes, edges) with edges as (parent, child)
+# index pairs where parent < child, so index order is a topological order
+
+
+def chain(n: int, seed: int = 0) -> tuple[int, list[tuple[int, int]]]:
+    return n, [(i, i + 1) for i in range(n - 1)]
+
+
+def fan_out(n: int, seed: int = 0) -> tuple[int, list[tuple[int, int]]]:
+    return n, [(0, i) for i in range(1, n)]
+
+
+def diamond(n: int, seed: int = 0) -> tuple[int, list[tuple[int, int]]]:
+    # a -> b, a -> c, b -> d, c -> d, with d starting the next diamond
+    edges = []
+    top = 0
+    while top + 3 < n:
+        left, right, bottom = top + 1, top + 2, top + 3
+        edges += [(top, left), (top, right), (left, bottom), (right, bottom)]
+        top = bottom
+    for i in range(top + 1, n):
+        edges.append((top, i))
+    return n, edges
+
+
+def layered(
+    n: int, seed: int = 0, width: int = None, degree: int = 3
+) -> tuple[int, list[tuple[int, int]]]:
+    # every node past the first layer gets 1..degree parents in the layer above
+    rng = random.Random(seed)
+    width = width or max(1, int(n**0.5))
+    edges = []
+    for start in range(width, n, width):
+        previous = range(start - width, start)
+        for child in range(start, min(start + width, n)):
+            k = rng.randint(1, min(degree, len(previous)))
+            edges += [(parent, child) for parent in sorted(rng.sample(previous, k))]
+    return n, edges
+
+
+def tree(
+    n: int, seed: int = 0, branching: int = 2
+) -> tuple[int, list[tuple[int, int]]]:
+    return n, [((i - 1) // branching, i) for i in range(1, n)]
+
+
+GENERATORS = {
+    "chain": chain,
+    "fan_out": fan_out,
+    "diamond": diamond,
+    "layered": layered,
+    "tree": tree,
+}
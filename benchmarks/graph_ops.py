@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+from importlib.metadata import PackageNotFoundError, version
+
+from trellis_dag import DAG, Node
+from trellis_dag.node import set_id_factory
+
+from .generators import GENERATORS
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+
+class NoopNode(Node):
+    __slots__ = ()
+
+    async def execute(self) -> dict:
+        return self.output
+
+
+def build(n: int, edges: list[tuple[int, int]]) -> tuple[DAG, list[Node], dict]:
+    dag = DAG()
+    nodes = [NoopNode(f"n{i}") for i in range(n)]
+    timings = {}
+    start = time.perf_counter()
+    for node in nodes:
+        dag.add_node(node)
+    timings["add_node"] = (time.perf_counter() - start, n)
+    # sources first: a child never has outgoing edges yet when it gets a
+    # parent, so the cycle check in add_edge is O(1) and we time the rest
+    start = time.perf_counter()
+    for parent, child in sorted(edges):
+        dag.add_edge(nodes[parent], nodes[child])
+    timings["add_edge"] = (time.perf_counter() - start, len(edges))
+    return dag, nodes, timings
+
+
+def bench_once(
+    shape: str, size: int, seed: int, remove_sample: int, execute_limit: int
+) -> dict[str:tuple]:
+    n, edges = GENERATORS[shape](size, seed=seed)
+    dag, nodes, timings = build(n, edges)
+
+    start = time.perf_counter()
+    dag._topological_sort()
+    timings["topological_sort"] = (time.perf_counter() - start, 1)
+
+    if n <= execute_limit:
+        start = time.perf_counter()
+        asyncio.run(dag.execute({}))
+        timings["execute"] = (time.perf_counter() - start, 1)
+
+    # remove_node scans every adjacency list, so only a sample is removed
+    victims = random.Random(seed).sample(nodes, min(remove_sample, n))
+    start = time.perf_counter()
+    for node in victims:
+        dag.remove_node(node)
+    timings["remove_node"] = (time.perf_counter() - start, len(victims))
+    return timings
+
+
+def run(
+    shapes: list[str],
+    sizes: list[int],
+    repeat: int = 3,
+    seed: int = 0,
+    remove_sample: int = 100,
+    execute_limit: int = 100000,
+) -> list[dict]:
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            best = {}
+            for _ in range(repeat):
+                gc.collect()
+                timings = bench_once(shape, size, seed, remove_sample, execute_limit)
+                for op, (seconds, ops) in timings.items():
+                    if op not in best or seconds < best[op][0]:
+                        best[op] = (seconds, ops)
+            n, edges = GENERATORS[shape](size, seed=seed)
+            for op, (seconds, ops) in best.items():
+                results.append(
+                    {
+                        "shape": shape,
+                        "size": size,
+                        "edges": len(edges),
+                        "op": op,
+                        "ops": ops,
+                        "seconds": seconds,
+                        "us_per_op": seconds / ops * 1e6 if ops else None,
+                    }
+                )
+            print(
+                f"{shape:>8} {size:>7} "
+                + " ".join(f"{op}={s * 1e3:.1f}ms" for op, (s, _) in best.items()),
+                file=sys.stderr,
+            )
+    return results
+
+
+def metadata(args: argparse.Namespace) -> dict[str:type]:
+    try:
+        trellis_version = version("trellis_dag")
+    except PackageNotFoundError:
+        trellis_version = None
+    return {
+        "benchmark": "graph_ops",
+        "trellis_version": trellis_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "args": vars(args),
+    }
+
+
+def main(argv: list[str] = None) -> dict[str:type]:
+    parser = argparse.ArgumentParser(description="Time DAG graph operations")
+    parser.add_argument("--shapes", nargs="+", choices=list(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--remove-sample", type=int, default=100)
+    parser.add_argument("--execute-limit", type=int, default=100000)
+    parser.add_argument("--ids", choices=["uuid", "counter"], default="uuid")
+    parser.add_argument("--output", "-o", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # benchmarks measure the framework, not the network
+    os.environ.setdefault("DISABLE_TELEMETRY", "1")
+    set_id_factory(args.ids)
+    report = {
+        "meta": metadata(args),
+        "results": run(
+            args.shapes or list(GENERATORS),
+            args.sizes,
+            repeat=args.repeat,
+            seed=args.seed,
+            remove_sample=args.remove_sample,
+            execute_limit=args.execute_limit,
+        ),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
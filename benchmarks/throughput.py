@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from trellis_dag import DAG, LLM, configure_logging
+from trellis_dag.providers import FakeProvider
+from trellis_dag.utils.constants import (
+    CASSETTE_MODES,
+    CASSETTE_TIMINGS,
+    LATENCY_DISTRIBUTIONS,
+)
+
+from .generators import GENERATORS
+from .graph_ops import metadata
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+LAG_INTERVAL = 0.01
+
+
+def _content(output: dict) -> dict:
+    return {"text": output["choices"][0]["message"]["content"]}
+
+
+def dag_factory(
+    shape: str,
+    size: int,
+    provider: FakeProvider,
+    seed: int = 0,
+    retry_delay: float = 0,
+    cassette: tuple[str, str, str] = None,
+):
+    # a DAG holds per-run node state, so concurrent runs each get a fresh one
+    n, edges = GENERATORS[shape](size, seed=seed)
+    parents = {child for _, child in edges}
+
+    def build() -> DAG:
+        dag = DAG()
+        nodes = []
+        for i in range(n):
+            node = LLM(
+                f"llm{i}",
+                provider=provider,
+                retry_delay=retry_delay,
+                rate_limit_delay=retry_delay,
+            )
+            if cassette:
+                node.set_cassette(*cassette)
+            if i in parents:
+                node.set_messages([{"role": "user", "content": "Continue: {text}"}])
+            dag.add_node(node)
+            nodes.append(node)
+        for parent, child in sorted(edges):
+            dag.add_edge(nodes[parent], nodes[child], fn=_content)
+        return dag
+
+    return build
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    if not ordered:
+        return None
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def summarize(values: list[float]) -> dict[str:float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) if ordered else None,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else None,
+    }
+
+
+def peak_rss_bytes() -> int:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class LoopLagMonitor:
+    # how late a short periodic sleep wakes up is how long other callbacks
+    # held the event loop
+    def __init__(self, interval: float = LAG_INTERVAL) -> None:
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class LoadResult:
+    def __init__(self) -> None:
+        self.latencies = []
+        self.failures = 0
+        self.errors = {}
+
+    async def run_once(self, factory) -> None:
+        start = time.perf_counter()
+        try:
+            await factory().execute({})
+        except Exception as e:
+            self.failures += 1
+            name = type(e).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return
+        self.latencies.append(time.perf_counter() - start)
+
+
+async def closed_loop(
+    factory, result: LoadResult, concurrency: int, runs: int, duration: float
+) -> None:
+    # `concurrency` workers each start a new run as soon as theirs finishes
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [runs]
+
+    async def worker() -> None:
+        while remaining[0] > 0 and (deadline is None or time.perf_counter() < deadline):
+            remaining[0] -= 1
+            await result.run_once(factory)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(
+    factory,
+    result: LoadResult,
+    rate: float,
+    runs: int,
+    duration: float,
+    max_outstanding: int,
+    seed: int,
+) -> None:
+    # Poisson arrivals at `rate` runs/sec, independent of how fast runs finish
+    rng = random.Random(seed)
+    tasks = set()
+    started = 0
+    start = time.perf_counter()
+    result.shed = 0
+    while started < runs and (not duration or time.perf_counter() - start < duration):
+        if len(tasks) >= max_outstanding:
+            result.shed += 1
+        else:
+            task = asyncio.ensure_future(result.run_once(factory))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        started += 1
+        await asyncio.sleep(rng.expovariate(rate))
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def run_load(args: argparse.Namespace) -> dict[str:type]:
+    provider = FakeProvider(
+        latency=args.latency,
+        jitter=args.jitter,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    factory = dag_factory(
+        args.shape,
+        args.size,
+        provider,
+        seed=args.seed,
+        retry_delay=args.retry_delay,
+        cassette=(
+            (args.cassette, args.cassette_mode, args.cassette_timing)
+            if args.cassette
+            else None
+        ),
+    )
+    result = LoadResult()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    if args.rate:
+        await open_loop(
+            factory,
+            result,
+            args.rate,
+            args.runs,
+            args.duration,
+            args.max_outstanding,
+            args.seed,
+        )
+    else:
+        await closed_loop(factory, result, args.concurrency, args.runs, args.duration)
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    completed = len(result.latencies)
+    return {
+        "mode": "open" if args.rate else "closed",
+        "elapsed": elapsed,
+        "completed": completed,
+        "failed": result.failures,
+        "errors": result.errors,
+        "shed": getattr(result, "shed", 0),
+        "runs_per_sec": completed / elapsed if elapsed else None,
+        "latency": summarize(result.latencies),
+        "loop_lag": summarize(monitor.lags),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "provider": {
+            "calls": provider.calls,
+            "failures": provider.failures,
+            "rate_limited": provider.rate_limited,
+            "max_in_flight": provider.max_in_flight,
+        },
+    }
+
+
+def main(argv: list[str] = None) -> dict[str:type]:
+    parser = argparse.ArgumentParser(
+        description="Run LLM DAGs on a fake backend under load"
+    )
+    parser.add_argument("--shape", choices=list(GENERATORS), default="diamond")
+    parser.add_argument("--size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument(
+        "--distribution", choices=LATENCY_DISTRIBUTIONS, default="uniform"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="closed loop: runs in flight"
+    )
+    parser.add_argument(
+        "--rate", type=float, help="open loop: arrivals per second instead"
+    )
+    parser.add_argument("--max-outstanding", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--duration", type=float, help="stop starting runs after this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cassette", help="record to / replay from this file")
+    parser.add_argument("--cassette-mode", choices=CASSETTE_MODES, default="replay")
+    parser.add_argument(
+        "--cassette-timing", choices=CASSETTE_TIMINGS, default="recorded"
+    )
+    parser.add_argument("--log-level", default="CRITICAL")
+    parser.add_argument("--output", "-o", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # benchmarks measure the framework, not the network
+    os.environ.setdefault("DISABLE_TELEMETRY", "1")
+    # injected errors would otherwise log a retry warning each
+    configure_logging(args.log_level)
+
+    meta = metadata(args)
+    meta["benchmark"] = "throughput"
+    report = {"meta": meta, "results": asyncio.run(run_load(args))}
+    results = report["results"]
+    print(
+        f"{results['completed']} runs ({results['failed']} failed) "
+        f"{results['runs_per_sec']:.1f} runs/s "
+        f"p50={results['latency']['p50']} p99={results['latency']['p99']} "
+        f"lag p99={results['loop_lag']['p99']}",
+        file=sys.stderr,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,28 @@
-import dotenv
+from importlib import import_module
 
-import logging.config
-from os import getenv
-
-from .node import Node
-from .dag import DAG
-from .llm import LLM
-from .utils.status import Status
+# resolved on first access so `import trellis_dag` stays cheap; LLM pulls in
+# openai only when it's actually used
+_exports = {
+    "Node": ".node",
+    "DAG": ".dag",
+    "LLM": ".llm",
+    "Status": ".utils.status",
+    "configure_logging": ".utils.log",
+    "configure_telemetry": ".utils.analyzer",
+    "configure_tracing": ".utils.tracing",
+}
 
-dotenv.load_dotenv()
+__all__ = list(_exports)
 
 
+def __getattr__(name: str) -> type:
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
-logging_config = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "simple": {"format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"}
-    },
-    "handlers": {
-        "console_info": {
-            "class": "logging.StreamHandler",
-            "level": "DEBUG",
-            "formatter": "simple",
-            "stream": "ext://sys.stdout",
-        },
-        "console_error": {
-            "class": "logging.StreamHandler",
-            "level": "WARNING",
-            "formatter": "simple",
-            "stream": "ext://sys.stderr",
-        },
-    },
-    "root": {"level": "INFO", "handlers": ["console_info", "console_error"]},
-}
 
-logging_config["root"]["level"] = "INFO" if not getenv("LOG_LEVEL") else getenv("LOG_LEVEL")
-logging.config.dictConfig(logging_config)
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,23 +1,190 @@
 import logging
-from asyncio import iscoroutinefunction
+import random
+from logging import DEBUG, INFO
+from asyncio import get_running_loop, iscoroutinefunction
+from collections import deque
+from contextlib import nullcontext
+from functools import partial
 from typing import Callable
+from time import perf_counter
+from uuid import uuid4
 
-from .utils.analyzer import analyzer
-from .node import Node
+from voluptuous import PREVENT_EXTRA
+
+from .utils.analyzer import analyzer, telemetry_enabled
+from .utils.constants import VALIDATION_LEVELS, DEFAULT_VALIDATION_SAMPLE_RATE
+from .node import Node, _identity
+from .utils.log import Payload, log_event
+from .utils.metrics import (
+    IN_FLIGHT_RUNS,
+    NODE_EXECUTIONS,
+    NODE_LATENCY,
+    REGISTRY,
+    RUN_LATENCY,
+    RUNS,
+)
+from .utils.profiling import NodeProfiler
+from .utils.result import RunResult
+from .utils.schema import check_compatible, check_inputs, compile_schema
+from .utils.timing import NodeTiming, payload_size
+from .utils.trace import (
+    NOOP_SPAN,
+    TraceRecorder,
+    get_tracer,
+    recording,
+    span,
+    start_as_current_span,
+    start_span,
+    use_span,
+)
+from .utils.usage import UsageLedger, summarize
+
+
+class _Run:
+    # state of one execute() call, kept off the DAG so runs don't share it
+    __slots__ = (
+        "run_id",
+        "init_source_nodes",
+        "validation",
+        "sample_rate",
+        "usage",
+        "started",
+        "timings",
+        "finished",
+        "spans",
+        "profiler",
+        "profiled",
+        "consumers",
+        "validated",
+        "fed",
+        "seeded",
+        "sizes",
+    )
+
+    def __init__(
+        self, init_source_nodes: dict[str:type], validation: str, sample_rate: float
+    ) -> None:
+        self.run_id = uuid4().hex
+        self.init_source_nodes = init_source_nodes
+        self.validation = validation
+        self.sample_rate = sample_rate
+        self.usage = []
+        self.started = perf_counter()
+        # node id -> open tracing span, only filled while a tracer is set
+        self.spans = {}
+        self.profiler = None
+        # ids of the nodes the profiler picked this run
+        self.profiled = set()
+        # node id -> children that still have to finish, when releasing
+        # intermediates; None keeps every payload until the next run
+        self.consumers = None
+        # nodes whose output was checked against their schema this run
+        self.validated = set()
+        # nodes that got input over an edge this run, and those among them
+        # that already held input (set by hand, or left by an earlier run)
+        # which no edge proof covers
+        self.fed = set()
+        self.seeded = set()
+        # whether to measure payloads, only done when someone reads timings
+        # as they happen or profiles the run
+        self.sizes = False
+        self.timings = {}
+        # node id -> when its output reached its children
+        self.finished = {}
+
+
+_NOT_PROFILED = nullcontext()
+
+# runs currently inside execute(), read when metrics are scraped
+_active_runs = set()
+
+
+def _nodes_in_flight() -> list[tuple[tuple, float]]:
+    return [((), sum(len(r.timings) - len(r.finished) for r in list(_active_runs)))]
+
+
+REGISTRY.collected(
+    "trellis_nodes_in_flight",
+    "Nodes that started but did not finish yet.",
+    "gauge",
+    (),
+    _nodes_in_flight,
+)
+
+
+def _size(value: type) -> int:
+    # entries, not bytes; payload_size would walk the whole value
+    return len(value) if isinstance(value, (dict, list, tuple, str)) else 0
+
+
+def _node_summary(node: Node) -> tuple:
+    return (
+        node.get_id(),
+        node.get_name(),
+        type(node).__name__,
+        node.get_status(),
+        _size(node.input),
+        _size(node.output),
+    )
+
+
+def _added_event(added: list[tuple]) -> dict[str:type]:
+    return {
+        "count": len(added),
+        "nodes": [{"id": node_id, "name": name} for node_id, name in added],
+    }
+
+
+def _execute_event(snapshot: tuple) -> dict[str:type]:
+    nodes, edges, init_source_nodes = snapshot
+    return {
+        "nodes": [
+            {
+                "id": node_id,
+                "name": name,
+                "class": node_class,
+                "status": status,
+                "input_size": input_size,
+                "output_size": output_size,
+            }
+            for node_id, name, node_class, status, input_size, output_size in nodes
+        ],
+        "edges": [list(edge) for edge in edges],
+        "init_source_nodes": list(init_source_nodes),
+    }
 
 
 class DAG:
-    def __init__(self) -> None:
+    def __init__(self, ledger: UsageLedger = None) -> None:
         self.adj = {}
         self.deps = {}
         self.nodes = {}
+        # node id -> [(parent id, edge)], so a child's edges are found without
+        # scanning every parent's adjacency list
+        self._in_edges = {}
+        # node id -> (schemas the verdict was computed from, verdict)
+        self._proofs = {}
+        self.timing_hook = None
+        # (id, name) of nodes added since the last run, reported in one event
+        self._added = []
         self.logger = logging.getLogger(self.__class__.__name__)
+        # shared ledgers let several DAGs report usage in one place
+        self.ledger = ledger if ledger is not None else UsageLedger()
+
+    def get_ledger(self) -> UsageLedger:
+        return self.ledger
 
     def set_logger(self, logger: logging.Logger) -> None:
         if not isinstance(logger, logging.Logger):
             raise ValueError(f"Logger {logger} is not a valid logger")
         self.logger = logger
 
+    def set_timing_hook(self, hook: Callable[[NodeTiming], None]) -> None:
+        if hook is not None and not callable(hook):
+            self.logger.error(f"Timing hook {hook} is not a callable function")
+            raise ValueError(f"Timing hook {hook} is not a callable function")
+        self.timing_hook = hook
+
     def is_node(self, node: Node) -> bool:
         return node and isinstance(node, Node)
 
@@ -32,7 +199,10 @@ class DAG:
         self.nodes[node_id] = node
         self.adj[node_id] = []
         self.deps[node_id] = []
-        self.logger.debug(f"Added node {node} with id {node_id}")
+        self._in_edges[node_id] = []
+        if telemetry_enabled():
+            self._added.append((node_id, node.get_name()))
+        log_event(self.logger, DEBUG, "dag.node.add", id=node_id, name=node.get_name())
 
     def remove_node(self, node: Node) -> None:
         if not self.is_node(node):
@@ -42,6 +212,11 @@ class DAG:
         if node_id not in self.nodes:
             self.logger.error(f"Node with id {node_id} does not exist")
             raise KeyError(f"Node with id {node_id} does not exist")
+        for edge in self.adj[node_id]:
+            child = edge["id"]
+            self._in_edges[child] = [
+                e for e in self._in_edges[child] if e[0] != node_id
+            ]
         for _id in self.adj:
             self.adj[_id] = [n for n in self.adj[_id] if n["id"] != node_id]
         for _id in self.deps:
@@ -50,7 +225,11 @@ class DAG:
         del self.adj[node_id]
         del self.deps[node_id]
         del self.nodes[node_id]
-        self.logger.debug(f"Removed node {node} with id {node_id}")
+        del self._in_edges[node_id]
+        self._proofs.pop(node_id, None)
+        log_event(
+            self.logger, DEBUG, "dag.node.remove", id=node_id, name=node.get_name()
+        )
 
     def get_node(self, node_id: str) -> Node:
         if not node_id or not isinstance(node_id, str):
@@ -80,11 +259,17 @@ class DAG:
         self,
         from_node: Node,
         to_node: Node,
-        fn: Callable[[dict[str:type]], dict[str:type]] = lambda x: x,
+        fn: Callable[[dict[str:type]], dict[str:type]] = _identity,
+        output_s: dict[str:type] = None,
     ) -> None:
         if not self.is_node(from_node) or not self.is_node(to_node):
             self.logger.error(f"{from_node} or {to_node} is not a valid Node object")
             raise ValueError(f"{from_node} or {to_node} is not a valid Node object")
+        if output_s is not None and not (
+            isinstance(output_s, dict) or output_s is dict
+        ):
+            self.logger.error(f"Edge output schema {output_s} is not a valid dict")
+            raise ValueError(f"Edge output schema {output_s} is not a valid dict")
         fnode_id = from_node.get_id()
         tnode_id = to_node.get_id()
         if fnode_id not in self.nodes or tnode_id not in self.nodes:
@@ -102,10 +287,35 @@ class DAG:
             raise ValueError(
                 f"Cannot add edge from {from_node.get_name()} to {to_node.get_name()}; cycle detected"
             )
-        self.adj[fnode_id].append({"fn": fn, "id": tnode_id})
+        edge = {
+            "fn": fn,
+            "id": tnode_id,
+            "output_s": None if output_s is None else compile_schema(output_s),
+        }
+        produced = self._edge_output_spec(from_node, edge)
+        if (
+            produced is not None
+            and check_compatible(
+                produced, to_node._input_s.schema, to_node._input_s.extra
+            )
+            is False
+        ):
+            self.logger.error(
+                f"Edge from {from_node.get_name()} to {to_node.get_name()} produces {produced} which can never match {to_node._input_s.schema}"
+            )
+            raise ValueError(
+                f"Edge from {from_node.get_name()} to {to_node.get_name()} produces {produced} which can never match {to_node._input_s.schema}"
+            )
+        self.adj[fnode_id].append(edge)
         self.deps[tnode_id].append(fnode_id)
-        self.logger.debug(
-            f"Added edge from {fnode_id} to {tnode_id} with function {fn.__name__}"
+        self._in_edges[tnode_id].append((fnode_id, edge))
+        log_event(
+            self.logger,
+            DEBUG,
+            "dag.edge.add",
+            source=fnode_id,
+            target=tnode_id,
+            fn=getattr(fn, "__name__", None),
         )
 
     def remove_edge(self, from_node: Node, to_node: Node) -> None:
@@ -133,25 +343,90 @@ class DAG:
             )
         self.adj[fnode_id] = [n for n in self.adj[fnode_id] if tnode_id != n["id"]]
         self.deps[tnode_id].remove(fnode_id)
-        self.logger.debug(f"Removed edge from {fnode_id} to {tnode_id}")
+        self._in_edges[tnode_id] = [
+            e for e in self._in_edges[tnode_id] if e[0] != fnode_id
+        ]
+        log_event(
+            self.logger, DEBUG, "dag.edge.remove", source=fnode_id, target=tnode_id
+        )
+
+    def _edge_output_spec(self, from_node: Node, edge: dict[str:type]) -> type:
+        # what the edge hands to its child, None when fn's result is unknown
+        if edge["output_s"] is not None:
+            return edge["output_s"].schema
+        if edge["fn"] is _identity:
+            return from_node._output_s.schema
+        return None
+
+    def _input_proven(self, node_id: str) -> bool:
+        node = self.nodes[node_id]
+        edges = self._in_edges[node_id]
+        if not edges or node.pre_execute_hook is not _identity:
+            return False
+        # schemas are interned, so identity tells us when anything changed
+        schemas = [node._input_s]
+        for parent_id, edge in edges:
+            schemas += [self.nodes[parent_id]._output_s, edge]
+        cached = self._proofs.get(node_id)
+        if (
+            cached is not None
+            and len(cached[0]) == len(schemas)
+            and all(a is b for a, b in zip(cached[0], schemas))
+        ):
+            return cached[1]
+        verdict = self._check_node_inputs(node_id) is True
+        self._proofs[node_id] = (schemas, verdict)
+        return verdict
+
+    def _check_node_inputs(self, node_id: str) -> bool:
+        produced = []
+        # a parent validated with extra keys allowed may pass on keys its
+        # schema doesn't list, so it can't prove anything
+        loose = False
+        for parent_id, edge in self._in_edges[node_id]:
+            parent = self.nodes[parent_id]
+            spec = self._edge_output_spec(parent, edge)
+            if spec is None:
+                return None
+            if edge["output_s"] is None and parent._output_s.extra != PREVENT_EXTRA:
+                loose = True
+            produced.append(spec)
+        accepted = self.nodes[node_id]._input_s
+        verdict = check_inputs(produced, accepted.schema, accepted.extra)
+        return None if verdict is True and loose else verdict
+
+    def check_edges(self) -> dict[str:list]:
+        report = {"proven": [], "unproven": [], "incompatible": []}
+        for node_id in self.nodes:
+            if not self.deps[node_id]:
+                continue
+            verdict = self._check_node_inputs(node_id)
+            if verdict is True:
+                report["proven"].append(node_id)
+            elif verdict is False:
+                report["incompatible"].append(node_id)
+            else:
+                report["unproven"].append(node_id)
+        return report
 
     def _topological_sort(self) -> list[str]:
         # Kahn's algorithm
         # https://en.wikipedia.org/wiki/Topological_sorting#Kahn's_algorithm
         L = []
         S = {n for n in self.nodes if not self.deps[n]}
-        deps_copy = self.deps.copy()
+        # count remaining deps instead of popping from self.deps, which is shared
+        in_degree = {n: len(d) for n, d in self.deps.items()}
         while S:
             n = S.pop()
             L.append(n)
             for m in self.adj[n]:
-                deps_copy[m["id"]].remove(n)
-                if not deps_copy[m["id"]]:
+                in_degree[m["id"]] -= 1
+                if not in_degree[m["id"]]:
                     S.add(m["id"])
-        if any(deps_copy.values()):
+        if any(in_degree.values()):
             self.logger.error("Cycle detected")
             raise ValueError("Cycle detected")
-        self.logger.debug(f"Topological sort: {L}")
+        log_event(self.logger, DEBUG, "dag.sort", nodes=len(L), order=Payload(L))
         return L
 
     def _is_valid_topological_order(self, order: list[str]) -> bool:
@@ -167,10 +442,365 @@ class DAG:
 
         return True
 
+    def _plan_batches(self, order: list[str]) -> dict[str : list[str]]:
+        # siblings of the same class with the same parents become ready together,
+        # so any of them that end up with equal batch keys can share one call
+        groups = {}
+        for node_id in order:
+            node = self.nodes[node_id]
+            if type(node).batch_key is Node.batch_key:
+                continue
+            key = (type(node), frozenset(self.deps[node_id]))
+            groups.setdefault(key, []).append(node_id)
+        plan = {}
+        for members in groups.values():
+            if len(members) > 1:
+                for node_id in members:
+                    plan[node_id] = members
+        log_event(
+            self.logger, DEBUG, "dag.batch_plan", groups=len(plan), plan=Payload(plan)
+        )
+        return plan
+
+    def _set_node_execute_args(
+        self, node: Node, init_source_nodes: dict[str:type]
+    ) -> None:
+        node_id = node.get_id()
+        a = (
+            init_source_nodes[node_id].get("args", [])
+            if init_source_nodes.get(node_id, {})
+            else ([] if not node.execute_args["args"] else node.execute_args["args"])
+        )
+        k = (
+            init_source_nodes[node_id].get("kwargs", {})
+            if init_source_nodes.get(node_id, {})
+            else (
+                {} if not node.execute_args["kwargs"] else node.execute_args["kwargs"]
+            )
+        )
+        node.set_execute_args(*a, **k)
+
+    def _should_validate(self, run: _Run, node_id: str, kind: str) -> bool:
+        if run.validation == "full":
+            return True
+        if run.validation == "off":
+            return False
+        if run.validation == "sampled":
+            return random.random() < run.sample_rate
+        # edges-only: check what arrives over an edge, once, at the child
+        return kind == "input" and bool(self.deps[node_id])
+
+    async def _prepare_node(self, node: Node, run: _Run) -> None:
+        node_id = node.get_id()
+        log_event(self.logger, DEBUG, "dag.node.start", id=node_id)
+        timing = run.timings[node_id] = NodeTiming(node_id, node.get_name())
+        node_span = start_span(
+            "node",
+            "node",
+            {
+                "node.id": node_id,
+                "node.name": node.get_name(),
+                "node.class": type(node).__name__,
+            },
+            own_lane=True,
+        )
+        if node_span is not NOOP_SPAN:
+            run.spans[node_id] = node_span
+        if run.profiler is not None and run.profiler.selects(node):
+            run.profiled.add(node_id)
+        start = perf_counter()
+        finished = run.finished
+        timing.queue_wait = start - max(
+            (finished[p] for p in self.deps[node_id] if p in finished),
+            default=run.started,
+        )
+        with span("pre_hook", parent=node_span):
+            if iscoroutinefunction(node._pre_hook):
+                await node._pre_hook()
+            else:
+                node._pre_hook()
+        hooked = perf_counter()
+        timing.pre_hook = hooked - start
+        if run.sizes:
+            timing.input_bytes = payload_size(node.input)
+        if not self._should_validate(run, node_id, "input"):
+            return
+        # a proof only holds if every parent's output was actually validated
+        # and the edges are all the input there is
+        validated = run.validated
+        if (
+            node_id not in run.seeded
+            and all(p in validated for p in self.deps[node_id])
+            and self._input_proven(node_id)
+        ):
+            return
+        with span("validate_input", parent=node_span):
+            flag = node.validate_input()
+        timing.validate_input = perf_counter() - hooked
+        if flag is False:
+            self.logger.error(
+                f"Node {node_id} input {node.input} is not valid for schema {node._input_s}"
+            )
+            raise ValueError(
+                f"Node {node_id} input {node.input} is not valid for schema {node._input_s}"
+            )
+
+    async def _run_node(self, node: Node) -> None:
+        if iscoroutinefunction(node.execute):
+            await node.execute()
+        else:
+            node.execute()
+
+    async def _finish_node(self, node: Node, run: _Run) -> None:
+        node_id = node.get_id()
+        timing = run.timings[node_id]
+        node_span = run.spans.get(node_id, NOOP_SPAN)
+        start = perf_counter()
+        with span("post_hook", parent=node_span):
+            if iscoroutinefunction(node._post_hook):
+                await node._post_hook()
+            else:
+                node._post_hook()
+        hooked = perf_counter()
+        timing.post_hook = hooked - start
+        if self._should_validate(run, node_id, "output"):
+            with span("validate_output", parent=node_span):
+                flag = node.validate_output()
+            if flag is not False:
+                run.validated.add(node_id)
+        else:
+            flag = None
+        validated = perf_counter()
+        timing.validate_output = validated - hooked
+        if flag is False:
+            self.logger.error(
+                f"Node {node_id} output {node.output} is not valid for schema {node._output_s}"
+            )
+            raise ValueError(
+                f"Node {node_id} output {node.output} is not valid for schema {node._output_s}"
+            )
+        log_event(self.logger, DEBUG, "dag.node.success", id=node_id)
+        with span(
+            "propagate", parent=node_span, children=len(self.adj[node_id])
+        ), self._profiled(run, node, "propagate"):
+            fed = run.fed
+            for edge in self.adj[node_id]:
+                child_id = edge["id"]
+                child = self.nodes[child_id]
+                if child_id not in fed:
+                    fed.add(child_id)
+                    if child.input:
+                        run.seeded.add(child_id)
+                with span("edge", parent=node_span, to=child_id):
+                    child.set_input(edge["fn"](node.get_output()), wipe=False)
+        finished = run.finished[node_id] = perf_counter()
+        timing.propagate = finished - validated
+        if run.sizes:
+            timing.output_bytes = payload_size(node.output)
+        if run.consumers is not None:
+            self._release(node, run)
+        log_event(
+            self.logger,
+            DEBUG,
+            "dag.node.propagate",
+            id=node_id,
+            children=len(self.adj[node_id]),
+        )
+        if run.spans.pop(node_id, None) is not None:
+            node_span.set_attribute("node.status", node.get_status())
+            node_span.set_status("OK")
+            node_span.end()
+        if self.timing_hook is not None:
+            if iscoroutinefunction(self.timing_hook):
+                await self.timing_hook(timing)
+            else:
+                self.timing_hook(timing)
+
+    def _release(self, node: Node, run: _Run) -> None:
+        # the node's input was merged from its parents' outputs and it's done
+        # with it; a parent's output goes once its last child has finished.
+        # Leaves keep their outputs, they are the run's result, and roots
+        # keep their input, the application set it and the next run needs it
+        in_edges = self._in_edges[node.get_id()]
+        if in_edges:
+            node.release_input()
+        consumers = run.consumers
+        for parent_id, _ in in_edges:
+            left = consumers.get(parent_id, 0) - 1
+            if left > 0:
+                consumers[parent_id] = left
+            elif parent_id in consumers:
+                del consumers[parent_id]
+                self.nodes[parent_id].release_output()
+                log_event(self.logger, DEBUG, "dag.node.release", id=parent_id)
+
+    def _record_usage(self, node: Node, run: _Run) -> None:
+        usage = node.get_usage()
+        if usage:
+            node_span = run.spans.get(node.get_id())
+            if node_span is not None:
+                node_span.set_attributes(
+                    {
+                        "llm.model": usage["model"],
+                        "llm.usage.prompt_tokens": usage["prompt_tokens"],
+                        "llm.usage.completion_tokens": usage["completion_tokens"],
+                        "llm.usage.total_tokens": usage["total_tokens"],
+                    }
+                )
+            run.usage.append(
+                self.ledger.record(
+                    node.get_id(),
+                    usage["model"],
+                    usage,
+                    run_id=run.run_id,
+                    node_name=node.get_name(),
+                )
+            )
+
+    def _profiled(self, run: _Run, node: Node, phase: str):
+        if run.profiler is None or node.get_id() not in run.profiled:
+            return _NOT_PROFILED
+        return run.profiler.measure(node, phase)
+
+    def _record_metrics(self, run: _Run) -> None:
+        # per-node metrics are folded in once per run, a few calls instead of
+        # several per node
+        counts = {}
+        latencies = {}
+        for node_id, timing in run.timings.items():
+            node = self.nodes.get(node_id)
+            if node is None:
+                continue
+            node_class = type(node).__name__
+            key = (node_class, node.get_status())
+            counts[key] = counts.get(key, 0) + 1
+            if node_id in run.finished:
+                latencies.setdefault(node_class, []).append(
+                    timing.total - timing.queue_wait
+                )
+        for (node_class, status), count in counts.items():
+            NODE_EXECUTIONS.inc(count, node_class=node_class, status=status)
+        for node_class, values in latencies.items():
+            NODE_LATENCY.observe_many(values, node_class=node_class)
+
+    async def _execute_group(self, node_ids: list[str], run: _Run) -> None:
+        nodes = [self.nodes[node_id] for node_id in node_ids]
+        current = None
+        try:
+            for node in nodes:
+                current = node
+                self._set_node_execute_args(node, run.init_source_nodes)
+                await self._prepare_node(node, run)
+            current = None
+            batches = {}
+            for node in nodes:
+                key = node.batch_key() if len(nodes) > 1 else None
+                batches.setdefault(key if key is not None else id(node), []).append(
+                    node
+                )
+            for batch in batches.values():
+                start = perf_counter()
+                if len(batch) > 1:
+                    log_event(
+                        self.logger,
+                        INFO,
+                        "dag.batch",
+                        size=len(batch),
+                        nodes=Payload(batch),
+                    )
+                    # spans of the shared call go under the first member's
+                    leader = run.spans.get(batch[0].get_id(), NOOP_SPAN)
+                    for node in batch:
+                        run.spans.get(node.get_id(), NOOP_SPAN).set_attributes(
+                            {
+                                "node.batch_size": len(batch),
+                                "node.batch_leader": batch[0].get_id(),
+                            }
+                        )
+                    with use_span(leader), span(
+                        "execute_batch", size=len(batch)
+                    ), self._profiled(run, batch[0], "execute"):
+                        await type(batch[0]).execute_batch(batch)
+                else:
+                    current = batch[0]
+                    with use_span(run.spans.get(current.get_id(), NOOP_SPAN)), span(
+                        "execute"
+                    ), self._profiled(run, current, "execute"):
+                        await self._run_node(current)
+                    current = None
+                # a batch is one call, each member is charged all of it
+                elapsed = perf_counter() - start
+                for node in batch:
+                    timing = run.timings[node.get_id()]
+                    timing.execute = elapsed
+                    timing.batch_size = len(batch)
+            for node in nodes:
+                self._record_usage(node, run)
+            for node in nodes:
+                current = node
+                await self._finish_node(node, run)
+        except Exception as e:
+            # siblings that already started cannot finish without the failed node
+            for node in nodes:
+                if node is current or node.get_status() == "EXECUTING":
+                    node.set_status("FAILED")
+            for node in nodes:
+                node_span = run.spans.pop(node.get_id(), None)
+                if node_span is None:
+                    continue
+                node_span.set_attribute("node.status", node.get_status())
+                if node_span.status == "UNSET":
+                    node_span.set_status("ERROR", f"{type(e).__name__}: {e}")
+                    node_span.set_attribute("error.type", type(e).__name__)
+                    node_span.record_exception(e)
+                node_span.end()
+            self.logger.error(f"Node {(current or nodes[0]).get_id()} failed: {e}")
+            raise e
+
+    async def _export_trace(self, recorder: TraceRecorder, trace_path: str) -> None:
+        # file and exporter I/O stays off the event loop; the Chrome trace is
+        # written on failure too, that's when a timeline helps most
+        loop = get_running_loop()
+        if recorder is not None:
+            await loop.run_in_executor(None, recorder.write, trace_path)
+            log_event(
+                self.logger, INFO, "dag.trace", path=trace_path, events=len(recorder)
+            )
+        tracer = get_tracer()
+        if tracer is not None and tracer.pending():
+            await loop.run_in_executor(None, tracer.flush)
+
+    async def _schedule(
+        self, order: deque, batch_plan: dict[str : list[str]], run: _Run
+    ) -> None:
+        done = set()
+        while order:
+            node_id = order.popleft()
+            if node_id in done:
+                continue
+            node = self.nodes[node_id]
+            if node.get_status() == "EXECUTING":
+                order.append(node_id)
+                log_event(self.logger, DEBUG, "dag.node.requeue", id=node_id)
+            else:
+                group = [
+                    n
+                    for n in batch_plan.get(node_id, [node_id])
+                    if n not in done and self.nodes[n].get_status() != "EXECUTING"
+                ]
+                await self._execute_group(group, run)
+                done.update(group)
+
     async def execute(
         self,
         init_source_nodes: dict[str:type],
-    ) -> dict[str:type]:
+        batch_siblings: bool = True,
+        validation: str = "full",
+        sample_rate: float = DEFAULT_VALIDATION_SAMPLE_RATE,
+        trace_path: str = None,
+        profile: NodeProfiler = None,
+        release_intermediates: bool = False,
+    ) -> RunResult:
         if not isinstance(init_source_nodes, dict):
             self.logger.error(f"{init_source_nodes} is not a valid dict")
             raise ValueError("Please provide a valid dict of source nodes")
@@ -181,88 +811,88 @@ class DAG:
             if not isinstance(args_kwargs, dict):
                 self.logger.error(f"Node {k} input {args_kwargs} is not a valid dict")
                 raise ValueError(f"Node {k} input {args_kwargs} is not a valid dict")
-        order = self._topological_sort()
-        self.logger.info("Executing DAG")
-        while order:
-            node_id = order.pop(0)
-            node = self.nodes[node_id]
-            if node.get_status() == "EXECUTING":
-                order.append(node_id)
-                self.logger.info(
-                    f"Node {node_id} is already executing, moving to end of queue"
-                )
-            else:
-                try:
-                    a = (
-                        init_source_nodes[node_id].get("args", [])
-                        if init_source_nodes.get(node_id, {})
-                        else (
-                            []
-                            if not node.execute_args["args"]
-                            else node.execute_args["args"]
-                        )
-                    )
-                    k = (
-                        init_source_nodes[node_id].get("kwargs", {})
-                        if init_source_nodes.get(node_id, {})
-                        else (
-                            {}
-                            if not node.execute_args["kwargs"]
-                            else node.execute_args["kwargs"]
-                        )
-                    )
-                    node.set_execute_args(*a, **k)
-                    self.logger.info(f"Executing node {node_id}")
-                    if iscoroutinefunction(node._pre_hook):
-                        await node._pre_hook()
-                    else:
-                        node._pre_hook()
-                    flag = node.validate_input()
-                    if flag is False:
-                        self.logger.error(
-                            f"Node {node_id} input {node.input} is not valid for schema {node._input_s}"
-                        )
-                        raise ValueError(
-                            f"Node {node_id} input {node.input} is not valid for schema {node._input_s}"
-                        )
-                    if iscoroutinefunction(node.execute):
-                        await node.execute()
-                    else:
-                        node.execute()
-                    if iscoroutinefunction(node._post_hook):
-                        await node._post_hook()
-                    else:
-                        node._post_hook()
-                    flag = node.validate_output()
-                    if flag is False:
-                        self.logger.error(
-                            f"Node {node_id} output {node.output} is not valid for schema {node._output_s}"
-                        )
-                        raise ValueError(
-                            f"Node {node_id} output {node.output} is not valid for schema {node._output_s}"
-                        )
-                    self.logger.info(f"Node {node_id} executed successfully")
-                    for edge in self.adj[node_id]:
-                        self.nodes[edge["id"]].set_input(
-                            edge["fn"](node.get_output()), wipe=False
-                        )
-                    self.logger.info(
-                        f"Node {node_id} output propagated to children successfully"
-                    )
-                except Exception as e:
-                    node.set_status("FAILED")
-                    self.logger.error(f"Node {node_id} failed: {e}")
-                    raise e
-
-        analyzer(
-            "dag/execute",
-            {
-                "nodes": [v.to_dict() for _, v in self.nodes.items()],
-                "adj": str(self.adj),
-                "deps": str(self.deps),
-                "init_source_nodes": init_source_nodes,
-            },
+        if validation not in VALIDATION_LEVELS:
+            self.logger.error(f"Validation level {validation} is not valid")
+            raise ValueError(f"Validation level {validation} is not valid")
+        if not 0 <= sample_rate <= 1:
+            self.logger.error(f"Sample rate {sample_rate} is not between 0 and 1")
+            raise ValueError(f"Sample rate {sample_rate} is not between 0 and 1")
+        if profile is not None and not isinstance(profile, NodeProfiler):
+            self.logger.error(f"{profile} is not a valid NodeProfiler")
+            raise ValueError(f"{profile} is not a valid NodeProfiler")
+        order = deque(self._topological_sort())
+        batch_plan = self._plan_batches(order) if batch_siblings else {}
+        run = _Run(init_source_nodes, validation, sample_rate)
+        run.sizes = self.timing_hook is not None or profile is not None
+        if self._added:
+            added, self._added = self._added, []
+            analyzer("dag/nodes_added", partial(_added_event, added))
+        log_event(
+            self.logger, INFO, "dag.run.start", run_id=run.run_id, validation=validation
+        )
+        IN_FLIGHT_RUNS.inc()
+        _active_runs.add(run)
+        status = "FAILED"
+        if profile is not None:
+            run.profiler = profile
+            profile.start_run()
+        if release_intermediates:
+            run.consumers = {
+                node_id: len(children)
+                for node_id, children in self.adj.items()
+                if children
+            }
+        recorder = (
+            TraceRecorder(f"DAG run {run.run_id}") if trace_path is not None else None
         )
+        try:
+            with recording(recorder), start_as_current_span(
+                "dag.run",
+                "dag",
+                {
+                    "dag.run_id": run.run_id,
+                    "dag.nodes": len(self.nodes),
+                    "dag.validation": validation,
+                },
+            ) as run_span:
+                await self._schedule(order, batch_plan, run)
+                run_span.set_status("OK")
+            status = "SUCCESS"
+        finally:
+            await self._export_trace(recorder, trace_path)
+            if profile is not None:
+                profile.stop_run()
+            _active_runs.discard(run)
+            IN_FLIGHT_RUNS.dec()
+            RUNS.inc(status=status)
+            RUN_LATENCY.observe(perf_counter() - run.started)
+            self._record_metrics(run)
+
+        if telemetry_enabled():
+            # the flusher thread only ever sees this frozen summary, nodes and
+            # edges can change (or be released) while the event is queued
+            snapshot = (
+                tuple(_node_summary(node) for node in self.nodes.values()),
+                tuple(
+                    (node_id, edge["id"])
+                    for node_id, edges in self.adj.items()
+                    for edge in edges
+                ),
+                tuple(init_source_nodes),
+            )
+            analyzer("dag/execute", partial(_execute_event, snapshot))
 
         leaves = [self.get_node(n).get_output() for n in self.nodes if not self.adj[n]]
-        return leaves
+        result = RunResult(leaves, run.run_id)
+        result.timings = run.timings
+        if profile is not None:
+            result.profile = profile.report()
+        result.usage = {
+            "total": summarize(run.usage),
+            "by_model": summarize(run.usage, "model"),
+            "by_node": summarize(run.usage, "node"),
+        }
+        log_event(
+            self.logger, INFO, "dag.run.end", run_id=run.run_id, leaves=len(result)
+        )
+        return result
@@ -1,23 +1,154 @@
 import openai
 import os
+import json
+import time
 import asyncio
+from functools import partial
+from logging import DEBUG, INFO
 from voluptuous import Schema, Invalid, Required, ALLOW_EXTRA
-from dotenv import load_dotenv
 
-from .utils.analyzer import analyzer
+from .utils.analyzer import analyzer, telemetry_enabled
+from .utils.env import load_env
+from .utils.log import Payload, log_event
+from .utils.metrics import LLM_LATENCY, LLM_REQUESTS, LLM_RETRIES, LLM_TOKENS
+from .utils.prompt import PromptTemplate
+from .utils.schema import compile_schema
 from .node import Node
+from .providers import Provider, get_default_provider
+from .providers.cassette import CassetteProvider, get_cassette_provider
+from .utils.breaker import CircuitBreaker, CircuitOpenError
+from .utils.concurrency import AdaptiveLimiter
+from .utils.hedging import HedgePolicy
+from .utils.status import BreakerState
 from .utils.constants import (
+    CASSETTE_MODES,
+    CASSETTE_TIMINGS,
     DEFAULT_MAX_RETRIES,
     DEFAULT_RETRY_DELAY,
     DEFAULT_RATE_LIMIT_DELAY,
+    DEFAULT_COMPLETION_RESERVE,
     OPENAI_MODELS,
     OPENAI_ARGS,
     OPENAI_RESPONSE_SCHEMA,
+    OUTPUT_MODES,
+    SLIM_RESPONSE_SCHEMA,
+    TRUNCATION_STRATEGIES,
 )
+from .utils.trace import get_current_span, mark, span, start_as_current_span
+from .utils.tokens import context_window, estimate_message_tokens, truncate_messages
 
-load_dotenv()
+load_env()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# errors that say the provider is unhealthy, as opposed to a bad request
+BREAKER_FAILURES = (
+    openai.error.APIConnectionError,
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+)
+
+# extra keys like "name" are sent along as they are
+_MESSAGE_SCHEMA = Schema(
+    {Required("role"): str, Required("content"): str}, extra=ALLOW_EXTRA
+)
+
+
+def _charge_loser(policy: HedgePolicy, task: asyncio.Task) -> None:
+    # a loser that still answered (it finished before the cancel landed) was
+    # billed in full; exception() also keeps asyncio from logging a late error
+    # as never retrieved, and itself raises on a task that was cancelled
+    if task.cancelled() or task.exception() is not None:
+        return
+    usage = task.result().get("usage") or {}
+    policy.extra_completion_tokens += usage.get("completion_tokens", 0)
+
+
+def _split_choices(response: dict, k: int) -> list[dict]:
+    # one plain response per choice; the shared prompt is billed to the first
+    # node and completion tokens are spread evenly so totals still add up
+    if hasattr(response, "to_dict_recursive"):
+        response = response.to_dict_recursive()
+    choices = sorted(response["choices"], key=lambda c: c["index"])
+    if len(choices) < k:
+        raise ValueError(f"Expected {k} choices in response, got {len(choices)}")
+    usage = response.get("usage", {})
+    completion, remainder = divmod(usage.get("completion_tokens", 0), k)
+    outputs = []
+    for i, choice in enumerate(choices[:k]):
+        prompt_tokens = usage.get("prompt_tokens", 0) if i == 0 else 0
+        completion_tokens = completion + (remainder if i == 0 else 0)
+        outputs.append(
+            {
+                **response,
+                "choices": [{**choice, "index": 0}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+    return outputs
+
+
+def _slim(response: dict) -> dict:
+    choice = response["choices"][0]
+    message = choice["message"]
+    usage = response.get("usage") or {}
+    output = {
+        "content": message.get("content"),
+        "finish_reason": choice.get("finish_reason"),
+        "usage": {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+        },
+    }
+    function_call = message.get("function_call")
+    if function_call:
+        output["function_call"] = {
+            "name": function_call["name"],
+            "arguments": function_call["arguments"],
+        }
+    return output
+
+
+def _usage_attributes(response: dict) -> dict[str:type]:
+    usage = response.get("usage") or {}
+    return {
+        "llm.response.model": response.get("model"),
+        "llm.usage.prompt_tokens": usage.get("prompt_tokens", 0),
+        "llm.usage.completion_tokens": usage.get("completion_tokens", 0),
+        "llm.usage.total_tokens": usage.get("total_tokens", 0),
+    }
+
+
+def _request_event(
+    llm: "LLM", messages: list[dict], optional_params: dict, response: dict
+) -> dict[str:type]:
+    # built on the caller's side from plain values only: the flusher thread
+    # must never read messages, input or a response that may still change
+    choices = response.get("choices") or []
+    return {
+        "model": llm.model,
+        "provider": llm.provider.name,
+        "messages": len(messages),
+        "prompt_chars": sum(len(m.get("content") or "") for m in messages),
+        "input_keys": sorted(llm.input),
+        "optional_params": sorted(optional_params),
+        "choices": len(choices),
+        "finish_reasons": [c.get("finish_reason") for c in choices],
+        **_usage_attributes(response),
+    }
+
+
+def _record_tokens(model: str, response: dict) -> None:
+    usage = response.get("usage") or {}
+    model = response.get("model") or model
+    LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=model, kind="prompt")
+    LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=model, kind="completion")
+
 
 class LLM(Node):
     def __init__(
@@ -33,18 +164,38 @@ class LLM(Node):
         max_retries: int = DEFAULT_MAX_RETRIES,
         retry_delay: int = DEFAULT_RETRY_DELAY,
         rate_limit_delay: int = DEFAULT_RATE_LIMIT_DELAY,
+        truncation: str = None,
+        provider: Provider = None,
+        circuit_breaker: CircuitBreaker = None,
+        fallback_model: str = None,
+        hedge_policy: HedgePolicy = None,
+        concurrency_limiter: AdaptiveLimiter = None,
+        output_mode: str = "full",
+        keep_raw_response: bool = False,
         *args: list,
         **kwargs: dict,
     ) -> None:
         super().__init__(name, input_s, output_s, *args, **kwargs)
-        # manually reset to allow extra keys, idk what the full OpenAI response schema can have
-        self._output_s = Schema(output_s, extra=ALLOW_EXTRA)
+        self.set_output_mode(output_mode)
+        if output_s is not OPENAI_RESPONSE_SCHEMA:
+            self._output_s = compile_schema(output_s, extra=ALLOW_EXTRA)
+        self.keep_raw_response = keep_raw_response
+        self.raw_response = None
+        self.usage = None
+        # the request batch_key rendered, reused by the execute that follows
+        self._prepared = None
         if model in OPENAI_MODELS:
             self.model = model
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.rate_limit_delay = rate_limit_delay
-        self.messages = messages
+        self.set_truncation(truncation)
+        self.set_circuit_breaker(circuit_breaker)
+        self.set_fallback_model(fallback_model)
+        self.set_hedge_policy(hedge_policy)
+        self.set_concurrency_limiter(concurrency_limiter)
+        self.set_provider(provider if provider is not None else get_default_provider())
+        self.set_messages(messages)
 
     def get_model(self) -> str:
         return self.model
@@ -52,6 +203,12 @@ class LLM(Node):
     def get_messages(self) -> list[dict]:
         return self.messages
 
+    def get_prompt(self) -> PromptTemplate:
+        return self._prompt
+
+    def get_prompt_variables(self) -> frozenset[str]:
+        return self._prompt.variables
+
     def get_max_retries(self) -> int:
         return self.max_retries
 
@@ -61,10 +218,45 @@ class LLM(Node):
     def get_rate_limit_delay(self) -> int:
         return self.rate_limit_delay
 
+    def get_provider(self) -> Provider:
+        return self.provider
+
+    def get_circuit_breaker(self) -> CircuitBreaker:
+        return self.circuit_breaker
+
+    def get_fallback_model(self) -> str:
+        return self.fallback_model
+
+    def get_hedge_policy(self) -> HedgePolicy:
+        return self.hedge_policy
+
+    def get_concurrency_limiter(self) -> AdaptiveLimiter:
+        return self.concurrency_limiter
+
+    def get_output_mode(self) -> str:
+        return self.output_mode
+
+    def get_raw_response(self) -> dict:
+        return self.raw_response
+
+    def get_usage(self) -> dict[str:type]:
+        return self.usage
+
+    def get_truncation(self) -> str:
+        return self.truncation
+
+    def get_context_window(self) -> int:
+        return context_window(self.model)
+
+    def estimate_prompt_tokens(self, input: dict[str:type] = None) -> int:
+        return estimate_message_tokens(
+            self._prompt.render(self.input if input is None else input)
+        )
+
     def set_model(self, model: str) -> None:
         if model in OPENAI_MODELS:
             self.model = model
-            self.logger.debug(f"Set model to {model}")
+            log_event(self.logger, DEBUG, "llm.model", model=model)
         else:
             self.logger.error(f"Model {model} is not a valid OpenAI model")
             raise ValueError(f"Model {model} is not a valid OpenAI model")
@@ -75,71 +267,440 @@ class LLM(Node):
             raise ValueError(f"Messages {messages} is not a valid list")
         for msg in messages:
             try:
-                Schema({Required("role"): str, Required("content"): str})(msg)
+                _MESSAGE_SCHEMA(msg)
             except Invalid as e:
                 self.logger.error(f"Message {msg} is not a valid OpenAI message: {e}")
                 raise ValueError(f"Message {msg} is not a valid OpenAI message: {e}")
         self.messages = messages
-        self.logger.debug(f"Set messages to {messages}")
+        self._prompt = PromptTemplate(messages)
+        log_event(self.logger, DEBUG, "llm.messages", messages=Payload(messages))
 
     def set_max_retries(self, max_retries: int) -> None:
         if not isinstance(max_retries, int) or max_retries < 0:
             self.logger.error(f"Max retries {max_retries} is not a valid int")
             raise ValueError(f"Max retries {max_retries} is not a valid int")
         self.max_retries = max_retries
-        self.logger.debug(f"Set max retries to {max_retries}")
+        log_event(self.logger, DEBUG, "llm.max_retries", max_retries=max_retries)
 
     def set_retry_delay(self, retry_delay: int) -> None:
         if not isinstance(retry_delay, int) or retry_delay < 0:
             self.logger.error(f"Retry delay {retry_delay} is not a valid int")
             raise ValueError(f"Retry delay {retry_delay} is not a valid int")
         self.retry_delay = retry_delay
-        self.logger.debug(f"Set retry delay to {retry_delay}")
+        log_event(self.logger, DEBUG, "llm.retry_delay", retry_delay=retry_delay)
 
     def set_rate_limit_delay(self, rate_limit_delay: int) -> None:
         if not isinstance(rate_limit_delay, int) or rate_limit_delay < 0:
             self.logger.error(f"Rate limit delay {rate_limit_delay} is not a valid int")
             raise ValueError(f"Rate limit delay {rate_limit_delay} is not a valid int")
         self.rate_limit_delay = rate_limit_delay
-        self.logger.debug(f"Set rate limit delay to {rate_limit_delay}")
+        log_event(
+            self.logger,
+            DEBUG,
+            "llm.rate_limit_delay",
+            rate_limit_delay=rate_limit_delay,
+        )
 
-    async def execute(self) -> dict:
+    def set_provider(self, provider: Provider) -> None:
+        if not isinstance(provider, Provider):
+            self.logger.error(f"Provider {provider} is not a valid Provider")
+            raise ValueError(f"Provider {provider} is not a valid Provider")
+        self.provider = provider
+        log_event(self.logger, DEBUG, "llm.provider", provider=provider)
+
+    def set_cassette(
+        self, path: str, mode: str = "replay", timing: str = "recorded"
+    ) -> None:
+        # record wraps the current provider; replay serves the file alone
+        provider = self.provider
+        if isinstance(provider, CassetteProvider):
+            provider = provider.provider
+        if mode not in CASSETTE_MODES:
+            self.logger.error(f"Cassette mode {mode} is not one of {CASSETTE_MODES}")
+            raise ValueError(f"Cassette mode {mode} is not one of {CASSETTE_MODES}")
+        if timing not in CASSETTE_TIMINGS:
+            self.logger.error(
+                f"Cassette timing {timing} is not one of {CASSETTE_TIMINGS}"
+            )
+            raise ValueError(
+                f"Cassette timing {timing} is not one of {CASSETTE_TIMINGS}"
+            )
+        self.set_provider(get_cassette_provider(path, mode, timing, provider))
+
+    def set_circuit_breaker(self, circuit_breaker: CircuitBreaker) -> None:
+        if circuit_breaker is not None and not isinstance(
+            circuit_breaker, CircuitBreaker
+        ):
+            self.logger.error(f"{circuit_breaker} is not a valid CircuitBreaker")
+            raise ValueError(f"{circuit_breaker} is not a valid CircuitBreaker")
+        self.circuit_breaker = circuit_breaker
+        log_event(
+            self.logger, DEBUG, "llm.circuit_breaker", circuit_breaker=circuit_breaker
+        )
+
+    def set_fallback_model(self, fallback_model: str) -> None:
+        if fallback_model is not None and fallback_model not in OPENAI_MODELS:
+            self.logger.error(f"Model {fallback_model} is not a valid OpenAI model")
+            raise ValueError(f"Model {fallback_model} is not a valid OpenAI model")
+        self.fallback_model = fallback_model
+        log_event(
+            self.logger, DEBUG, "llm.fallback_model", fallback_model=fallback_model
+        )
+
+    def set_hedge_policy(self, hedge_policy: HedgePolicy) -> None:
+        if hedge_policy is not None and not isinstance(hedge_policy, HedgePolicy):
+            self.logger.error(f"{hedge_policy} is not a valid HedgePolicy")
+            raise ValueError(f"{hedge_policy} is not a valid HedgePolicy")
+        self.hedge_policy = hedge_policy
+        log_event(self.logger, DEBUG, "llm.hedge_policy", hedge_policy=hedge_policy)
+
+    def set_concurrency_limiter(self, concurrency_limiter: AdaptiveLimiter) -> None:
+        if concurrency_limiter is not None and not isinstance(
+            concurrency_limiter, AdaptiveLimiter
+        ):
+            self.logger.error(f"{concurrency_limiter} is not a valid AdaptiveLimiter")
+            raise ValueError(f"{concurrency_limiter} is not a valid AdaptiveLimiter")
+        self.concurrency_limiter = concurrency_limiter
+        log_event(
+            self.logger,
+            DEBUG,
+            "llm.concurrency_limiter",
+            concurrency_limiter=concurrency_limiter,
+        )
+
+    def set_output_mode(self, output_mode: str) -> None:
+        if output_mode not in OUTPUT_MODES:
+            self.logger.error(f"Output mode {output_mode} is not a valid mode")
+            raise ValueError(f"Output mode {output_mode} is not a valid mode")
+        self.output_mode = output_mode
+        # a schema the user set is theirs to keep, only the defaults follow
+        # the mode
+        if self._output_s.schema in (SLIM_RESPONSE_SCHEMA, OPENAI_RESPONSE_SCHEMA):
+            if output_mode == "slim":
+                self._output_s = compile_schema(SLIM_RESPONSE_SCHEMA)
+            else:
+                # allow extra keys, idk what the full OpenAI response schema can have
+                self._output_s = compile_schema(
+                    OPENAI_RESPONSE_SCHEMA, extra=ALLOW_EXTRA
+                )
+        log_event(self.logger, DEBUG, "llm.output_mode", output_mode=output_mode)
+
+    def set_keep_raw_response(self, keep_raw_response: bool) -> None:
+        self.keep_raw_response = keep_raw_response
+        if not keep_raw_response:
+            self.raw_response = None
+
+    def release_output(self) -> None:
+        super().release_output()
+        self.raw_response = None
+
+    def _project(self, response: dict) -> dict:
+        # store a plain, compact copy; the client object is only kept on request
+        self.raw_response = response if self.keep_raw_response else None
+        usage = response.get("usage") or {}
+        self.usage = {
+            "model": response.get("model") or self.model,
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+        }
+        if self.output_mode == "slim":
+            if len(response["choices"]) > 1:
+                self.logger.warning(
+                    f"Slim output keeps 1 of {len(response['choices'])} choices, use output_mode='full' for n>1"
+                )
+            return _slim(response)
+        if hasattr(response, "to_dict_recursive"):
+            return response.to_dict_recursive()
+        return response
+
+    def set_truncation(self, truncation: str) -> None:
+        if truncation is not None and truncation not in TRUNCATION_STRATEGIES:
+            self.logger.error(f"Truncation {truncation} is not a valid strategy")
+            raise ValueError(f"Truncation {truncation} is not a valid strategy")
+        self.truncation = truncation
+        log_event(self.logger, DEBUG, "llm.truncation", truncation=truncation)
+
+    def _fit_context(
+        self, messages: list[dict], optional_params: dict
+    ) -> tuple[list[dict], dict]:
+        # pre-flight budget check so oversized prompts never cost a round trip
+        window = context_window(self.model)
+        prompt_tokens = estimate_message_tokens(messages)
+        max_tokens = optional_params.get("max_tokens")
+        if prompt_tokens >= window or (
+            self.truncation and max_tokens and prompt_tokens + max_tokens > window
+        ):
+            if not self.truncation:
+                self.logger.error(
+                    f"Prompt of ~{prompt_tokens} tokens does not fit the {window} token context of {self.model}"
+                )
+                raise ValueError(
+                    f"Prompt of ~{prompt_tokens} tokens does not fit the {window} token context of {self.model}"
+                )
+            reserve = (
+                min(max_tokens, window // 2)
+                if max_tokens
+                else min(DEFAULT_COMPLETION_RESERVE, window // 2)
+            )
+            messages = truncate_messages(messages, window - reserve, self.truncation)
+            truncated_tokens = estimate_message_tokens(messages)
+            if truncated_tokens >= window:
+                self.logger.error(
+                    f"Prompt of ~{truncated_tokens} tokens still does not fit the {window} token context of {self.model} after {self.truncation}"
+                )
+                raise ValueError(
+                    f"Prompt of ~{truncated_tokens} tokens still does not fit the {window} token context of {self.model} after {self.truncation}"
+                )
+            self.logger.warning(
+                f"Truncated prompt from ~{prompt_tokens} to ~{truncated_tokens} tokens with {self.truncation}"
+            )
+            prompt_tokens = truncated_tokens
+        available = window - prompt_tokens
+        if max_tokens and max_tokens > available:
+            optional_params = {**optional_params, "max_tokens": available}
+            self.logger.warning(
+                f"Clamped max_tokens from {max_tokens} to {available} to fit the context of {self.model}"
+            )
+        return messages, optional_params
+
+    def _prepare_request(self) -> tuple[list[dict], dict]:
         optional_params = {
             k: v
             for k, v in super().get_execute_args()["kwargs"].items()
             if k in OPENAI_ARGS and v != OPENAI_ARGS[k]
         }
 
-        msgs_template = self.messages.copy()
+        # render into fresh dicts so the compiled template is never mutated
+        messages = self._prompt.render(self.input)
+        return self._fit_context(messages, optional_params)
+
+    def _take_prepared(self) -> tuple[list[dict], dict]:
+        # rendering, truncation and clamping (and their warnings) happen once
+        # per execution, whether or not batch_key ran first
+        prepared, self._prepared = self._prepared, None
+        return prepared if prepared is not None else self._prepare_request()
+
+    async def _pre_hook(self) -> None:
+        # a new execution, whatever an earlier batch_key rendered is stale
+        self._prepared = None
+        await super()._pre_hook()
 
-        # handle filling in variables
-        if self.input:
-            for msg in msgs_template:
-                try:
-                    msg["content"] = msg["content"].format(**self.input)
-                except KeyError:
-                    pass
+    def batch_key(self) -> tuple:
+        messages, optional_params = self._prepared = self._prepare_request()
+        if optional_params.get("n", 1) != 1 or optional_params.get("stream"):
+            return None
+        return (
+            id(self.provider),
+            self.model,
+            self.max_retries,
+            self.retry_delay,
+            self.rate_limit_delay,
+            # the shared call runs under the leader's resilience settings
+            id(self.circuit_breaker),
+            id(self.hedge_policy),
+            id(self.concurrency_limiter),
+            self.fallback_model,
+            json.dumps(messages, sort_keys=True),
+            json.dumps(optional_params, sort_keys=True, default=repr),
+        )
 
+    @classmethod
+    async def execute_batch(cls, nodes: list["LLM"]) -> None:
+        # siblings sending the same request share one call with n=len(nodes)
+        leader = nodes[0]
+        for node in nodes:
+            node.usage = None
+        messages, optional_params = leader._take_prepared()
+        for node in nodes[1:]:
+            node._prepared = None
+        optional_params = {**optional_params, "n": len(nodes)}
+        response = await leader._request(messages, optional_params)
+        if response is None:
+            return
+        for node, output in zip(nodes, _split_choices(response, len(nodes))):
+            node.set_output(node._project(output))
+        log_event(leader.logger, DEBUG, "llm.batch", nodes=len(nodes))
+
+    async def execute(self) -> dict:
+        self.usage = None
+        messages, optional_params = self._take_prepared()
+        response = await self._request(messages, optional_params)
+        if response is None:
+            return None
+        self.set_output(self._project(response))
+        return self.output
+
+    async def _attempt(self, messages: list[dict], optional_params: dict) -> dict:
+        model = self.model
+        breaker = self.circuit_breaker
+        if breaker is not None and not breaker.allow():
+            if not self.fallback_model:
+                self.logger.error(f"Circuit {breaker.name} is open, failing fast")
+                raise CircuitOpenError(f"Circuit {breaker.name} is open")
+            self.logger.warning(
+                f"Circuit {breaker.name} is open, routing to {self.fallback_model}"
+            )
+            model, breaker = self.fallback_model, None
+        start = time.monotonic()
+        try:
+            if self.hedge_policy is None:
+                response = await self._call_provider(model, messages, optional_params)
+            else:
+                response = await self._hedged_call(model, messages, optional_params)
+        except BREAKER_FAILURES:
+            if breaker is not None:
+                breaker.record_failure(time.monotonic() - start)
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.record_ignored()
+            raise
+        if breaker is not None:
+            breaker.record_success(time.monotonic() - start)
+        return response
+
+    async def _timed_call(
+        self, model: str, messages: list[dict], optional_params: dict
+    ) -> dict:
+        start = time.monotonic()
+        response = await self._call_provider(model, messages, optional_params)
+        self.hedge_policy.latencies.record(time.monotonic() - start)
+        return response
+
+    async def _call_provider(
+        self, model: str, messages: list[dict], optional_params: dict
+    ) -> dict:
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            return await self.provider.chat_completion(
+                model, messages, **optional_params
+            )
+        with span("limiter_wait", "llm", limit=limiter.limit):
+            await limiter.acquire()
+        try:
+            start = time.monotonic()
+            try:
+                response = await self.provider.chat_completion(
+                    model, messages, **optional_params
+                )
+            except openai.error.RateLimitError:
+                limiter.on_rate_limit()
+                raise
+            except BREAKER_FAILURES:
+                limiter.on_error()
+                raise
+            limiter.on_success(time.monotonic() - start)
+            return response
+        finally:
+            limiter.release()
+
+    async def _hedged_call(
+        self, model: str, messages: list[dict], optional_params: dict
+    ) -> dict:
+        # send a duplicate once the primary is slower than the policy percentile
+        # and take whichever answers first; the loser is cancelled
+        policy = self.hedge_policy
+        policy.requests += 1
+        delay = policy.delay()
+        primary = asyncio.ensure_future(
+            self._timed_call(model, messages, optional_params)
+        )
+        pending = {primary}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    hedge_model = policy.fallback_model or model
+                    log_event(
+                        self.logger, INFO, "llm.hedge", delay=delay, model=hedge_model
+                    )
+                    policy.hedges += 1
+                    mark("hedge", "llm", delay=delay, model=hedge_model)
+                    policy.extra_prompt_tokens += estimate_message_tokens(messages)
+                    hedge = asyncio.ensure_future(
+                        self._timed_call(hedge_model, messages, optional_params)
+                    )
+                    pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    # a cancelled attempt has no exception to read, it just lost
+                    if task.cancelled():
+                        if error is None:
+                            error = asyncio.CancelledError()
+                        continue
+                    if task.exception() is None:
+                        if task is not primary:
+                            policy.hedge_wins += 1
+                        for other in done:
+                            if other is not task:
+                                _charge_loser(policy, other)
+                        return task.result()
+                    if error is None or task is primary:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(partial(_charge_loser, policy))
+
+    async def _backoff(self, error: Exception, delay: int) -> None:
+        # no point sleeping towards a retry the open circuit would reject
+        breaker = self.circuit_breaker
+        if (
+            breaker is not None
+            and breaker.state is BreakerState.OPEN
+            and not self.fallback_model
+        ):
+            self.logger.error(f"Circuit {breaker.name} is open, not retrying")
+            raise error
+        kind = (
+            "rate_limit_wait"
+            if isinstance(error, openai.error.RateLimitError)
+            else "backoff"
+        )
+        LLM_RETRIES.inc(model=self.model, error=type(error).__name__)
+        with span(kind, "llm", delay=delay, error=type(error).__name__):
+            await asyncio.sleep(delay)
+
+    async def _request(self, messages: list[dict], optional_params: dict) -> dict:
         retries = 0
 
         while retries < self.max_retries:
+            start = time.monotonic()
             try:
-                response = openai.ChatCompletion.create(
-                    model=self.model, messages=self.messages, **optional_params
-                )
-                self.set_output(response)
-                analyzer(
-                    "llm/chat_completion",
+                with start_as_current_span(
+                    "llm.attempt",
+                    "llm",
                     {
-                        "model": self.model,
-                        "messages": self.messages,
-                        "response": response,
-                        "input": self.input,
-                        "optional_params": optional_params,
+                        "llm.model": self.model,
+                        "llm.provider": self.provider.name,
+                        "llm.attempt": retries + 1,
+                        "llm.retry_count": retries,
                     },
-                )
-                return response.to_dict()
+                ) as attempt:
+                    response = await self._attempt(messages, optional_params)
+                    if attempt.is_recording():
+                        attempt.set_attributes(_usage_attributes(response))
+                        attempt.set_status("OK")
+                LLM_LATENCY.observe(time.monotonic() - start, model=self.model)
+                LLM_REQUESTS.inc(model=self.model, outcome="ok")
+                _record_tokens(self.model, response)
+                # the node's span
+                get_current_span().set_attribute("llm.retries", retries)
+                if telemetry_enabled():
+                    analyzer(
+                        "llm/chat_completion",
+                        _request_event(self, messages, optional_params, response),
+                    )
+                return response
             except Exception as e:
+                LLM_LATENCY.observe(time.monotonic() - start, model=self.model)
+                LLM_REQUESTS.inc(model=self.model, outcome=type(e).__name__)
                 if isinstance(e, openai.error.InvalidRequestError):
                     self.logger.error("Invalid request to OpenAI API")
                     raise e
@@ -154,7 +715,7 @@ class LLM(Node):
                     if retries + 1 < self.max_retries:
                         retries += 1
                         self.logger.error(f"Retrying in {self.retry_delay} seconds...")
-                        await asyncio.sleep(self.retry_delay)
+                        await self._backoff(e, self.retry_delay)
                     else:
                         self.logger.error(
                             f"Method failed after {self.max_retries} retries"
@@ -165,7 +726,7 @@ class LLM(Node):
                     if retries + 1 < self.max_retries:
                         retries += 1
                         self.logger.error(f"Retrying in {self.retry_delay} seconds...")
-                        await asyncio.sleep(self.retry_delay)
+                        await self._backoff(e, self.retry_delay)
                     else:
                         self.logger.error(
                             f"Method failed after {self.max_retries} retries"
@@ -178,7 +739,7 @@ class LLM(Node):
                         self.logger.error(
                             f"Retrying in {self.rate_limit_delay} seconds..."
                         )
-                        await asyncio.sleep(self.rate_limit_delay)
+                        await self._backoff(e, self.rate_limit_delay)
                     else:
                         self.logger.error(
                             f"Method failed after {self.max_retries} retries"
@@ -189,7 +750,7 @@ class LLM(Node):
                     if retries + 1 < self.max_retries:
                         retries += 1
                         self.logger.error(f"Retrying in {self.retry_delay} seconds...")
-                        await asyncio.sleep(self.retry_delay)
+                        await self._backoff(e, self.retry_delay)
                     else:
                         self.logger.error(
                             f"Method failed after {self.max_retries} retries"
@@ -202,9 +763,12 @@ class LLM(Node):
                     if retries + 1 < self.max_retries:
                         retries += 1
                         self.logger.error(f"Retrying in {self.retry_delay} seconds...")
-                        await asyncio.sleep(self.retry_delay)
+                        await self._backoff(e, self.retry_delay)
                     else:
                         self.logger.error(
                             f"Method failed after {self.max_retries} retries"
                         )
                         raise e
+                else:
+                    # anything unclassified (e.g. CircuitOpenError) is not retried
+                    raise e
@@ -1,15 +1,76 @@
 from voluptuous import Schema, Invalid
 from asyncio import iscoroutinefunction
+from itertools import count
 from typing import Callable
 from abc import ABC, abstractmethod
 from uuid import uuid4
 import logging
+from logging import DEBUG
 
-from .utils.analyzer import analyzer
+from .utils.log import Payload, log_event
+from .utils.schema import compile_schema
 from .utils.status import Status
 
+_loggers = {}
+_counter = count(1)
+
+
+def _uuid_id() -> str:
+    return uuid4().hex
+
+
+def _counter_id() -> str:
+    # unique within the process only, much cheaper than a uuid4
+    return f"n{next(_counter)}"
+
+
+_id_factory = _uuid_id
+
+
+def set_id_factory(kind: str) -> None:
+    global _id_factory
+    if kind == "uuid":
+        _id_factory = _uuid_id
+    elif kind == "counter":
+        _id_factory = _counter_id
+    else:
+        raise ValueError(f"Id factory {kind} is not one of 'uuid' or 'counter'")
+
+
+def _class_logger(cls: type) -> logging.Logger:
+    logger = _loggers.get(cls)
+    if logger is None:
+        logger = _loggers[cls] = logging.getLogger(cls.__name__)
+    return logger
+
+
+def _identity(x: dict[str:type]) -> dict[str:type]:
+    return x
+
+
+# shared by every node using the default "any dict" schema
+_ANY_DICT_SCHEMA = compile_schema(dict)
+
 
 class Node(ABC):
+    # slotted so graphs with 100k+ nodes stay small; subclasses that don't
+    # declare __slots__ still get a __dict__ for their own attributes
+    __slots__ = (
+        "_logger",
+        "name",
+        "_id",
+        "_status",
+        "input",
+        "output",
+        "execute_args",
+        "_input_s",
+        "_output_s",
+        "pre_execute_hook",
+        "post_execute_hook",
+        "__weakref__",
+    )
+    _execute_args_s = Schema({"args": list, "kwargs": dict})
+
     def __init__(
         self,
         name: str,
@@ -18,25 +79,33 @@ class Node(ABC):
         *args,
         **kwargs,
     ) -> None:
-        self.logger = logging.getLogger(self.__class__.__name__)
+        self._logger = None
         self.name = name
-        self._id = uuid4().hex
-        self.set_status("PENDING")
+        self._id = _id_factory()
+        self._status = Status.PENDING
         self.input = {}
-        self.set_execute_args(*args, **kwargs)
+        self.execute_args = {"args": list(args), "kwargs": kwargs}
         self.output = {}
-        self.set_input_s(input_s)
-        self.__execute_args_s = Schema({"args": list, "kwargs": dict})
-        self.set_output_s(output_s)
-        self.pre_execute_hook = lambda _: self.input
-        self.post_execute_hook = lambda _: self.output
-        analyzer(
-            "node/added",
-            {
-                "id": self._id,
-                "name": self.name,
-            },
-        )
+        if input_s is dict:
+            self._input_s = _ANY_DICT_SCHEMA
+        else:
+            self.set_input_s(input_s)
+        if output_s is dict:
+            self._output_s = _ANY_DICT_SCHEMA
+        else:
+            self.set_output_s(output_s)
+        # one shared function, so a node without hooks costs no closures
+        self.pre_execute_hook = _identity
+        self.post_execute_hook = _identity
+
+    @property
+    def logger(self) -> logging.Logger:
+        logger = self._logger
+        return logger if logger is not None else _class_logger(type(self))
+
+    @logger.setter
+    def logger(self, logger: logging.Logger) -> None:
+        self._logger = logger
 
     def to_dict(self):
         return {
@@ -88,7 +157,7 @@ class Node(ABC):
             self.logger.error(f"Status {status} is not a valid Status")
             raise ValueError(f"Status {status} is not a valid Status")
         self._status = Status[status]
-        self.logger.debug(f"Node {self._id} status set to {self._status.name}")
+        log_event(self.logger, DEBUG, "node.status", id=self._id, status=status)
 
     def set_input(self, input: dict[str:type], wipe=True) -> None:
         if not isinstance(input, dict):
@@ -96,10 +165,18 @@ class Node(ABC):
             raise ValueError(f"Input {input} is not a valid dict")
         if wipe:
             self.input = input
-            self.logger.debug(f"Node {self._id} input set to {input}")
+            log_event(
+                self.logger, DEBUG, "node.input.set", id=self._id, input=Payload(input)
+            )
         else:
             self.input.update(input)
-            self.logger.debug(f"Node {self._id} input updated with {input}")
+            log_event(
+                self.logger,
+                DEBUG,
+                "node.input.update",
+                id=self._id,
+                input=Payload(input),
+            )
 
     def set_output(self, output: dict[str:type], wipe=True) -> None:
         if not isinstance(output, dict):
@@ -107,33 +184,50 @@ class Node(ABC):
             raise ValueError(f"Output {output} is not a valid dict")
         if wipe:
             self.output = output
-            self.logger.debug(f"Node {self._id} output set to {output}")
+            log_event(
+                self.logger,
+                DEBUG,
+                "node.output.set",
+                id=self._id,
+                output=Payload(output),
+            )
         else:
             self.output.update(output)
-            self.logger.debug(f"Node {self._id} output updated with {output}")
+            log_event(
+                self.logger,
+                DEBUG,
+                "node.output.update",
+                id=self._id,
+                output=Payload(output),
+            )
 
     def set_execute_args(self, *args: list[type], **kwargs: dict[str:type]) -> None:
-        res = {"args": [], "kwargs": {}}
-        if args:
-            res["args"] = list(args)
-            self.logger.debug(f"Node {self._id} args set to {res}")
-        if kwargs:
-            res["kwargs"] = kwargs
-            self.logger.debug(f"Node {self._id} kwargs set to {res}")
+        res = {"args": list(args), "kwargs": kwargs}
+        log_event(
+            self.logger, DEBUG, "node.execute_args", id=self._id, args=Payload(res)
+        )
         self.execute_args = res
 
     def set_input_s(self, input_s: dict[str:type]) -> None:
         if isinstance(input_s, dict) or input_s is dict:
-            self._input_s = Schema(input_s)
-            self.logger.debug(f"Node {self._id} input schema set to {input_s}")
+            self._input_s = compile_schema(input_s)
+            log_event(
+                self.logger, DEBUG, "node.input_s", id=self._id, schema=Payload(input_s)
+            )
         else:
             self.logger.error(f"Input Schema {input_s} is not a valid dict")
             raise ValueError(f"Input Schema {input_s} is not a valid dict")
 
     def set_output_s(self, output_s: dict[str:type]) -> None:
         if isinstance(output_s, dict) or output_s is dict:
-            self._output_s = Schema(output_s)
-            self.logger.debug(f"Node {self._id} output schema set to {output_s}")
+            self._output_s = compile_schema(output_s)
+            log_event(
+                self.logger,
+                DEBUG,
+                "node.output_s",
+                id=self._id,
+                schema=Payload(output_s),
+            )
         else:
             self.logger.error(f"Output Schema {output_s} is not a valid dict")
             raise ValueError(f"Output Schema {output_s} is not a valid dict")
@@ -145,7 +239,9 @@ class Node(ABC):
             self.logger.error(f"Pre execute hook {hook} is not a callable function")
             raise ValueError(f"Pre execute hook {hook} is not a callable function")
         self.pre_execute_hook = hook
-        self.logger.debug(f"Node {self._id} pre execute hook set to {hook.__name__}")
+        log_event(
+            self.logger, DEBUG, "node.pre_hook.set", id=self._id, hook=hook.__name__
+        )
 
     def set_post_execute_hook(
         self, hook: Callable[[dict[str:type]], dict[str:type]]
@@ -154,12 +250,20 @@ class Node(ABC):
             self.logger.error(f"Post execute hook {hook} is not a callable function")
             raise ValueError(f"Post execute hook {hook} is not a callable function")
         self.post_execute_hook = hook
-        self.logger.debug(f"Node {self._id} post execute hook set to {hook.__name__}")
+        log_event(
+            self.logger, DEBUG, "node.post_hook.set", id=self._id, hook=hook.__name__
+        )
 
     # validators
     def validate_input(self) -> bool:
         try:
-            self.logger.debug(f"Node {self._id} validating input {self.input}")
+            log_event(
+                self.logger,
+                DEBUG,
+                "node.input.validate",
+                id=self._id,
+                input=Payload(self.input),
+            )
             return self._input_s(self.input)
         except Invalid:
             self.logger.error(f"Node {self._id} input {self.input} is not valid")
@@ -167,7 +271,13 @@ class Node(ABC):
 
     def validate_output(self) -> bool:
         try:
-            self.logger.debug(f"Node {self._id} validating output {self.output}")
+            log_event(
+                self.logger,
+                DEBUG,
+                "node.output.validate",
+                id=self._id,
+                output=Payload(self.output),
+            )
             return self._output_s(self.output)
         except Invalid:
             self.logger.error(f"Node {self._id} output {self.output} is not valid")
@@ -175,10 +285,14 @@ class Node(ABC):
 
     def validate_execute_args(self) -> bool:
         try:
-            self.logger.debug(
-                f"Node {self._id} validating execute args {self.execute_args}"
+            log_event(
+                self.logger,
+                DEBUG,
+                "node.execute_args.validate",
+                id=self._id,
+                args=Payload(self.execute_args),
             )
-            return self.__execute_args_s(self.execute_args)
+            return self._execute_args_s(self.execute_args)
         except Invalid:
             self.logger.error(
                 f"Node {self._id} execute args {self.execute_args} is not valid"
@@ -188,21 +302,50 @@ class Node(ABC):
     # hooks
     async def _pre_hook(self) -> None:
         self.set_status("EXECUTING")
+        if self.pre_execute_hook is _identity:
+            return
         if iscoroutinefunction(self.pre_execute_hook):
             self.input = await self.pre_execute_hook(self.input)
-            self.logger.debug(f"Node {self._id} executing async pre execute hook")
+            log_event(self.logger, DEBUG, "node.pre_hook", id=self._id, is_async=True)
         else:
             self.input = self.pre_execute_hook(self.input)
-            self.logger.debug(f"Node {self._id} executing pre execute hook")
+            log_event(self.logger, DEBUG, "node.pre_hook", id=self._id, is_async=False)
 
     async def _post_hook(self) -> None:
         self.set_status("SUCCESS")
+        if self.post_execute_hook is _identity:
+            return
         if iscoroutinefunction(self.post_execute_hook):
             self.output = await self.post_execute_hook(self.output)
-            self.logger.debug(f"Node {self._id} executing async post execute hook")
+            log_event(self.logger, DEBUG, "node.post_hook", id=self._id, is_async=True)
         else:
             self.output = self.post_execute_hook(self.output)
-            self.logger.debug(f"Node {self._id} executing post execute hook")
+            log_event(self.logger, DEBUG, "node.post_hook", id=self._id, is_async=False)
+
+    # called by DAG.execute(release_intermediates=True) once nothing in the
+    # run reads these anymore; override to drop other per-run state too
+    def release_input(self) -> None:
+        self.input = {}
+
+    def release_output(self) -> None:
+        self.output = {}
+
+    # token usage of the last execution, for nodes that call a model
+    def get_usage(self) -> dict[str:type]:
+        return None
+
+    # nodes whose batch keys are equal (and not None) can be served together
+    # by a single execute_batch call on their class instead of one execute each
+    def batch_key(self) -> tuple:
+        return None
+
+    @classmethod
+    async def execute_batch(cls, nodes: list["Node"]) -> None:
+        for node in nodes:
+            if iscoroutinefunction(node.execute):
+                await node.execute()
+            else:
+                node.execute()
 
     @abstractmethod
     async def execute(self) -> None:
@@ -0,0 +1,4 @@
+from .base import Provider
+from .openai_chat import OpenAIProvider, get_default_provider
+from .fake import FakeProvider
+from .cassette import CassetteProvider, CassetteMissError, get_cassette
@@ -0,0 +1,16 @@
+from abc import ABC, abstractmethod
+
+
+class Provider(ABC):
+    name = "provider"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(name={self.name})"
+
+    # returns an OpenAI chat completion shaped response (see OPENAI_RESPONSE_SCHEMA)
+    # and raises openai.error exceptions so LLM can classify and retry them
+    @abstractmethod
+    async def chat_completion(
+        self, model: str, messages: list[dict], **params: dict
+    ) -> dict:
+        pass
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import openai
+
+from .base import Provider
+from ..utils.constants import CASSETTE_MODES, CASSETTE_TIMINGS
+
+
+class CassetteMissError(LookupError):
+    pass
+
+
+def request_key(model: str, messages: list[dict], params: dict) -> str:
+    body = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _plain(response: dict) -> dict:
+    if isinstance(response, openai.openai_object.OpenAIObject):
+        return response.to_dict_recursive()
+    return response
+
+
+class Cassette:
+    # one JSON object per line: request hash, request, response and latency;
+    # identical requests replay their recorded responses in order
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries = {}
+        self._positions = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.entries.values())
+
+    def lookup(self, key: str) -> dict:
+        entries = self.entries.get(key)
+        if not entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        position = self._positions.get(key, 0)
+        self._positions[key] = (position + 1) % len(entries)
+        return entries[position]
+
+    def record(
+        self,
+        key: str,
+        model: str,
+        messages: list[dict],
+        params: dict,
+        response: dict,
+        latency: float,
+    ) -> dict:
+        entry = {
+            "key": key,
+            "model": model,
+            "messages": messages,
+            "params": params,
+            "response": _plain(response),
+            "latency": latency,
+            "recorded_at": time.time(),
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self.entries.setdefault(key, []).append(entry)
+        self.recorded += 1
+        return entry
+
+    def stats(self) -> dict[str:int]:
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+_cassettes = {}
+
+
+def get_cassette(path: str) -> Cassette:
+    # nodes recording to the same file share one cassette
+    path = os.path.abspath(path)
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
+
+
+def cassette_stats() -> dict[str : dict[str:int]]:
+    return {path: cassette.stats() for path, cassette in _cassettes.items()}
+
+
+class CassetteProvider(Provider):
+    name = "cassette"
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        mode: str = "replay",
+        timing: str = "recorded",
+        provider: Provider = None,
+    ) -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Cassette mode {mode} is not one of {CASSETTE_MODES}")
+        if timing not in CASSETTE_TIMINGS:
+            raise ValueError(
+                f"Cassette timing {timing} is not one of {CASSETTE_TIMINGS}"
+            )
+        if mode != "replay" and provider is None:
+            raise ValueError(f"Cassette mode {mode} needs a provider to record from")
+        self.cassette = (
+            cassette if isinstance(cassette, Cassette) else get_cassette(cassette)
+        )
+        self.mode = mode
+        self.timing = timing
+        self.provider = provider
+
+    def __repr__(self) -> str:
+        return f"CassetteProvider(path={self.cassette.path}, mode={self.mode}, provider={self.provider})"
+
+    async def chat_completion(
+        self, model: str, messages: list[dict], **params: dict
+    ) -> dict:
+        key = request_key(model, messages, params)
+        if self.mode != "record":
+            entry = self.cassette.lookup(key)
+            if entry is not None:
+                if self.timing == "recorded" and entry["latency"]:
+                    await asyncio.sleep(entry["latency"])
+                return openai.openai_object.OpenAIObject.construct_from(
+                    entry["response"]
+                )
+            if self.mode == "replay":
+                raise CassetteMissError(
+                    f"No recorded response for {model} request {key[:12]} in {self.cassette.path}"
+                )
+        start = time.monotonic()
+        response = await self.provider.chat_completion(model, messages, **params)
+        self.cassette.record(
+            key, model, messages, params, response, time.monotonic() - start
+        )
+        return response
+
+
+_providers = {}
+
+
+def get_cassette_provider(
+    path: str, mode: str, timing: str, provider: Provider = None
+) -> CassetteProvider:
+    # shared per (file, mode, timing, backend) so sibling nodes stay batchable
+    key = (os.path.abspath(path), mode, timing, id(provider))
+    cached = _providers.get(key)
+    if cached is None or cached.provider is not provider:
+        cached = _providers[key] = CassetteProvider(path, mode, timing, provider)
+    return cached
@@ -0,0 +1,124 @@
+import asyncio
+import math
+import random
+import time
+from typing import Callable
+from uuid import uuid4
+
+import openai
+
+from .base import Provider
+from ..utils.constants import LATENCY_DISTRIBUTIONS
+from ..utils.tokens import estimate_message_tokens, estimate_tokens
+
+DEFAULT_ERRORS = (
+    openai.error.APIError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+)
+
+
+class FakeProvider(Provider):
+    name = "fake"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        distribution: str = "uniform",
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        errors: tuple[type] = DEFAULT_ERRORS,
+        responder: Callable[[str, list[dict], int], str] = None,
+        seed: int = None,
+    ) -> None:
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Distribution {distribution} is not a valid distribution")
+        if latency < 0 or jitter < 0:
+            raise ValueError(f"Latency {latency} and jitter {jitter} must be >= 0")
+        for rate in (error_rate, rate_limit_rate):
+            if not 0 <= rate <= 1:
+                raise ValueError(f"Rate {rate} is not between 0 and 1")
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.errors = tuple(errors)
+        self.responder = responder
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def sample_latency(self) -> float:
+        if self.distribution == "constant":
+            value = self.latency
+        elif self.distribution == "uniform":
+            value = self.random.uniform(
+                self.latency - self.jitter, self.latency + self.jitter
+            )
+        elif self.distribution == "normal":
+            value = self.random.gauss(self.latency, self.jitter)
+        elif self.distribution == "lognormal":
+            # latency is the median, jitter the sigma of the underlying normal
+            value = (
+                self.random.lognormvariate(math.log(self.latency), self.jitter)
+                if self.latency > 0
+                else 0.0
+            )
+        else:
+            value = (
+                self.random.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+            )
+        return max(0.0, value)
+
+    def respond(self, model: str, messages: list[dict], index: int) -> str:
+        if self.responder:
+            return self.responder(model, messages, index)
+        return f"Fake response {index} to: {messages[-1]['content'][:64]}"
+
+    async def chat_completion(
+        self, model: str, messages: list[dict], **params: dict
+    ) -> dict:
+        self.calls += 1
+        # 429s come back before any work is done, like the real API
+        if self.rate_limit_rate and self.random.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise openai.error.RateLimitError("Fake rate limit", None)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.sample_latency())
+        finally:
+            self.in_flight -= 1
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.failures += 1
+            raise self.random.choice(self.errors)("Fake provider error", None)
+
+        contents = [self.respond(model, messages, i) for i in range(params.get("n", 1))]
+        prompt_tokens = estimate_message_tokens(messages)
+        completion_tokens = sum(estimate_tokens(c) for c in contents)
+        return openai.openai_object.OpenAIObject.construct_from(
+            {
+                "id": f"chatcmpl-fake-{uuid4().hex[:24]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": i,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                    for i, content in enumerate(contents)
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
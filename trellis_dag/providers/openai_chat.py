@@ -0,0 +1,44 @@
+import openai
+
+from .base import Provider
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def __init__(
+        self, api_key: str = None, api_base: str = None, organization: str = None
+    ) -> None:
+        # unset values fall back to the module level openai configuration
+        self.credentials = {
+            k: v
+            for k, v in {
+                "api_key": api_key,
+                "api_base": api_base,
+                "organization": organization,
+            }.items()
+            if v is not None
+        }
+
+    async def chat_completion(
+        self, model: str, messages: list[dict], **params: dict
+    ) -> dict:
+        # the client's native async call, so concurrency isn't capped by a
+        # thread pool and cancelling a hedged duplicate closes its request
+        return await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            **self.credentials,
+            **params,
+        )
+
+
+_default_provider = None
+
+
+def get_default_provider() -> OpenAIProvider:
+    # shared so sibling LLM nodes on the default backend can be batched together
+    global _default_provider
+    if _default_provider is None:
+        _default_provider = OpenAIProvider()
+    return _default_provider
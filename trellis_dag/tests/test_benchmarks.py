@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks import compare, graph_ops, throughput
+from benchmarks.generators import GENERATORS
+from trellis_dag.utils import analyzer
+from trellis_dag.utils.analyzer import Telemetry
+
+
+@pytest.fixture(autouse=True)
+def isolated_globals(monkeypatch) -> list[str]:
+    # main() is a CLI entry point: it disables telemetry and reconfigures
+    # logging for the whole process, none of which may outlive the test
+    monkeypatch.setenv("DISABLE_TELEMETRY", "1")
+    monkeypatch.setattr(analyzer, "_telemetry", Telemetry())
+    levels = []
+    monkeypatch.setattr(throughput, "configure_logging", levels.append)
+    return levels
+
+
+@pytest.mark.parametrize("shape", list(GENERATORS))
+def test_generators_are_topological(shape: str) -> None:
+    n, edges = GENERATORS[shape](50, seed=1)
+    assert n == 50
+    assert edges
+    assert all(0 <= parent < child < n for parent, child in edges)
+    children = {child for _, child in edges}
+    # everything but the roots has a parent
+    assert len(children) >= n - (int(n**0.5) if shape == "layered" else 1)
+
+
+def test_graph_ops_report(tmp_path) -> None:
+    out = tmp_path / "report.json"
+    report = graph_ops.main(
+        ["--shapes", "diamond", "--sizes", "20", "--repeat", "1", "-o", str(out)]
+    )
+    ops = {r["op"] for r in report["results"]}
+    assert ops == {"add_node", "add_edge", "topological_sort", "execute", "remove_node"}
+    assert out.exists()
+
+    rows = compare.compare(report, report)
+    assert len(rows) == 5
+    assert not any(row["regression"] for row in rows)
+
+
+@pytest.mark.parametrize("mode", [["--concurrency", "4"], ["--rate", "500"]])
+def test_throughput_report(tmp_path, mode: list[str], isolated_globals) -> None:
+    out = tmp_path / "throughput.json"
+    report = throughput.main(
+        ["--size", "4", "--runs", "10", "--latency", "0", "-o", str(out)] + mode
+    )
+    results = report["results"]
+    assert results["completed"] == 10
+    # the diamond's two middle siblings share one batched request
+    assert results["provider"]["calls"] == 30
+    assert results["latency"]["p50"] <= results["latency"]["p99"]
+    assert results["runs_per_sec"] > 0
+    assert out.exists()
+    assert isolated_globals == ["CRITICAL"]
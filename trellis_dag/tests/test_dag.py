@@ -1,7 +1,9 @@
 import pytest
+from voluptuous import ALLOW_EXTRA, Extra, Required
 
 from trellis_dag import Node
 from trellis_dag import DAG
+from trellis_dag.utils.schema import check_compatible
 
 
 def test_init(dag: DAG) -> None:
@@ -350,3 +352,74 @@ def test_topological_sort_multiple_incoming_outgoing(
     dag.add_edge(dummy_node_6, dummy_node_8)
     dag.add_edge(dummy_node_7, dummy_node_8)
     assert dag._is_valid_topological_order(dag._topological_sort())
+
+
+def test_topological_sort_keeps_deps(dag, dummy_node, dummy_node_2) -> None:
+    dag.add_node(dummy_node)
+    dag.add_node(dummy_node_2)
+    dag.add_edge(dummy_node, dummy_node_2)
+    dag._topological_sort()
+    assert dag.deps[dummy_node_2.get_id()] == [dummy_node.get_id()]
+
+
+def test_check_edges(dag, dummy_node, dummy_node_2, dummy_node_3) -> None:
+    dummy_node.set_output_s({Required("a"): int, "b": str})
+    dummy_node_2.set_output_s({"c": str})
+    dummy_node_3.set_input_s({Required("a"): float, "b": str, "c": str})
+    for node in [dummy_node, dummy_node_2, dummy_node_3]:
+        dag.add_node(node)
+    dag.add_edge(dummy_node_2, dummy_node_3)
+    # int is never a float, and "a" is always there
+    with pytest.raises(ValueError, match="can never match"):
+        dag.add_edge(dummy_node, dummy_node_3)
+    dag.add_edge(dummy_node, dummy_node_3, fn=lambda x: x)
+    assert dag.check_edges()["unproven"] == [dummy_node_3.get_id()]
+
+    dag.remove_edge(dummy_node, dummy_node_3)
+    dag.add_edge(
+        dummy_node,
+        dummy_node_3,
+        fn=lambda x: {"a": float(x["a"])},
+        output_s={Required("a"): float},
+    )
+    assert dag.check_edges()["proven"] == [dummy_node_3.get_id()]
+    assert dag._input_proven(dummy_node_3.get_id())
+
+    dummy_node_3.set_pre_execute_hook(lambda x: x)
+    assert not dag._input_proven(dummy_node_3.get_id())
+
+
+def test_check_edges_non_literal_keys(dag, dummy_node, dummy_node_2) -> None:
+    # type keys and Extra match names we can't enumerate, never reject those
+    dummy_node.set_output_s({Required("a"): int})
+    dummy_node_2.set_input_s({str: int})
+    dag.add_node(dummy_node)
+    dag.add_node(dummy_node_2)
+    dag.add_edge(dummy_node, dummy_node_2)
+    assert dag.check_edges()["unproven"] == [dummy_node_2.get_id()]
+    assert dummy_node_2._input_s({"a": 1})
+
+    assert check_compatible({Required("a"): int}, {"b": int, Extra: object}) is None
+    assert check_compatible({Required("a"): int}, {"b": int}) is False
+    assert check_compatible({Required("a"): int}, {"b": int}, ALLOW_EXTRA) is None
+
+
+def test_check_edges_nested_required_keys(dag, dummy_node, dummy_node_2) -> None:
+    # a nested dict comes whole from one edge, its required keys must be there
+    dummy_node.set_output_s({Required("a"): {"x": int}})
+    dummy_node_2.set_input_s({Required("a"): {Required("y"): int}})
+    dag.add_node(dummy_node)
+    dag.add_node(dummy_node_2)
+    with pytest.raises(ValueError, match="can never match"):
+        dag.add_edge(dummy_node, dummy_node_2)
+
+    dummy_node.set_output_s({Required("a"): {"y": int}})
+    dag.add_edge(dummy_node, dummy_node_2)
+    assert dag.check_edges()["unproven"] == [dummy_node_2.get_id()]
+    dummy_node.set_output_s({Required("a"): {Required("y"): int}})
+    assert dag.check_edges()["proven"] == [dummy_node_2.get_id()]
+
+    accepted = {Required("a"): {Required("y", default=0): int}}
+    assert check_compatible({Required("a"): {}}, accepted) is True
+    # at the top level other edges may supply the key
+    assert check_compatible({Required("b"): int}, {Required("a"): int, "b": int})
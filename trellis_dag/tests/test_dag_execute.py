@@ -1,8 +1,17 @@
+import asyncio
+import json
+import time
+import tracemalloc
 import pytest
+import openai
+from voluptuous import ALLOW_EXTRA, Required
 
 from trellis_dag import DAG
 from trellis_dag import Node
 from trellis_dag import LLM
+from trellis_dag.providers import FakeProvider
+from trellis_dag.utils.schema import compile_schema
+from trellis_dag.utils.timing import payload_size
 
 
 @pytest.mark.asyncio
@@ -492,3 +501,379 @@ async def test_execute_multiple_incoming_outgoing(
     dummy_node_8: Node,
 ) -> None:
     pass
+
+
+# Self-consistency fan out, siblings with identical prompts
+#   A
+#  /|\
+# v v v
+# B C D
+#
+# A: read location data from file
+# B, C, D: same LLM prompt, served by one request with n=3
+@pytest.mark.asyncio
+async def test_execute_batches_identical_siblings(
+    dag: DAG, read_from_file_tool: Node, mocker
+) -> None:
+    response = openai.openai_object.OpenAIObject.construct_from(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 1692000000,
+            "model": "gpt-3.5-turbo",
+            "choices": [
+                {
+                    "index": i,
+                    "message": {"role": "assistant", "content": f"Answer {i}"},
+                    "finish_reason": "stop",
+                }
+                for i in range(3)
+            ],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 7, "total_tokens": 37},
+        }
+    )
+    create = mocker.patch.object(openai.ChatCompletion, "acreate", return_value=response)
+    messages = [{"role": "user", "content": "Pick one of {locations}."}]
+    llms = [LLM(f"LLM{i}", messages=messages) for i in range(3)]
+    dag.add_node(read_from_file_tool)
+    for llm in llms:
+        dag.add_node(llm)
+        dag.add_edge(
+            read_from_file_tool, llm, fn=lambda x: {"locations": x["file_contents"]}
+        )
+    init_dict = {
+        read_from_file_tool.get_id(): {
+            "kwargs": {"file_path": "trellis_dag/tests/data.txt"}
+        }
+    }
+
+    prepare = mocker.spy(LLM, "_prepare_request")
+    res = await dag.execute(init_source_nodes=init_dict)
+
+    assert create.call_count == 1
+    assert create.call_args.kwargs["n"] == 3
+    # rendered once per node by batch_key, not again for the batched call
+    assert prepare.call_count == 3
+    contents = sorted(r["choices"][0]["message"]["content"] for r in res)
+    assert contents == ["Answer 0", "Answer 1", "Answer 2"]
+    assert sum(r["usage"]["total_tokens"] for r in res) == 37
+    assert res.usage["total"]["total_tokens"] == 37
+    assert res.usage["total"]["requests"] == 3
+    assert all(llm.get_status() == "SUCCESS" for llm in llms)
+
+    create.reset_mock()
+    await dag.execute(init_source_nodes=init_dict, batch_siblings=False)
+    assert create.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_execute_usage_ledger(dag: DAG) -> None:
+    provider = FakeProvider()
+    LLM1 = LLM("LLM1", provider=provider, model="gpt-4")
+    LLM2 = LLM("LLM2", provider=provider)
+    LLM2.set_messages([{"role": "user", "content": "Summarize {text}"}])
+    dag.add_node(LLM1)
+    dag.add_node(LLM2)
+    dag.add_edge(
+        LLM1, LLM2, fn=lambda x: {"text": x["choices"][0]["message"]["content"]}
+    )
+
+    first = await dag.execute({})
+    second = await dag.execute({})
+
+    assert first.run_id != second.run_id
+    assert set(first.usage["by_model"]) == {"gpt-4", "gpt-3.5-turbo"}
+    assert set(first.usage["by_node"]) == {LLM1.get_id(), LLM2.get_id()}
+    assert first.usage["total"]["cost"] > 0
+
+    ledger = dag.get_ledger()
+    assert len(ledger) == 4
+    by_run = ledger.summarize("run")
+    assert by_run[first.run_id] == first.usage["total"]
+    assert ledger.summarize(since=time.time() + 60)["requests"] == 0
+    top_node, top_usage = ledger.top(1, group_by="node", key="cost")[0]
+    assert top_node == LLM1.get_id()
+
+
+@pytest.mark.asyncio
+async def test_execute_validation_levels(dag: DAG, read_from_file_tool) -> None:
+    read_from_file_tool.set_output_s({"file_contents": int})
+    dag.add_node(read_from_file_tool)
+    init_dict = {
+        read_from_file_tool.get_id(): {
+            "kwargs": {"file_path": "trellis_dag/tests/data.txt"}
+        }
+    }
+
+    with pytest.raises(ValueError, match="is not valid for schema"):
+        await dag.execute(init_dict)
+    with pytest.raises(ValueError, match="is not valid for schema"):
+        await dag.execute(init_dict, validation="sampled", sample_rate=1.0)
+    for level in ["edges-only", "off"]:
+        res = await dag.execute(init_dict, validation=level)
+        assert isinstance(res[0]["file_contents"], str)
+    await dag.execute(init_dict, validation="sampled", sample_rate=0.0)
+
+    with pytest.raises(ValueError, match="Validation level"):
+        await dag.execute(init_dict, validation="some")
+    with pytest.raises(ValueError, match="Sample rate"):
+        await dag.execute(init_dict, validation="sampled", sample_rate=2)
+
+
+@pytest.mark.asyncio
+async def test_execute_skips_proven_inputs(
+    dag: DAG, read_from_file_tool, dummy_node, mocker
+) -> None:
+    dummy_node.set_input_s({"file_contents": str})
+    dag.add_node(read_from_file_tool)
+    dag.add_node(dummy_node)
+    dag.add_edge(read_from_file_tool, dummy_node)
+    validate = mocker.spy(dummy_node, "validate_input")
+    init_dict = {
+        read_from_file_tool.get_id(): {
+            "kwargs": {"file_path": "trellis_dag/tests/data.txt"}
+        }
+    }
+
+    await dag.execute(init_dict)
+    assert validate.call_count == 0
+    assert "file_contents" in dummy_node.get_input()
+
+    dummy_node.set_input_s({"file_contents": str, "other": int})
+    dummy_node_2 = type(dummy_node)("test2")
+    dag.add_node(dummy_node_2)
+    dag.add_edge(dummy_node_2, dummy_node, fn=lambda x: {"other": 1})
+    await dag.execute(init_dict)
+    assert validate.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_execute_phase_timings(dag: DAG, dummy_node, dummy_node_2) -> None:
+    async def slow_hook(x: dict) -> dict:
+        await asyncio.sleep(0.02)
+        return x
+
+    class SlowNode(type(dummy_node)):
+        async def execute(self) -> dict:
+            await asyncio.sleep(0.03)
+            self.output = {"text": "x" * 1000}
+            return self.output
+
+    slow = SlowNode("slow")
+    slow.set_pre_execute_hook(slow_hook)
+    dag.add_node(slow)
+    dag.add_node(dummy_node_2)
+    dag.add_edge(slow, dummy_node_2)
+    seen = []
+    dag.set_timing_hook(seen.append)
+
+    res = await dag.execute({})
+
+    timing = res.timings[slow.get_id()]
+    assert timing.pre_hook >= 0.02
+    assert timing.execute >= 0.03
+    assert timing.output_bytes > 1000
+    assert timing.total >= 0.05
+    child = res.timings[dummy_node_2.get_id()]
+    assert child.input_bytes > 1000
+    assert child.queue_wait < 0.02
+    assert [t.node_id for t in seen] == [slow.get_id(), dummy_node_2.get_id()]
+    totals = res.phase_totals()
+    assert totals["execute"] >= 0.03
+    assert set(totals) == set(timing.to_dict()) - {
+        "node_id",
+        "name",
+        "batch_size",
+        "input_bytes",
+        "output_bytes",
+        "total",
+    }
+    with pytest.raises(ValueError, match="is not a callable"):
+        dag.set_timing_hook("hook")
+
+    # payloads are only measured for a timing hook or a profiler
+    dag.timing_hook = None
+    res = await dag.execute({})
+    assert res.timings[slow.get_id()].output_bytes is None
+    assert res.timings[slow.get_id()].execute >= 0.03
+
+
+def test_payload_size_guards() -> None:
+    loop = {"a": [1, "xy"]}
+    loop["self"] = loop
+    assert payload_size(loop) == payload_size({"a": [1, "xy"], "self": 0})
+    deep = []
+    for _ in range(5000):
+        deep = [deep]
+    assert payload_size(deep) > 0
+
+
+@pytest.mark.asyncio
+async def test_execute_trace(dag: DAG, dummy_node, tmp_path) -> None:
+    class FlakyProvider(FakeProvider):
+        async def chat_completion(self, model, messages, **params):
+            if self.calls < 2:
+                self.calls += 1
+                if self.calls == 1:
+                    raise openai.error.RateLimitError("Fake rate limit", None)
+                raise openai.error.APIError("Fake provider error", None)
+            return await super().chat_completion(model, messages, **params)
+
+    llm = LLM("LLM1", provider=FlakyProvider(), retry_delay=0, rate_limit_delay=0)
+    dag.add_node(llm)
+    dag.add_node(dummy_node)
+    dag.add_edge(llm, dummy_node)
+    path = tmp_path / "trace.json"
+
+    await dag.execute({}, trace_path=str(path))
+
+    events = json.loads(path.read_text())["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+    nodes = {e["args"]["node.id"]: e for e in spans if e["cat"] == "node"}
+    assert set(nodes) == {llm.get_id(), dummy_node.get_id()}
+    assert nodes[llm.get_id()]["args"]["node.status"] == "SUCCESS"
+    assert nodes[llm.get_id()]["name"] == llm.get_name()
+    lane = nodes[llm.get_id()]["tid"]
+    names = [e["name"] for e in spans if e["tid"] == lane and e["cat"] == "llm"]
+    assert names.count("llm.attempt") == 3
+    assert "rate_limit_wait" in names and "backoff" in names
+    attempts = [e for e in spans if e["name"] == "llm.attempt"]
+    assert [e["args"].get("error.type") for e in attempts] == [
+        "RateLimitError",
+        "APIError",
+        None,
+    ]
+    edges = [e for e in spans if e["name"] == "edge"]
+    assert edges[0]["args"]["to"] == dummy_node.get_id()
+    assert any(e["name"] == "thread_name" for e in events)
+
+    # the failing node's span is still written
+    dummy_node.set_input_s({"missing": str})
+    with pytest.raises(ValueError):
+        await dag.execute({}, trace_path=str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    failed = [
+        e for e in events if e.get("args", {}).get("node.id") == dummy_node.get_id()
+    ]
+    assert failed[0]["args"]["node.status"] == "FAILED"
+
+
+@pytest.mark.asyncio
+async def test_execute_release_intermediates(dag: DAG, dummy_node) -> None:
+    class BlobNode(type(dummy_node)):
+        async def execute(self) -> dict:
+            self.output = {"blob": self.name * 250000}
+            return self.output
+
+    def build(n: int) -> list[Node]:
+        nodes = [BlobNode(f"n{i}") for i in range(n)]
+        chain = DAG()
+        for node in nodes:
+            chain.add_node(node)
+        for parent, child in zip(nodes, nodes[1:]):
+            chain.add_edge(parent, child)
+        return chain, nodes
+
+    async def peak(release: bool) -> int:
+        chain, nodes = build(20)
+        tracemalloc.start()
+        try:
+            res = await chain.execute({}, release_intermediates=release)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert res[0]["blob"].startswith("n19")
+        assert nodes[-1].get_output() == res[0]
+        return peak, nodes
+
+    kept, nodes = await peak(False)
+    assert nodes[0].get_output() and nodes[1].get_input()
+    released, nodes = await peak(True)
+    assert all(node.get_output() == {} for node in nodes[:-1])
+    assert all(node.get_input() == {} for node in nodes)
+    # two or three blobs alive at once instead of all twenty
+    assert released < kept / 3
+
+    # a parent is kept until its last child has finished
+    seen = []
+
+    class Reader(type(dummy_node)):
+        async def execute(self) -> dict:
+            seen.append(bool(dummy_node.get_output()))
+            self.output = {"read": True}
+            return self.output
+
+    dummy_node.set_output_s(dict)
+
+    async def source() -> dict:
+        dummy_node.output = {"blob": "x"}
+
+    dummy_node.execute = source
+    first, second = Reader("r1"), Reader("r2")
+    for node in (dummy_node, first, second):
+        dag.add_node(node)
+    dag.add_edge(dummy_node, first)
+    dag.add_edge(dummy_node, second)
+    res = await dag.execute({}, batch_siblings=False, release_intermediates=True)
+    assert seen == [True, True]
+    assert dummy_node.get_output() == {}
+    assert list(res) == [{"read": True}, {"read": True}]
+
+
+@pytest.mark.asyncio
+async def test_execute_release_keeps_root_input(dag: DAG, dummy_node) -> None:
+    class Echo(type(dummy_node)):
+        async def execute(self) -> dict:
+            self.output = {"text": self.input.get("text")}
+            return self.output
+
+    root, child = Echo("root"), Echo("child")
+    root.set_input({"text": "hello"})
+    dag.add_node(root)
+    dag.add_node(child)
+    dag.add_edge(root, child)
+    for _ in range(2):
+        res = await dag.execute({}, release_intermediates=True)
+        assert list(res) == [{"text": "hello"}]
+    assert root.get_input() == {"text": "hello"}
+    assert child.get_input() == {}
+
+
+@pytest.mark.asyncio
+async def test_execute_proof_needs_validated_strict_parent(
+    dag: DAG, dummy_node, dummy_node_2
+) -> None:
+    class Source(type(dummy_node)):
+        async def execute(self) -> dict:
+            self.output = dict(self.execute_args["kwargs"]["out"])
+            return self.output
+
+    source = Source("source")
+    source.set_output_s({Required("a"): int})
+    dummy_node_2.set_input_s({Required("a"): int})
+    dag.add_node(source)
+    dag.add_node(dummy_node_2)
+    dag.add_edge(source, dummy_node_2)
+    assert dag.check_edges()["proven"] == [dummy_node_2.get_id()]
+
+    # the parent's output is never checked, so the child has to be
+    bad = {source.get_id(): {"kwargs": {"out": {"a": "not an int"}}}}
+    with pytest.raises(ValueError, match="input .* is not valid"):
+        await dag.execute(bad, validation="edges-only")
+
+    # extra keys an ALLOW_EXTRA parent lets through reach a strict child
+    source._output_s = compile_schema({Required("a"): int}, extra=ALLOW_EXTRA)
+    assert dag.check_edges()["unproven"] == [dummy_node_2.get_id()]
+    extra = {source.get_id(): {"kwargs": {"out": {"a": 1, "z": 2}}}}
+    with pytest.raises(ValueError, match="input .* is not valid"):
+        await dag.execute(extra)
+
+    # keys the child already held before the edge fed it aren't covered either
+    source._output_s = compile_schema({Required("a"): int})
+    good = {source.get_id(): {"kwargs": {"out": {"a": 1}}}}
+    dummy_node_2.set_input({"junk": "x"})
+    with pytest.raises(ValueError, match="input .* is not valid"):
+        await dag.execute(good)
+    dummy_node_2.set_input({}, wipe=True)
+    await dag.execute(good, release_intermediates=True)
+    assert dummy_node_2.get_input() == {}
@@ -0,0 +1,62 @@
+import pytest
+from voluptuous import All, Any, In, Length, Range, Required, Schema
+
+from trellis_dag import LLM, Node
+from trellis_dag.utils.constants import OPENAI_RESPONSE_SCHEMA
+from trellis_dag.utils.generate import generate_data, generate_input, generate_output
+
+SPEC = {
+    Required("name"): All(str, Length(min=2, max=4)),
+    "score": Range(0, 10),
+    "kind": In(["a", "b"]),
+    "tags": [str],
+    "meta": {"note": Any(str, None), "extra": dict},
+    "counts": {str: int},
+}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_generated_data_matches_schema(seed: int) -> None:
+    data = generate_data(SPEC, seed=seed)
+    assert Schema(SPEC)(data) == data
+    assert 2 <= len(data["name"]) <= 4
+
+
+def test_generation_is_seeded_and_sized() -> None:
+    assert generate_data(SPEC, seed=3) == generate_data(SPEC, seed=3)
+    data = generate_data({"text": str, "items": [int]}, string_length=50, list_length=7)
+    assert len(data["text"]) == 50
+    assert len(data["items"]) == 7
+    shallow = generate_data({"a": {"b": {"c": [int]}}}, max_depth=2)
+    assert shallow == {"a": {"b": {"c": []}}}
+    assert generate_data({"a": int, "b": int}, optional_rate=0.0) == {}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_near_miss_is_rejected(seed: int) -> None:
+    data = generate_data(SPEC, seed=seed, invalid=True)
+    with pytest.raises(Exception):
+        Schema(SPEC)(data)
+    valid = generate_data(SPEC, seed=seed)
+    # a near miss differs from valid data in one place only
+    assert len(set(data) ^ set(valid)) <= 1
+
+
+def test_generate_for_nodes(dummy_node: Node) -> None:
+    dummy_node.set_input_s({"a": int, Required("b"): [str]})
+    assert dummy_node._input_s(generate_input(dummy_node, seed=1))
+    dummy_node.set_input(generate_input(dummy_node, seed=1, invalid=True))
+    assert not dummy_node.validate_input()
+
+    llm = LLM("llm")
+    output = generate_output(llm, list_length=1, seed=1)
+    assert Schema(OPENAI_RESPONSE_SCHEMA)(output)
+    assert len(output["choices"]) == 1
+
+
+def test_ungeneratable_schema() -> None:
+    with pytest.raises(ValueError, match="Cannot generate"):
+        generate_data({"a": lambda v: v})
+    with pytest.raises(ValueError, match="invalid value"):
+        # every value is an object, so nothing can miss
+        generate_data(object, invalid=True)
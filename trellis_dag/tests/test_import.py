@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+
+def _run(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def test_core_import_is_lazy() -> None:
+    out = _run(
+        "import sys, logging\n"
+        "from trellis_dag import DAG, Node\n"
+        "import trellis_dag.dag\n"
+        "heavy = ('openai', 'posthog', 'dotenv', 'cProfile', 'pstats', 'tracemalloc')\n"
+        "print(sorted(m for m in heavy if m in sys.modules))\n"
+        "print(len(logging.getLogger().handlers))"
+    )
+    assert out.splitlines() == ["[]", "0"]
+
+
+def test_llm_and_logging_are_opt_in() -> None:
+    out = _run(
+        "import sys, logging, trellis_dag\n"
+        "trellis_dag.LLM\n"
+        "print('openai' in sys.modules)\n"
+        "trellis_dag.configure_logging('WARNING')\n"
+        "print(logging.getLogger().level == logging.WARNING)"
+    )
+    assert out.splitlines() == ["True", "True"]
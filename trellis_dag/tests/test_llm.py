@@ -126,7 +126,7 @@ async def test_free_execute(llm, car_messages) -> None:
 @pytest.mark.asyncio
 @pytest.mark.parametrize("mocked_exception", EXCEPTIONS_TO_TEST)
 async def test_openai_errors(llm, car_messages, mocker, mocked_exception):
-    mocker.patch.object(openai.ChatCompletion, "create", side_effect=mocked_exception)
+    mocker.patch.object(openai.ChatCompletion, "acreate", side_effect=mocked_exception)
 
     llm.set_input({"car": "Tesla"})
     llm.set_messages(car_messages)
@@ -134,3 +134,155 @@ async def test_openai_errors(llm, car_messages, mocker, mocked_exception):
 
     with pytest.raises(type(mocked_exception)):
         await llm.execute()
+
+
+@pytest.fixture
+def openai_response() -> openai.openai_object.OpenAIObject:
+    return openai.openai_object.OpenAIObject.construct_from(
+        {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 1692000000,
+            "model": "gpt-3.5-turbo",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "Sounds bad."},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 20, "completion_tokens": 3, "total_tokens": 23},
+        }
+    )
+
+
+def test_prompt_variables(llm, car_messages) -> None:
+    llm.set_messages(car_messages)
+    assert llm.get_prompt_variables() == {"car"}
+    assert llm.get_prompt().render({"car": "Tesla"})[1] == {
+        "role": "user",
+        "content": "Hello my Tesla is broken.",
+    }
+    # missing variables leave the template untouched
+    assert llm.get_prompt().render({"boat": "Yacht"}) == car_messages
+
+
+def test_messages_that_are_not_templates() -> None:
+    # a lone brace (JSON examples) and extra keys are fine, sent as written
+    messages = [
+        {"role": "system", "content": 'Answer like {"ok": true', "name": "rules"},
+        {"role": "user", "content": "Hello my {car} is broken."},
+    ]
+    llm = LLM("test_llm", messages=messages)
+    assert llm.get_prompt_variables() == {"car"}
+    assert llm.get_prompt().render({"car": "Tesla"}) == [
+        messages[0],
+        {"role": "user", "content": "Hello my Tesla is broken."},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_execute_does_not_mutate_messages(
+    llm, car_messages, mocker, openai_response
+) -> None:
+    create = mocker.patch.object(
+        openai.ChatCompletion, "acreate", return_value=openai_response
+    )
+    llm.set_messages(car_messages)
+
+    llm.set_input({"car": "Tesla"})
+    await llm.execute()
+    assert (
+        create.call_args.kwargs["messages"][1]["content"] == "Hello my Tesla is broken."
+    )
+    assert car_messages[1]["content"] == "Hello my {car} is broken."
+
+    llm.set_input({"car": "Ford"})
+    await llm.execute()
+    assert (
+        create.call_args.kwargs["messages"][1]["content"] == "Hello my Ford is broken."
+    )
+
+
+def test_estimate_prompt_tokens(llm, car_messages) -> None:
+    llm.set_messages(car_messages)
+    assert llm.get_context_window() == 4096
+    assert 10 < llm.estimate_prompt_tokens({"car": "Tesla"}) < 40
+
+
+def test_set_truncation_failure(llm) -> None:
+    with pytest.raises(ValueError, match="is not a valid strategy"):
+        llm.set_truncation("drop_newest")
+
+
+@pytest.mark.asyncio
+async def test_execute_prompt_too_large(llm, mocker) -> None:
+    create = mocker.patch.object(openai.ChatCompletion, "acreate")
+    llm.set_messages([{"role": "user", "content": "word " * 5000}])
+    with pytest.raises(ValueError, match="does not fit"):
+        await llm.execute()
+    create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_execute_truncates_and_clamps(llm, mocker, openai_response) -> None:
+    create = mocker.patch.object(
+        openai.ChatCompletion, "acreate", return_value=openai_response
+    )
+    history = [{"role": "system", "content": "You are a helpful auto mechanic."}]
+    history += [{"role": "user", "content": "word " * 1000} for _ in range(5)]
+    history.append({"role": "user", "content": "What now?"})
+    llm.set_messages(history)
+    llm.set_truncation("drop_oldest")
+    llm.set_execute_args(max_tokens=1000)
+    await llm.execute()
+    sent = create.call_args.kwargs["messages"]
+    assert sent[0] == history[0]
+    assert sent[-1] == history[-1]
+    assert len(sent) < len(history)
+    assert create.call_args.kwargs["max_tokens"] == 1000
+
+    llm.set_messages([{"role": "user", "content": "word " * 3000}])
+    llm.set_truncation(None)
+    await llm.execute()
+    assert create.call_args.kwargs["max_tokens"] < 1000
+
+
+def test_set_output_mode_failure(llm) -> None:
+    with pytest.raises(ValueError, match="is not a valid mode"):
+        llm.set_output_mode("tiny")
+
+
+@pytest.mark.asyncio
+async def test_execute_output_modes(llm, mocker, openai_response) -> None:
+    mocker.patch.object(openai.ChatCompletion, "acreate", return_value=openai_response)
+    res = await llm.execute()
+    assert type(res) is dict
+    assert res["choices"][0]["message"]["content"] == "Sounds bad."
+    assert llm.get_raw_response() is None
+
+    llm.set_output_mode("slim")
+    llm.set_keep_raw_response(True)
+    res = await llm.execute()
+    assert res == {
+        "content": "Sounds bad.",
+        "finish_reason": "stop",
+        "usage": {"prompt_tokens": 20, "completion_tokens": 3, "total_tokens": 23},
+    }
+    assert llm.validate_output()
+    assert llm.get_raw_response() is openai_response
+
+    llm.set_output({**res, "extra": 1})
+    assert not llm.validate_output()
+
+
+def test_set_output_mode_keeps_custom_schema(llm) -> None:
+    custom = {"content": str}
+    llm.set_output_s(custom)
+    llm.set_output_mode("slim")
+    assert llm._output_s.schema == custom
+    llm.set_output_mode("full")
+    assert llm._output_s.schema == custom
+
+    llm = LLM("test_llm", output_s=custom, output_mode="slim")
+    assert llm._output_s.schema == custom
@@ -0,0 +1,137 @@
+import urllib.request
+
+import openai
+import pytest
+
+from trellis_dag import DAG, LLM
+from trellis_dag.providers import FakeProvider
+from trellis_dag.utils.metrics import (
+    CONTENT_TYPE,
+    IN_FLIGHT_RUNS,
+    LLM_LATENCY,
+    LLM_REQUESTS,
+    LLM_RETRIES,
+    LLM_TOKENS,
+    NODE_EXECUTIONS,
+    NODE_LATENCY,
+    RUNS,
+    MetricsRegistry,
+    exposition,
+    start_metrics_server,
+)
+
+
+class FlakyProvider(FakeProvider):
+    async def chat_completion(self, model, messages, **params):
+        if self.calls < 1:
+            self.calls += 1
+            raise openai.error.Timeout("Fake timeout", None)
+        return await super().chat_completion(model, messages, **params)
+
+
+def test_exposition_format() -> None:
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls made.", ("kind",))
+    calls.inc(kind="a")
+    calls.inc(2, kind='say "hi"')
+    registry.gauge("queue", "Queue depth.").set(3)
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    assert registry.exposition() == "\n".join(
+        [
+            "# HELP calls_total Calls made.",
+            "# TYPE calls_total counter",
+            'calls_total{kind="a"} 1',
+            'calls_total{kind="say \\"hi\\""} 2',
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            "latency_seconds_sum 5.55",
+            "latency_seconds_count 3",
+            "# HELP queue Queue depth.",
+            "# TYPE queue gauge",
+            "queue 3",
+            "",
+        ]
+    )
+    assert latency.get() == {"count": 3, "sum": 5.55}
+    assert registry.counter("calls_total", "Calls made.", ("kind",)) is calls
+    with pytest.raises(ValueError, match="already registered"):
+        registry.gauge("calls_total", "Calls made.")
+    with pytest.raises(ValueError, match="takes labels"):
+        calls.inc(other="a")
+    with pytest.raises(ValueError, match="only increase"):
+        calls.inc(-1, kind="a")
+
+
+@pytest.mark.asyncio
+async def test_run_metrics(dummy_node) -> None:
+    dag = DAG()
+    llm = LLM("LLM1", provider=FlakyProvider(), retry_delay=0)
+    dag.add_node(llm)
+    dag.add_node(dummy_node)
+    dag.add_edge(llm, dummy_node)
+    model = llm.get_model()
+    before = {
+        "llm": NODE_EXECUTIONS.get(node_class="LLM", status="SUCCESS"),
+        "dummy": NODE_EXECUTIONS.get(node_class="DummyNode", status="SUCCESS"),
+        "failed": NODE_EXECUTIONS.get(node_class="DummyNode", status="FAILED"),
+        "latency": NODE_LATENCY.get(node_class="LLM")["count"],
+        "runs": RUNS.get(status="SUCCESS"),
+        "failed_runs": RUNS.get(status="FAILED"),
+        "ok": LLM_REQUESTS.get(model=model, outcome="ok"),
+        "timeouts": LLM_REQUESTS.get(model=model, outcome="Timeout"),
+        "attempts": LLM_LATENCY.get(model=model)["count"],
+        "retries": LLM_RETRIES.get(model=model, error="Timeout"),
+        "tokens": LLM_TOKENS.get(model=model, kind="prompt"),
+    }
+
+    await dag.execute({})
+
+    assert NODE_EXECUTIONS.get(node_class="LLM", status="SUCCESS") == before["llm"] + 1
+    assert (
+        NODE_EXECUTIONS.get(node_class="DummyNode", status="SUCCESS")
+        == before["dummy"] + 1
+    )
+    assert NODE_LATENCY.get(node_class="LLM")["count"] == before["latency"] + 1
+    assert RUNS.get(status="SUCCESS") == before["runs"] + 1
+    assert LLM_REQUESTS.get(model=model, outcome="ok") == before["ok"] + 1
+    assert LLM_REQUESTS.get(model=model, outcome="Timeout") == before["timeouts"] + 1
+    assert LLM_LATENCY.get(model=model)["count"] == before["attempts"] + 2
+    assert LLM_RETRIES.get(model=model, error="Timeout") == before["retries"] + 1
+    assert LLM_TOKENS.get(model=model, kind="prompt") > before["tokens"]
+    assert IN_FLIGHT_RUNS.get() == 0
+
+    dummy_node.set_input_s({"missing": str})
+    with pytest.raises(ValueError):
+        await dag.execute({})
+    assert (
+        NODE_EXECUTIONS.get(node_class="DummyNode", status="FAILED")
+        == before["failed"] + 1
+    )
+    assert RUNS.get(status="FAILED") == before["failed_runs"] + 1
+    assert IN_FLIGHT_RUNS.get() == 0
+
+    text = exposition()
+    assert "\ntrellis_nodes_in_flight 0\n" in text
+    assert 'trellis_cache_hits_total{cache="schema"}' in text
+    assert "# TYPE trellis_llm_request_duration_seconds histogram" in text
+
+
+def test_metrics_server() -> None:
+    registry = MetricsRegistry()
+    registry.counter("up_total", "Scrapes.").inc()
+    server = start_metrics_server(port=0, registry=registry)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert "up_total 1" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
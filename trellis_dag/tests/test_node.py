@@ -2,6 +2,8 @@ import pytest
 from voluptuous import Invalid
 
 from trellis_dag import Node
+from trellis_dag.node import set_id_factory
+from trellis_dag.utils.schema import clear_schema_cache, schema_cache_info
 
 
 def test_init(dummy_node: Node) -> None:
@@ -60,6 +62,11 @@ async def test_pre_hook(dummy_node: Node) -> None:
     assert dummy_node.get_status() == "EXECUTING"
 
 
+def test_default_hooks_pass_through(dummy_node: Node) -> None:
+    assert dummy_node.pre_execute_hook({"a": 1}) == {"a": 1}
+    assert dummy_node.post_execute_hook({"b": 2}) == {"b": 2}
+
+
 def test_pre_hook_failure(dummy_node: Node) -> None:
     with pytest.raises(ValueError, match="is not a callable function"):
         dummy_node.set_pre_execute_hook(4)
@@ -79,3 +86,67 @@ async def test_post_hook(dummy_node: Node) -> None:
 def test_post_hook_failure(dummy_node: Node) -> None:
     with pytest.raises(ValueError, match="is not a callable function"):
         dummy_node.set_post_execute_hook(4)
+
+
+def test_node_is_slotted() -> None:
+    class SlimNode(Node):
+        __slots__ = ()
+
+        async def execute(self) -> None:
+            pass
+
+    node = SlimNode("slim")
+    assert not hasattr(node, "__dict__")
+    with pytest.raises(AttributeError):
+        node.unknown_attribute = 1
+
+
+def test_counter_ids(dummy_node: Node) -> None:
+    DummyNode = type(dummy_node)
+    set_id_factory("counter")
+    try:
+        a, b = DummyNode("a"), DummyNode("b")
+        assert a.get_id() != b.get_id()
+        assert isinstance(a.get_id(), str)
+    finally:
+        set_id_factory("uuid")
+    assert len(DummyNode("c").get_id()) == 32
+    with pytest.raises(ValueError, match="is not one of"):
+        set_id_factory("sequential")
+
+
+@pytest.mark.asyncio
+async def test_default_hooks_pass_through(dummy_node: Node) -> None:
+    dummy_node.set_input({"a": 1})
+    dummy_node.set_output({"b": 2})
+    await dummy_node._pre_hook()
+    await dummy_node._post_hook()
+    assert dummy_node.get_input() == {"a": 1}
+    assert dummy_node.get_output() == {"b": 2}
+
+
+def test_schemas_are_shared(dummy_node: Node, dummy_node_2: Node) -> None:
+    clear_schema_cache()
+    dummy_node.set_input_s({"a": int, "b": [str]})
+    dummy_node_2.set_input_s({"b": [str], "a": int})
+    assert dummy_node._input_s is dummy_node_2._input_s
+    assert schema_cache_info() == {"hits": 1, "misses": 1, "size": 1}
+
+    dummy_node_2.set_input_s({"a": float, "b": [str]})
+    assert dummy_node._input_s is not dummy_node_2._input_s
+    dummy_node.set_input({"a": 1, "b": ["x"]})
+    assert dummy_node.validate_input()
+
+
+def test_debug_logs_are_structured_and_truncated(dummy_node: Node, caplog) -> None:
+    with caplog.at_level("INFO"):
+        dummy_node.set_output({"text": "x" * 10000})
+    assert not caplog.records
+
+    with caplog.at_level("DEBUG"):
+        dummy_node.set_output({"text": "x" * 10000})
+    record = caplog.records[-1]
+    assert record.event == "node.output.set"
+    assert record.fields["id"] == dummy_node.get_id()
+    assert record.fields["output"].value["text"] == "x" * 10000
+    assert len(record.getMessage()) < 500
@@ -0,0 +1,129 @@
+import asyncio
+import tracemalloc
+import pytest
+
+from trellis_dag import DAG, Node
+from trellis_dag.utils.profiling import NodeProfiler
+
+
+def busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+class BusyNode(Node):
+    async def execute(self) -> dict:
+        self.output = {"total": busy(20000), "blob": [str(i) * 50 for i in range(2000)]}
+        return self.output
+
+
+def heavy_edge(output: dict) -> dict:
+    return {"total": busy(5000)}
+
+
+@pytest.fixture
+def busy_dag(dummy_node) -> tuple[DAG, BusyNode]:
+    dag = DAG()
+    node = BusyNode("busy")
+    dag.add_node(node)
+    dag.add_node(dummy_node)
+    dag.add_edge(node, dummy_node, fn=heavy_edge)
+    return dag, node
+
+
+@pytest.mark.asyncio
+async def test_profile_selected_nodes(busy_dag, dummy_node) -> None:
+    dag, node = busy_dag
+    profiler = NodeProfiler(classes=[BusyNode])
+
+    res = await dag.execute({}, profile=profiler)
+
+    assert set(res.profile["nodes"]) == {node.get_id()}
+    entry = res.profile["nodes"][node.get_id()]
+    assert entry["executions"] == 1
+    assert set(entry["phases"]) == {"execute", "propagate"}
+    functions = [row["function"] for row in entry["functions"]]
+    assert any("(busy)" in f or "(<genexpr>)" in f for f in functions)
+    assert any("heavy_edge" in row["function"] for row in _all_rows(profiler, node))
+    assert entry["allocated"] > 100000
+    assert any("test_profiling.py" in a["location"] for a in entry["allocations"])
+    assert res.profile["by_class"]["BusyNode"]["executions"] == 1
+
+    await dag.execute({}, profile=profiler)
+    assert profiler.report()["nodes"][node.get_id()]["executions"] == 2
+    assert "BusyNode: 1 nodes, 2 executions" in profiler.format()
+
+
+def _all_rows(profiler: NodeProfiler, node: Node) -> list[dict]:
+    return profiler.report(top=1000)["nodes"][node.get_id()]["functions"]
+
+
+@pytest.mark.asyncio
+async def test_profile_selection(busy_dag, dummy_node) -> None:
+    dag, node = busy_dag
+
+    res = await dag.execute({}, profile=NodeProfiler(node_ids=[dummy_node.get_id()]))
+    assert set(res.profile["nodes"]) == {dummy_node.get_id()}
+    res = await dag.execute({}, profile=NodeProfiler(memory=False))
+    assert set(res.profile["nodes"]) == {node.get_id(), dummy_node.get_id()}
+    assert res.profile["nodes"][node.get_id()]["allocated"] == 0
+    res = await dag.execute({}, profile=NodeProfiler(sample_rate=0.0))
+    assert res.profile["nodes"] == {}
+    res = await dag.execute({})
+    assert res.profile is None
+
+    with pytest.raises(ValueError, match="NodeProfiler"):
+        await dag.execute({}, profile=True)
+    with pytest.raises(ValueError, match="Sample rate"):
+        NodeProfiler(sample_rate=2)
+
+
+class SleepyNode(Node):
+    async def execute(self) -> dict:
+        await asyncio.sleep(0.02)
+        self.output = {"total": busy(1000)}
+        return self.output
+
+
+@pytest.mark.asyncio
+async def test_profile_shared_by_concurrent_runs() -> None:
+    assert not tracemalloc.is_tracing()
+    profiler = NodeProfiler()
+    dags = []
+    for i in range(3):
+        dag = DAG()
+        dag.add_node(SleepyNode(f"sleepy{i}"))
+        dags.append(dag)
+
+    results = await asyncio.gather(*(dag.execute({}, profile=profiler) for dag in dags))
+
+    assert all(r.profile is not None for r in results)
+    # the runs overlap, nodes whose turn came while another was profiled
+    # are skipped rather than clobbering its profiler
+    report = profiler.report()
+    executions = sum(n["executions"] for n in report["nodes"].values())
+    assert executions >= 1
+    assert report["skipped"] >= 1
+    assert not tracemalloc.is_tracing()
+
+
+def test_profile_tracing_is_reference_counted() -> None:
+    first, second = NodeProfiler(), NodeProfiler()
+    first.start_run()
+    second.start_run()
+    first.start_run()
+    first.stop_run()
+    second.stop_run()
+    assert tracemalloc.is_tracing()
+    first.stop_run()
+    assert not tracemalloc.is_tracing()
+    # unbalanced stops do nothing
+    first.stop_run()
+
+    tracemalloc.start()
+    try:
+        first.start_run()
+        first.stop_run()
+        # tracing the application started is left on
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,164 @@
+import json
+import time
+import pytest
+import openai
+
+from trellis_dag import DAG, LLM, Node
+from trellis_dag.providers import FakeProvider, OpenAIProvider, get_default_provider
+from trellis_dag.providers import CassetteProvider, CassetteMissError, get_cassette
+from trellis_dag.providers.cassette import Cassette
+
+
+@pytest.fixture
+def fake_provider() -> FakeProvider:
+    return FakeProvider(latency=0.01, jitter=0.005, seed=7)
+
+
+def test_default_provider() -> None:
+    llm = LLM("test_llm")
+    assert isinstance(llm.get_provider(), OpenAIProvider)
+    assert llm.get_provider() is get_default_provider()
+
+
+def test_set_provider_failure() -> None:
+    llm = LLM("test_llm")
+    with pytest.raises(ValueError, match="is not a valid Provider"):
+        llm.set_provider("openai")
+
+
+def test_fake_provider_bad_config() -> None:
+    with pytest.raises(ValueError, match="is not a valid distribution"):
+        FakeProvider(distribution="pareto")
+    with pytest.raises(ValueError, match="is not between 0 and 1"):
+        FakeProvider(error_rate=2)
+
+
+@pytest.mark.parametrize(
+    "distribution", ["constant", "uniform", "normal", "lognormal", "exponential"]
+)
+def test_fake_provider_latency(distribution) -> None:
+    provider = FakeProvider(latency=0.2, jitter=0.1, distribution=distribution, seed=1)
+    samples = [provider.sample_latency() for _ in range(200)]
+    assert all(s >= 0 for s in samples)
+    assert 0.1 < sum(samples) / len(samples) < 0.4
+
+
+@pytest.mark.asyncio
+async def test_llm_with_fake_provider(fake_provider) -> None:
+    llm = LLM("test_llm", provider=fake_provider)
+    llm.set_execute_args(n=2)
+    res = await llm.execute()
+    assert len(res["choices"]) == 2
+    assert res["usage"]["total_tokens"] > 0
+    assert llm.validate_output()
+    assert fake_provider.calls == 1
+
+
+class PlainFakeProvider(FakeProvider):
+    # answers with plain dicts, like cassette replays and most custom providers
+    async def chat_completion(
+        self, model: str, messages: list[dict], **params: dict
+    ) -> dict:
+        response = await super().chat_completion(model, messages, **params)
+        return response.to_dict_recursive()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider_class", [FakeProvider, PlainFakeProvider])
+async def test_batched_siblings_with_fake_provider(provider_class) -> None:
+    class Topic(Node):
+        async def execute(self) -> dict:
+            self.set_output({"topic": "bridges"})
+            return self.output
+
+    provider = provider_class(seed=5)
+    messages = [{"role": "user", "content": "Tell me about {topic}."}]
+    llms = [LLM(f"LLM{i}", messages=messages, provider=provider) for i in range(2)]
+    topic = Topic("topic")
+    dag = DAG()
+    dag.add_node(topic)
+    for llm in llms:
+        dag.add_node(llm)
+        dag.add_edge(topic, llm)
+
+    res = await dag.execute({}, batch_siblings=True)
+
+    assert provider.calls == 1
+    contents = sorted(r["choices"][0]["message"]["content"] for r in res)
+    assert contents == [
+        "Fake response 0 to: Tell me about bridges.",
+        "Fake response 1 to: Tell me about bridges.",
+    ]
+    assert all(llm.get_status() == "SUCCESS" for llm in llms)
+
+
+@pytest.mark.asyncio
+async def test_fake_provider_rate_limit() -> None:
+    provider = FakeProvider(rate_limit_rate=1.0)
+    llm = LLM("test_llm", provider=provider, max_retries=2, rate_limit_delay=0)
+    with pytest.raises(openai.error.RateLimitError):
+        await llm.execute()
+    assert provider.calls == 2
+    assert provider.rate_limited == 2
+
+
+@pytest.mark.asyncio
+async def test_fake_provider_errors() -> None:
+    provider = FakeProvider(error_rate=1.0, errors=(openai.error.Timeout,))
+    llm = LLM("test_llm", provider=provider, max_retries=3, retry_delay=0)
+    with pytest.raises(openai.error.Timeout):
+        await llm.execute()
+    assert provider.failures == 3
+
+
+@pytest.mark.asyncio
+async def test_cassette_record_and_replay(tmp_path) -> None:
+    path = str(tmp_path / "traffic.jsonl")
+    backend = FakeProvider(latency=0.05, seed=3)
+    llm = LLM("test_llm", provider=backend)
+    llm.set_cassette(path, mode="record")
+    recorded = await llm.execute()
+    assert backend.calls == 1
+    with open(path) as f:
+        entry = json.loads(f.readline())
+    assert entry["latency"] >= 0.05
+
+    # a fresh cassette object, as in a later process
+    replay = CassetteProvider(Cassette(path), mode="replay", timing="none")
+    llm.set_provider(replay)
+    start = time.monotonic()
+    replayed = await llm.execute()
+    assert time.monotonic() - start < 0.05
+    assert replayed == recorded
+    assert backend.calls == 1
+
+    llm.set_provider(CassetteProvider(Cassette(path), mode="replay"))
+    start = time.monotonic()
+    await llm.execute()
+    assert time.monotonic() - start >= 0.05
+
+    llm.set_messages([{"role": "user", "content": "Something new"}])
+    with pytest.raises(CassetteMissError):
+        await llm.execute()
+
+
+@pytest.mark.asyncio
+async def test_cassette_auto_mode(tmp_path) -> None:
+    path = str(tmp_path / "auto.jsonl")
+    backend = FakeProvider(seed=3)
+    llms = [LLM(f"llm{i}", provider=backend) for i in range(2)]
+    for llm in llms:
+        llm.set_cassette(path, mode="auto", timing="none")
+    # siblings on the same file share a provider, so they can still batch
+    assert llms[0].batch_key() == llms[1].batch_key()
+    for llm in llms:
+        await llm.execute()
+    assert backend.calls == 1
+    cassette = get_cassette(path)
+    assert cassette.stats()["recorded"] == 1
+    assert cassette.stats()["hits"] == 1
+
+    with pytest.raises(ValueError, match="needs a provider"):
+        CassetteProvider(path, mode="record")
+    with pytest.raises(ValueError, match="Cassette mode"):
+        llms[0].set_cassette(path, mode="rewind")
@@ -0,0 +1,323 @@
+import asyncio
+import pytest
+import openai
+
+from trellis_dag import LLM
+from trellis_dag.providers import FakeProvider
+from trellis_dag.utils.breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from trellis_dag.utils.concurrency import AdaptiveLimiter
+from trellis_dag.utils.hedging import HedgePolicy, LatencyTracker
+from trellis_dag.utils.metrics import exposition
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock) -> CircuitBreaker:
+    return CircuitBreaker(
+        "test", failure_rate=0.5, window=4, min_calls=4, open_timeout=10, clock=clock
+    )
+
+
+def test_breaker_opens_and_recovers(breaker, clock) -> None:
+    assert breaker.get_state() == "CLOSED"
+    for _ in range(2):
+        breaker.record_success(0.1)
+        breaker.record_failure(0.1)
+    assert breaker.get_state() == "OPEN"
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now = 10
+    assert breaker.get_state() == "HALF_OPEN"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.get_state() == "OPEN"
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.get_state() == "CLOSED"
+    assert breaker.stats()["times_opened"] == 2
+    assert breaker.stats()["rejected"] == 3
+
+
+def test_breaker_opens_on_slow_calls(clock) -> None:
+    breaker = CircuitBreaker(
+        "slow", slow_call_threshold=1.0, slow_call_rate=0.5, min_calls=2, clock=clock
+    )
+    breaker.record_success(2.0)
+    breaker.record_success(3.0)
+    assert breaker.get_state() == "OPEN"
+
+
+def test_get_breaker_is_shared() -> None:
+    assert get_breaker("openai:gpt-4") is get_breaker("openai:gpt-4")
+    assert get_breaker("openai:gpt-4") is not get_breaker("openai:gpt-3.5-turbo")
+
+
+@pytest.mark.asyncio
+async def test_llm_fails_fast_when_open(breaker) -> None:
+    provider = FakeProvider(error_rate=1.0)
+    llm = LLM(
+        "test_llm",
+        provider=provider,
+        circuit_breaker=breaker,
+        max_retries=10,
+        retry_delay=0,
+    )
+    with pytest.raises(openai.error.OpenAIError):
+        await llm.execute()
+    # the breaker trips after min_calls failures and the retry loop stops there
+    assert provider.calls == 4
+    with pytest.raises(CircuitOpenError):
+        await llm.execute()
+    assert provider.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_llm_falls_back_when_open(breaker) -> None:
+    for _ in range(4):
+        breaker.record_failure()
+    llm = LLM(
+        "test_llm",
+        provider=FakeProvider(),
+        circuit_breaker=breaker,
+        fallback_model="gpt-3.5-turbo-16k",
+    )
+    res = await llm.execute()
+    assert res["model"] == "gpt-3.5-turbo-16k"
+
+
+class SlowFirstProvider(FakeProvider):
+    # the first request stalls, later ones answer quickly
+    async def chat_completion(self, model, messages, **params):
+        if self.calls == 0:
+            self.calls += 1
+            await asyncio.sleep(5)
+        return await super().chat_completion(model, messages, **params)
+
+
+class CancelledFirstProvider(FakeProvider):
+    # the first request stalls and is then cancelled underneath us, the hedge
+    # answers later
+    async def chat_completion(self, model, messages, **params):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(0.1)
+            raise asyncio.CancelledError()
+        await asyncio.sleep(0.2)
+        return await super().chat_completion(model, messages, **params)
+
+
+class StubbornFirstProvider(FakeProvider):
+    # the first request ignores being cancelled and answers anyway, like a
+    # client that can't abort a request already in flight
+    async def chat_completion(self, model, messages, **params):
+        self.calls += 1
+        if self.calls == 1:
+            try:
+                await asyncio.sleep(0.2)
+            except asyncio.CancelledError:
+                pass
+            return {"usage": {"prompt_tokens": 5, "completion_tokens": 7}}
+        return await super().chat_completion(model, messages, **params)
+
+
+def test_latency_tracker() -> None:
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(50) is None
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    assert tracker.percentile(50) == 0.5
+    assert tracker.percentile(99) == 0.99
+
+
+def test_hedge_policy_failure() -> None:
+    with pytest.raises(ValueError, match="is not in"):
+        HedgePolicy(percentile=0)
+    with pytest.raises(ValueError, match="is not a valid OpenAI model"):
+        HedgePolicy(fallback_model="gpt-5")
+
+
+@pytest.mark.asyncio
+async def test_llm_hedges_slow_request() -> None:
+    provider = SlowFirstProvider()
+    policy = HedgePolicy(initial_delay=0.05, fallback_model="gpt-3.5-turbo-16k")
+    llm = LLM("test_llm", provider=provider, hedge_policy=policy)
+    res = await asyncio.wait_for(llm.execute(), timeout=2)
+    assert res["model"] == "gpt-3.5-turbo-16k"
+    stats = policy.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["extra_prompt_tokens"] > 0
+
+    assert stats["extra_completion_tokens"] == 0
+
+
+@pytest.mark.asyncio
+async def test_llm_hedge_charges_loser_that_answered() -> None:
+    policy = HedgePolicy(initial_delay=0.05)
+    llm = LLM("test_llm", provider=StubbornFirstProvider(), hedge_policy=policy)
+    await asyncio.wait_for(llm.execute(), timeout=2)
+    await asyncio.sleep(0.05)
+    assert policy.stats()["hedge_wins"] == 1
+    assert policy.stats()["extra_completion_tokens"] == 7
+
+
+@pytest.mark.asyncio
+async def test_llm_hedge_outlives_cancelled_primary() -> None:
+    policy = HedgePolicy(initial_delay=0.05)
+    llm = LLM("test_llm", provider=CancelledFirstProvider(), hedge_policy=policy)
+    res = await asyncio.wait_for(llm.execute(), timeout=2)
+    assert res["choices"][0]["message"]["content"].startswith("Fake response 0")
+    assert policy.stats()["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_does_not_hedge_fast_request() -> None:
+    policy = HedgePolicy(initial_delay=1.0)
+    llm = LLM("test_llm", provider=FakeProvider(), hedge_policy=policy)
+    await llm.execute()
+    assert policy.stats()["hedges"] == 0
+    assert len(policy.latencies) == 1
+
+
+def test_limiter_aimd(clock) -> None:
+    limiter = AdaptiveLimiter(
+        initial_limit=4, max_limit=8, latency_threshold=2.0, clock=clock
+    )
+    # roughly +1 per limit's worth of successes
+    for _ in range(5):
+        limiter.on_success(0.1)
+    assert limiter.limit == 5
+    limiter.on_rate_limit()
+    assert limiter.limit == 2
+    # a burst of 429s within the interval is one congestion event
+    limiter.on_rate_limit()
+    assert limiter.limit == 2
+    clock.now = 5
+    limiter.on_success(3.0)
+    assert limiter.limit == 1
+    assert limiter.stats()["decreases"] == 2
+
+
+def test_limiter_bad_config() -> None:
+    with pytest.raises(ValueError, match="Limits must satisfy"):
+        AdaptiveLimiter(initial_limit=10, max_limit=5)
+    with pytest.raises(ValueError, match="Decrease factor"):
+        AdaptiveLimiter(decrease_factor=1.5)
+
+
+def test_limiter_across_event_loops() -> None:
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+
+    async def call() -> None:
+        async with limiter.slot():
+            await asyncio.sleep(0.01)
+
+    async def burst() -> None:
+        await asyncio.gather(*(call() for _ in range(3)))
+
+    # contended, so the second loop has to queue waiters too
+    asyncio.run(burst())
+    asyncio.run(burst())
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_cancellation_keeps_slots() -> None:
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    await limiter.acquire()
+    queued = [asyncio.ensure_future(limiter.acquire()) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert limiter.waiting == 2
+    # the first waiter is cancelled while queued, the second right after it
+    # was handed the slot
+    queued[0].cancel()
+    await asyncio.sleep(0)
+    limiter.release()
+    queued[1].cancel()
+    await asyncio.gather(*queued, return_exceptions=True)
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+    async with limiter.slot():
+        assert limiter.in_flight == 1
+    assert limiter.in_flight == 0
+
+
+def test_limiter_and_breaker_metrics(clock) -> None:
+    limiter = AdaptiveLimiter(initial_limit=3, name="metrics")
+    breaker = CircuitBreaker("metrics", window=2, min_calls=2, clock=clock)
+    text = exposition()
+    assert 'trellis_llm_concurrency_limit{limiter="metrics"} 3' in text
+    assert 'trellis_circuit_breaker_state{breaker="metrics",state="CLOSED"} 1' in text
+    breaker.record_failure()
+    breaker.record_failure()
+    limiter.on_rate_limit()
+    text = exposition()
+    assert 'trellis_llm_concurrency_limit{limiter="metrics"} 1' in text
+    assert 'trellis_circuit_breaker_state{breaker="metrics",state="OPEN"} 1' in text
+    assert 'trellis_circuit_breaker_state{breaker="metrics",state="CLOSED"} 0' in text
+    # reading the state for a scrape does not move the breaker on
+    clock.now = 60
+    assert 'breaker="metrics",state="HALF_OPEN"} 1' in exposition()
+    assert breaker._state.name == "OPEN"
+
+
+@pytest.mark.asyncio
+async def test_llm_respects_limiter() -> None:
+    provider = FakeProvider(latency=0.01)
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+    llms = [
+        LLM(f"LLM{i}", provider=provider, concurrency_limiter=limiter)
+        for i in range(10)
+    ]
+    await asyncio.gather(*(llm.execute() for llm in llms))
+    assert provider.max_in_flight == 2
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_llm_rate_limit_shrinks_limit() -> None:
+    limiter = AdaptiveLimiter(initial_limit=8)
+    llm = LLM(
+        "test_llm",
+        provider=FakeProvider(rate_limit_rate=1.0),
+        concurrency_limiter=limiter,
+        max_retries=1,
+    )
+    with pytest.raises(openai.error.RateLimitError):
+        await llm.execute()
+    assert limiter.limit == 4
+
+
+def test_batch_key_includes_resilience_settings() -> None:
+    backend = FakeProvider(seed=1)
+    breaker = CircuitBreaker("shared")
+    llms = [LLM(f"llm{i}", provider=backend, circuit_breaker=breaker) for i in range(2)]
+    assert llms[0].batch_key() == llms[1].batch_key()
+
+    llms[1].set_hedge_policy(HedgePolicy(initial_delay=0.1))
+    assert llms[0].batch_key() != llms[1].batch_key()
+    llms[1].set_hedge_policy(None)
+    llms[1].set_concurrency_limiter(AdaptiveLimiter(initial_limit=2))
+    assert llms[0].batch_key() != llms[1].batch_key()
+    llms[1].set_concurrency_limiter(None)
+    llms[1].set_circuit_breaker(CircuitBreaker("other"))
+    assert llms[0].batch_key() != llms[1].batch_key()
+    llms[1].set_circuit_breaker(breaker)
+    llms[1].set_fallback_model("gpt-4")
+    assert llms[0].batch_key() != llms[1].batch_key()
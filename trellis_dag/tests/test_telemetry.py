@@ -0,0 +1,140 @@
+import threading
+import time
+import pytest
+
+from trellis_dag import DAG, LLM, Node
+from trellis_dag.providers import FakeProvider
+from trellis_dag.utils.analyzer import Telemetry, set_telemetry, telemetry_disabled
+
+
+class RecordingClient:
+    def __init__(self) -> None:
+        self.events = []
+        self.threads = set()
+
+    def capture(self, distinct_id: str, name: str, properties: dict) -> None:
+        self.threads.add(threading.current_thread().name)
+        self.events.append((name, properties))
+
+
+def test_events_are_built_and_sent_off_thread() -> None:
+    client = RecordingClient()
+    telemetry = Telemetry(lambda: client, enabled=True, flush_interval=0.01)
+    telemetry.capture("node/added", {"id": "1"})
+    telemetry.capture("dag/execute", lambda: {"nodes": 2})
+    telemetry.flush()
+
+    assert client.events == [("node/added", {"id": "1"}), ("dag/execute", {"nodes": 2})]
+    assert client.threads == {"trellis-telemetry"}
+    assert telemetry.stats()["sent"] == 2
+    telemetry.shutdown()
+
+
+def test_disabled_is_a_no_op(monkeypatch) -> None:
+    def build() -> dict:
+        raise AssertionError("payload built while disabled")
+
+    monkeypatch.setenv("DISABLE_TELEMETRY", "1")
+    assert telemetry_disabled()
+    telemetry = Telemetry(RecordingClient)
+    telemetry.capture("dag/execute", build)
+    assert not telemetry.enabled
+    assert telemetry._thread is None
+    assert telemetry.stats()["enqueued"] == 0
+
+
+def test_sampling_drop_on_full_and_errors() -> None:
+    telemetry = Telemetry(RecordingClient, enabled=True, sample_rate=0.0)
+    for _ in range(10):
+        telemetry.capture("node/added", {})
+    assert telemetry.stats()["sampled_out"] == 10
+
+    release = threading.Event()
+
+    class BlockingClient(RecordingClient):
+        def capture(self, *args) -> None:
+            release.wait()
+            if args[1] == "bad":
+                raise RuntimeError("boom")
+
+    telemetry = Telemetry(BlockingClient, enabled=True, max_queue=2, batch_size=1)
+    for name in ["bad", "ok", "ok", "ok", "ok"]:
+        telemetry.capture(name, {})
+    release.set()
+    telemetry.flush()
+    stats = telemetry.stats()
+    assert stats["dropped"] >= 1
+    assert stats["errors"] == 1
+    assert stats["sent"] + stats["errors"] + stats["dropped"] == 5
+    telemetry.shutdown()
+
+
+def test_shutdown_does_not_block_on_a_full_queue() -> None:
+    release = threading.Event()
+
+    class HangingClient(RecordingClient):
+        def capture(self, *args) -> None:
+            release.wait()
+
+    telemetry = Telemetry(
+        HangingClient, enabled=True, max_queue=1, batch_size=1, flush_interval=0.01
+    )
+    for _ in range(3):
+        telemetry.capture("dag/execute", {})
+    start = time.monotonic()
+    telemetry.shutdown()
+    assert time.monotonic() - start < 2
+    release.set()
+
+
+@pytest.mark.asyncio
+async def test_run_events_are_snapshots() -> None:
+    class Topic(Node):
+        async def execute(self) -> dict:
+            self.set_output({"topic": "bridges"})
+            return self.output
+
+    release = threading.Event()
+
+    class BlockingClient(RecordingClient):
+        def capture(self, *args) -> None:
+            release.wait()
+            super().capture(*args)
+
+    client = BlockingClient()
+    telemetry = Telemetry(lambda: client, enabled=True, flush_interval=0.01)
+    previous = set_telemetry(telemetry)
+    try:
+        topic = Topic("topic")
+        llm = LLM(
+            "llm",
+            messages=[{"role": "user", "content": "About {topic}"}],
+            provider=FakeProvider(),
+        )
+        dag = DAG()
+        dag.add_node(topic)
+        dag.add_node(llm)
+        dag.add_edge(topic, llm)
+        await dag.execute({})
+        # changes made while the events wait on the queue don't leak into them
+        llm.set_input({"later": 1}, wipe=True)
+        dag.add_node(Topic("late"))
+        release.set()
+        telemetry.flush()
+    finally:
+        set_telemetry(previous)
+        telemetry.shutdown()
+
+    events = dict(client.events)
+    request = events["llm/chat_completion"]
+    assert request["input_keys"] == ["topic"]
+    assert request["messages"] == 1
+    assert request["choices"] == 1
+    assert request["llm.usage.total_tokens"] > 0
+    # one event for the DAG's nodes, not one per node; "late" was added after
+    assert events["dag/nodes_added"]["count"] == 2
+    assert "node/added" not in events
+    run = events["dag/execute"]
+    assert [n["name"] for n in run["nodes"]] == ["topic", "llm"]
+    assert all(n["status"] == "SUCCESS" for n in run["nodes"])
+    assert run["edges"] == [[topic.get_id(), llm.get_id()]]
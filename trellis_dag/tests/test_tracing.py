@@ -0,0 +1,177 @@
+import asyncio
+import io
+import json
+import time
+
+import openai
+import pytest
+
+from trellis_dag import DAG, LLM
+from trellis_dag.providers import FakeProvider
+from trellis_dag.utils.tracing import (
+    NOOP_SPAN,
+    ConsoleSpanExporter,
+    FileSpanExporter,
+    InMemorySpanExporter,
+    Tracer,
+    configure_tracing,
+    get_current_span,
+    set_tracer,
+    start_as_current_span,
+)
+
+
+class FlakyProvider(FakeProvider):
+    async def chat_completion(self, model, messages, **params):
+        if self.calls < 1:
+            self.calls += 1
+            raise openai.error.APIError("Fake provider error", None)
+        return await super().chat_completion(model, messages, **params)
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    configure_tracing(exporter)
+    yield exporter
+    set_tracer(None)
+
+
+def build_dag(dummy_node) -> tuple[DAG, LLM]:
+    dag = DAG()
+    llm = LLM("LLM1", provider=FlakyProvider(), retry_delay=0)
+    dag.add_node(llm)
+    dag.add_node(dummy_node)
+    dag.add_edge(llm, dummy_node)
+    return dag, llm
+
+
+@pytest.mark.asyncio
+async def test_run_node_and_attempt_spans_nest(exporter, dummy_node) -> None:
+    dag, llm = build_dag(dummy_node)
+    await dag.execute({})
+
+    by_name = {}
+    for span in exporter.spans:
+        by_name.setdefault(span.name, []).append(span)
+    (run,) = by_name["dag.run"]
+    assert run.parent_id is None and run.status == "OK"
+    nodes = {s.attributes["node.id"]: s for s in by_name["node"]}
+    assert set(nodes) == {llm.get_id(), dummy_node.get_id()}
+    assert all(s.parent_id == run.span_id for s in nodes.values())
+    assert all(s.trace_id == run.trace_id for s in exporter.spans)
+
+    node = nodes[llm.get_id()]
+    assert node.attributes["node.class"] == "LLM"
+    assert node.attributes["node.status"] == "SUCCESS"
+    assert node.attributes["llm.retries"] == 1
+    assert node.attributes["llm.usage.total_tokens"] > 0
+    failed, ok = by_name["llm.attempt"]
+    assert failed.parent_id == ok.parent_id == node.span_id
+    assert failed.status == "ERROR"
+    assert failed.events[0]["attributes"]["exception.type"] == "APIError"
+    assert ok.attributes["llm.retry_count"] == 1
+    assert ok.attributes["llm.model"] == "gpt-3.5-turbo"
+    assert ok.attributes["llm.usage.prompt_tokens"] > 0
+    assert ok.status == "OK"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_runs_get_their_own_traces(exporter, dummy_node) -> None:
+    dags = [build_dag(type(dummy_node)(f"dummy{i}"))[0] for i in range(3)]
+    await asyncio.gather(*(dag.execute({}) for dag in dags))
+
+    runs = {s.span_id: s for s in exporter.spans if s.name == "dag.run"}
+    assert len({s.trace_id for s in runs.values()}) == 3
+    for span in exporter.spans:
+        if span.name == "node":
+            assert runs[span.parent_id].trace_id == span.trace_id
+
+
+@pytest.mark.asyncio
+async def test_failed_node_span(exporter, dummy_node) -> None:
+    dag, llm = build_dag(dummy_node)
+    dummy_node.set_input_s({"missing": str})
+    with pytest.raises(ValueError):
+        await dag.execute({})
+
+    nodes = {s.attributes["node.id"]: s for s in exporter.spans if s.name == "node"}
+    failed = nodes[dummy_node.get_id()]
+    assert failed.status == "ERROR"
+    assert failed.attributes["node.status"] == "FAILED"
+    run = next(s for s in exporter.spans if s.name == "dag.run")
+    assert run.status == "ERROR"
+
+
+def test_exporters(tmp_path) -> None:
+    stream = io.StringIO()
+    tracer = Tracer(ConsoleSpanExporter(stream), service_name="svc")
+    with tracer.start_as_current_span("outer", {"a": 1}) as outer:
+        assert get_current_span() is outer
+        with tracer.start_as_current_span("inner"):
+            pass
+    # buffered until flushed
+    assert stream.getvalue() == ""
+    tracer.flush()
+    inner, outer = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert inner["parent_id"] == outer["context"]["span_id"]
+    assert outer["attributes"] == {"a": 1}
+    assert outer["resource"] == {"service.name": "svc"}
+
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(FileSpanExporter(str(path)))
+    with tracer.start_as_current_span("one"):
+        pass
+    tracer.shutdown()
+    assert json.loads(path.read_text())["name"] == "one"
+
+    with pytest.raises(ValueError, match="SpanExporter"):
+        Tracer("stdout")
+
+
+@pytest.mark.asyncio
+async def test_trace_file_and_exporter_share_spans(exporter, dummy_node, tmp_path):
+    dag, llm = build_dag(dummy_node)
+    path = tmp_path / "trace.json"
+    await dag.execute({}, trace_path=str(path))
+
+    events = json.loads(path.read_text())["traceEvents"]
+    lanes = {
+        e["args"]["node.id"]: e["tid"]
+        for e in events
+        if e["ph"] == "X" and e["cat"] == "node"
+    }
+    attempts = [e for e in events if e.get("name") == "llm.attempt"]
+    assert len(attempts) == 2 and all(e["tid"] == lanes[llm.get_id()] for e in attempts)
+    # node phases only go to the Chrome trace
+    assert {s.name for s in exporter.spans} == {"dag.run", "node", "llm.attempt"}
+    assert len(exporter.spans) == sum(
+        e["name"] in ("dag.run", "llm.attempt") or e["cat"] == "node"
+        for e in events
+        if e["ph"] == "X"
+    )
+
+
+def test_full_batch_exports_off_thread() -> None:
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(exporter, batch_size=2)
+    with tracer.start_as_current_span("one"):
+        pass
+    assert tracer.pending() == 1 and exporter.spans == []
+    with tracer.start_as_current_span("two"):
+        pass
+    for _ in range(100):
+        if exporter.spans:
+            break
+        time.sleep(0.01)
+    assert [s.name for s in exporter.spans] == ["one", "two"]
+
+    with pytest.raises(ValueError, match="positive"):
+        Tracer(exporter, batch_size=0)
+
+
+def test_disabled_is_a_no_op() -> None:
+    assert get_current_span() is NOOP_SPAN
+    with start_as_current_span("anything") as span:
+        assert span is NOOP_SPAN
+        span.set_attribute("a", 1)
@@ -1,16 +1,213 @@
-from posthog import Posthog
-from dotenv import load_dotenv
+from queue import Queue, Empty, Full
+from typing import Callable
+import threading
+import logging
+import atexit
+import random
 import time
 import os
 
-load_dotenv()
-p = Posthog(
-    project_api_key="phc_qLInS8phhqhE7IrHTMxfbm5yBiTSLz30mOQmsrgLaCD",
-    host="https://app.posthog.com",
+from .env import load_env
+from .constants import (
+    TELEMETRY_QUEUE_SIZE,
+    TELEMETRY_BATCH_SIZE,
+    TELEMETRY_FLUSH_INTERVAL,
+    TELEMETRY_SAMPLE_RATE,
 )
 
-def analyzer(name: str, _input: dict):
-    if os.getenv("DISABLE_TELEMETRY") == 1:
+_STOP = object()
+
+
+def _posthog_client() -> type:
+    # imported on the flusher thread, so apps that never send pay nothing
+    from posthog import Posthog
+
+    return Posthog(
+        project_api_key="phc_qLInS8phhqhE7IrHTMxfbm5yBiTSLz30mOQmsrgLaCD",
+        host="https://app.posthog.com",
+    )
+
+
+def telemetry_disabled() -> bool:
+    load_env()
+    return os.getenv("DISABLE_TELEMETRY", "").lower() in ("1", "true", "yes", "on")
+
+
+class Telemetry:
+    # events go on a bounded queue and are built and sent by a daemon thread;
+    # the caller only pays for a sampling check and a put_nowait
+    def __init__(
+        self,
+        client_factory: Callable[[], type] = _posthog_client,
+        enabled: bool = None,
+        sample_rate: float = TELEMETRY_SAMPLE_RATE,
+        max_queue: int = TELEMETRY_QUEUE_SIZE,
+        batch_size: int = TELEMETRY_BATCH_SIZE,
+        flush_interval: float = TELEMETRY_FLUSH_INTERVAL,
+    ) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"Sample rate {sample_rate} is not between 0 and 1")
+        if max_queue < 1 or batch_size < 1:
+            raise ValueError(
+                f"Queue size {max_queue} and batch size {batch_size} must be positive"
+            )
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.client_factory = client_factory
+        # None means decide from DISABLE_TELEMETRY on first use
+        self._enabled = enabled
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = Queue(maxsize=max_queue)
+        self._client = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.sent = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            self._enabled = not telemetry_disabled()
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled: bool) -> None:
+        self._enabled = enabled
+
+    def capture(self, name: str, payload: type) -> None:
+        # payload may be a zero-argument callable, evaluated on the flusher
+        # thread so serialization never happens on the caller's path
+        if not self.enabled:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), name, payload))
+            self.enqueued += 1
+        except Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="trellis-telemetry", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            stop = any(event is _STOP for event in batch)
+            self._send([event for event in batch if event is not _STOP])
+            for _ in batch:
+                self._queue.task_done()
+            if stop or (self._stop.is_set() and self._queue.empty()):
+                return
+
+    def _send(self, batch: list[tuple]) -> None:
+        if not batch:
+            return
+        try:
+            if self._client is None:
+                self._client = self.client_factory()
+        except Exception as e:
+            self.errors += len(batch)
+            self.logger.debug(f"Telemetry client unavailable: {e}")
+            return
+        for ts, name, payload in batch:
+            try:
+                properties = payload() if callable(payload) else payload
+                self._client.capture(str(int(ts)), name, properties)
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                self.logger.debug(f"Dropped telemetry event {name}: {e}")
+
+    def flush(self) -> None:
+        if self._thread is not None:
+            self._queue.join()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None or not thread.is_alive():
+            return
+        # never blocks: with the queue full the flusher drains it and then sees
+        # the stop flag; join's timeout bounds a client that hangs at exit
+        self._stop.set()
+        try:
+            self._queue.put_nowait(_STOP)
+        except Full:
+            pass
+        thread.join(timeout=max(1.0, self.flush_interval * 2))
+        if self._client is not None and hasattr(self._client, "flush"):
+            try:
+                self._client.flush()
+            except Exception:
+                pass
+
+    def stats(self) -> dict[str:int]:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "errors": self.errors,
+        }
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+
+def set_telemetry(telemetry: Telemetry) -> Telemetry:
+    global _telemetry
+    previous, _telemetry = _telemetry, telemetry
+    return previous
+
+
+def configure_telemetry(**kwargs) -> Telemetry:
+    # replaces the shared pipeline, flushing whatever the old one still holds
+    telemetry = Telemetry(**kwargs)
+    set_telemetry(telemetry).shutdown()
+    return telemetry
+
+
+def telemetry_enabled() -> bool:
+    # lets callers skip building a payload that would be thrown away
+    return _telemetry.enabled
+
+
+def analyzer(name: str, _input: type) -> None:
+    telemetry = _telemetry
+    if not telemetry.enabled:
         return
-    else:
-        p.capture(str(int(time.time())), name, _input)
+    telemetry.capture(name, _input)
@@ -0,0 +1,179 @@
+import logging
+import time
+import weakref
+from collections import deque
+from typing import Callable
+
+from .metrics import REGISTRY
+from .status import BreakerState
+
+# every live breaker, read when metrics are scraped
+_live = weakref.WeakSet()
+
+
+def _states() -> list[tuple[tuple, float]]:
+    # one sample per state, 1 for the current one, like a Prometheus enum
+    return [
+        ((breaker.name, state.name), int(breaker._peek_state() is state))
+        for breaker in list(_live)
+        for state in BreakerState
+    ]
+
+
+REGISTRY.collected(
+    "trellis_circuit_breaker_state",
+    "Circuit breaker states, 1 for the state each breaker is in.",
+    "gauge",
+    ("breaker", "state"),
+    _states,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call_threshold: float = None,
+        slow_call_rate: float = 0.8,
+        window: int = 20,
+        min_calls: int = 5,
+        open_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not 0 < failure_rate <= 1 or not 0 < slow_call_rate <= 1:
+            raise ValueError(
+                f"Rates {failure_rate} and {slow_call_rate} must be in (0, 1]"
+            )
+        if window < 1 or min_calls < 1 or half_open_max_calls < 1:
+            raise ValueError(
+                "window, min_calls and half_open_max_calls must be positive"
+            )
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min(min_calls, window)
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        # (failed, slow) per call, most recent last
+        self._calls = deque(maxlen=window)
+        self._state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.times_opened = 0
+        self.rejected = 0
+        _live.add(self)
+
+    def __repr__(self) -> str:
+        return f"CircuitBreaker(name={self.name}, state={self.get_state()})"
+
+    def _transition(self, state: BreakerState) -> None:
+        if state is self._state:
+            return
+        self.logger.warning(f"Circuit {self.name} {self._state.name} -> {state.name}")
+        self._state = state
+        if state is BreakerState.OPEN:
+            self._opened_at = self.clock()
+            self.times_opened += 1
+        elif state is BreakerState.CLOSED:
+            self._calls.clear()
+        self._probes = 0
+
+    def _peek_state(self) -> BreakerState:
+        # the state without acting on it, safe to read from another thread
+        if (
+            self._state is BreakerState.OPEN
+            and self.clock() - self._opened_at >= self.open_timeout
+        ):
+            return BreakerState.HALF_OPEN
+        return self._state
+
+    @property
+    def state(self) -> BreakerState:
+        state = self._peek_state()
+        if state is not self._state:
+            self._transition(state)
+        return self._state
+
+    def get_state(self) -> str:
+        return self.state.name
+
+    def allow(self) -> bool:
+        state = self.state
+        if state is BreakerState.CLOSED:
+            return True
+        if state is BreakerState.HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def before_call(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit {self.name} is open")
+
+    def record_success(self, latency: float = 0.0) -> None:
+        slow = (
+            self.slow_call_threshold is not None and latency >= self.slow_call_threshold
+        )
+        if self._state is BreakerState.HALF_OPEN:
+            self._transition(BreakerState.OPEN if slow else BreakerState.CLOSED)
+            return
+        self._calls.append((False, slow))
+        self._evaluate()
+
+    def record_failure(self, latency: float = 0.0) -> None:
+        if self._state is BreakerState.HALF_OPEN:
+            self._transition(BreakerState.OPEN)
+            return
+        self._calls.append((True, False))
+        self._evaluate()
+
+    def record_ignored(self) -> None:
+        # the call said nothing about provider health (e.g. a bad request),
+        # just give back the half open probe it was holding
+        if self._state is BreakerState.HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def _evaluate(self) -> None:
+        if self._state is not BreakerState.CLOSED or len(self._calls) < self.min_calls:
+            return
+        n = len(self._calls)
+        failures = sum(1 for failed, _ in self._calls if failed)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        if failures / n >= self.failure_rate or slow / n >= self.slow_call_rate:
+            self._transition(BreakerState.OPEN)
+
+    def stats(self) -> dict[str:type]:
+        n = len(self._calls)
+        return {
+            "name": self.name,
+            "state": self.get_state(),
+            "calls": n,
+            "failure_rate": sum(1 for f, _ in self._calls if f) / n if n else 0.0,
+            "slow_call_rate": sum(1 for _, s in self._calls if s) / n if n else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+_breakers = {}
+
+
+def get_breaker(name: str, **kwargs: dict) -> CircuitBreaker:
+    # one shared breaker per name, e.g. "openai" or "openai:gpt-4"
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, **kwargs)
+    return _breakers[name]
+
+
+def get_breakers() -> list[CircuitBreaker]:
+    return list(_breakers.values())
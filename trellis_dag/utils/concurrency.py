@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import logging
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from .metrics import REGISTRY
+
+# every live limiter, read when metrics are scraped
+_limiters = weakref.WeakSet()
+_limiter_ids = itertools.count(1)
+
+
+def _limits() -> list[tuple[tuple, float]]:
+    return [((limiter.name,), limiter.limit) for limiter in list(_limiters)]
+
+
+REGISTRY.collected(
+    "trellis_llm_concurrency_limit",
+    "Current in-flight call limit of each adaptive limiter.",
+    "gauge",
+    ("limiter",),
+    _limits,
+)
+
+
+class AdaptiveLimiter:
+    # additive increase / multiplicative decrease of the allowed in-flight calls,
+    # the same control loop TCP uses for its congestion window
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_threshold: float = None,
+        decrease_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = None,
+    ) -> None:
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(
+                f"Limits must satisfy 1 <= {min_limit} <= {initial_limit} <= {max_limit}"
+            )
+        if not 0 < decrease_factor < 1 or increase <= 0:
+            raise ValueError(
+                f"Decrease factor {decrease_factor} must be in (0, 1) and increase {increase} positive"
+            )
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.name = name if name is not None else f"limiter-{next(_limiter_ids)}"
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_threshold = latency_threshold
+        self.decrease_interval = decrease_interval
+        self.clock = clock
+        self._limit = float(initial_limit)
+        self._last_decrease = None
+        self._waiters = deque()
+        self._loop = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.increases = 0
+        self.decreases = 0
+        _limiters.add(self)
+
+    def __repr__(self) -> str:
+        return f"AdaptiveLimiter(name={self.name}, limit={self.limit}, in_flight={self.in_flight})"
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _get_waiters(self) -> deque:
+        # waiter futures are bound to one event loop, a limiter shared by
+        # several asyncio.run calls starts a new queue per loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._waiters = deque()
+            self._loop = loop
+        return self._waiters
+
+    def _wake(self) -> None:
+        # slots are handed over here, so a woken waiter already holds one
+        waiters = self._waiters
+        while waiters and self.in_flight < self.limit:
+            waiter = waiters.popleft()
+            # one cancelled but not yet resumed is skipped, it takes no slot
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self) -> None:
+        waiters = self._get_waiters()
+        if not waiters and self.in_flight < self.limit:
+            self.in_flight += 1
+            return
+        waiter = self._loop.create_future()
+        waiters.append(waiter)
+        self.waiting += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # cancelled after being handed a slot, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+            if waiter in waiters:
+                waiters.remove(waiter)
+
+    def release(self) -> None:
+        # synchronous, so a cancellation can't land between giving the slot
+        # back and waking the next waiter
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def _increase(self) -> None:
+        if self._limit >= self.max_limit:
+            return
+        before = self.limit
+        # +increase per limit's worth of successes, i.e. per round trip
+        self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+        # waiters are woken by the release that follows every call
+        if self.limit > before:
+            self.increases += 1
+
+    def _decrease(self, reason: str) -> None:
+        now = self.clock()
+        # one cut per interval, a burst of 429s is a single congestion event
+        if (
+            self._last_decrease is not None
+            and now - self._last_decrease < self.decrease_interval
+        ):
+            return
+        self._last_decrease = now
+        before = self.limit
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        self.decreases += 1
+        self.logger.warning(f"Concurrency limit {before} -> {self.limit} ({reason})")
+
+    def on_success(self, latency: float) -> None:
+        if self.latency_threshold is not None and latency > self.latency_threshold:
+            self._decrease(f"latency {latency:.3f}s")
+        else:
+            self._increase()
+
+    def on_rate_limit(self) -> None:
+        self._decrease("rate limited")
+
+    def on_error(self) -> None:
+        # failures are not a congestion signal, but they don't earn an increase
+        pass
+
+    def stats(self) -> dict[str:type]:
+        return {
+            "name": self.name,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
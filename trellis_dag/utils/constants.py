@@ -1,14 +1,7 @@
-import openai
 from os import getenv
+from voluptuous import Any, Optional
 
-max_retries = getenv("DEFAULT_MAX_RETRIES")
-retry_delay = getenv("DEFAULT_RETRY_DELAY")
-rate_limit_delay = getenv("DEFAULT_RATE_LIMIT_DELAY")
-
-DEFAULT_MAX_RETRIES = int(max_retries) if max_retries else 3
-DEFAULT_RETRY_DELAY: int = int(retry_delay) if retry_delay else 5
-DEFAULT_RATE_LIMIT_DELAY: int = int(rate_limit_delay) if rate_limit_delay else 60
-
+from .env import load_env
 
 OPENAI_MODELS = [
     "gpt-4",
@@ -20,6 +13,31 @@ OPENAI_MODELS = [
     "gpt-3.5-turbo-16k",
     "gpt-3.5-turbo-16k-0613",
 ]
+# context window (prompt + completion) in tokens for each of OPENAI_MODELS
+OPENAI_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-0613": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-32k-0613": 32768,
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-0613": 4096,
+    "gpt-3.5-turbo-16k": 16384,
+    "gpt-3.5-turbo-16k-0613": 16384,
+}
+# USD per 1K (prompt, completion) tokens, versioned names fall back to the base model
+OPENAI_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-3.5-turbo-16k": (0.003, 0.004),
+}
+# chat formatting overhead, see openai-cookbook "How to count tokens with tiktoken"
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3
+# completion room kept free when truncating a prompt without an explicit max_tokens
+DEFAULT_COMPLETION_RESERVE = 256
+TRUNCATION_STRATEGIES = ["drop_oldest", "trim_middle"]
 OPENAI_ARGS = {
     "functions": [],
     "function_call": "",
@@ -34,6 +52,7 @@ OPENAI_ARGS = {
     "logit_bias": {},
     "user": "",
 }
+LATENCY_DISTRIBUTIONS = ["constant", "uniform", "normal", "lognormal", "exponential"]
 OPENAI_RESPONSE_SCHEMA = {
     "id": str,
     "object": str,
@@ -55,14 +74,90 @@ OPENAI_RESPONSE_SCHEMA = {
         "total_tokens": int,
     },
 }
-EXCEPTIONS_TO_TEST = [
-    openai.error.InvalidRequestError("Mocked invalid request", "mocked_param"),
-    openai.error.AuthenticationError("Mocked authentication error", "mocked_param"),
-    openai.error.APIConnectionError("Mocked API connection error", "mocked_param"),
-    openai.error.APIError("Mocked API error", "mocked_param"),
-    openai.error.RateLimitError("Mocked rate limit error", "mocked_param"),
-    openai.error.Timeout("Mocked timeout", "mocked_param"),
-    openai.error.ServiceUnavailableError(
-        "Mocked service unavailable error", "mocked_param"
-    ),
-]
+OUTPUT_MODES = ["full", "slim"]
+CASSETTE_MODES = ["record", "replay", "auto"]
+CASSETTE_TIMINGS = ["recorded", "none"]
+MAX_LOG_PAYLOAD = 200
+TELEMETRY_QUEUE_SIZE = 1000
+TELEMETRY_BATCH_SIZE = 50
+TELEMETRY_FLUSH_INTERVAL = 1.0
+TELEMETRY_SAMPLE_RATE = 1.0
+DEFAULT_SPAN_BATCH_SIZE = 512
+NODE_PHASES = (
+    "queue_wait",
+    "pre_hook",
+    "validate_input",
+    "execute",
+    "post_hook",
+    "validate_output",
+    "propagate",
+)
+# deeper containers in a payload are counted as one opaque value
+PAYLOAD_SIZE_MAX_DEPTH = 32
+VALIDATION_LEVELS = ["full", "sampled", "edges-only", "off"]
+DEFAULT_VALIDATION_SAMPLE_RATE = 0.1
+# seconds; node and LLM request latencies range from microseconds to minutes
+DEFAULT_LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+DEFAULT_METRICS_PORT = 8000
+DEFAULT_PROFILE_TOP = 10
+# compact projection of a chat completion, validated without extra keys
+SLIM_RESPONSE_SCHEMA = {
+    "content": Any(str, None),
+    "finish_reason": Any(str, None),
+    "usage": {
+        "prompt_tokens": int,
+        "completion_tokens": int,
+        "total_tokens": int,
+    },
+    Optional("function_call"): {"name": str, "arguments": str},
+}
+# the entries below read the environment or import openai, so they are built
+# on first access instead of when the package is imported
+_ENV_DEFAULTS = {
+    "DEFAULT_MAX_RETRIES": 3,
+    "DEFAULT_RETRY_DELAY": 5,
+    "DEFAULT_RATE_LIMIT_DELAY": 60,
+}
+
+
+def _exceptions_to_test() -> list[Exception]:
+    import openai
+
+    return [
+        openai.error.InvalidRequestError("Mocked invalid request", "mocked_param"),
+        openai.error.AuthenticationError("Mocked authentication error", "mocked_param"),
+        openai.error.APIConnectionError("Mocked API connection error", "mocked_param"),
+        openai.error.APIError("Mocked API error", "mocked_param"),
+        openai.error.RateLimitError("Mocked rate limit error", "mocked_param"),
+        openai.error.Timeout("Mocked timeout", "mocked_param"),
+        openai.error.ServiceUnavailableError(
+            "Mocked service unavailable error", "mocked_param"
+        ),
+    ]
+
+
+def __getattr__(name: str) -> type:
+    if name in _ENV_DEFAULTS:
+        load_env()
+        value = getenv(name)
+        value = int(value) if value else _ENV_DEFAULTS[name]
+    elif name == "EXCEPTIONS_TO_TEST":
+        value = _exceptions_to_test()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
@@ -0,0 +1,12 @@
+_loaded = False
+
+
+def load_env() -> None:
+    # .env is read once, the first time something needs it, not at import
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    from dotenv import load_dotenv
+
+    load_dotenv()
@@ -1,15 +1,246 @@
-# write util function generate_data which takes in a voluptuous schema (for a dict)\
-# and returns a dict which matches the schema
-
-# this is how the input schema is set, from `Node`:
-#     def set_input(self, input: dict[str:Any], wipe=True) -> None:
-#         if not isinstance(input, dict):
-#             raise ValueError(f"Input {input} is not a valid dict")
-#         self.input = {**input, **self.input} if not wipe else input
-
-# this is how the input schema is validated, from `Node`:
-#     def validate_input(self) -> bool:
-#         try:
-#             return self._input_s(self.input)
-#         except Invalid as e:
-#             raise e
\ No newline at end of file
+import random
+import string
+from typing import get_args, get_origin
+
+from voluptuous import (
+    All,
+    Any,
+    Coerce,
+    In,
+    Invalid,
+    Length,
+    Range,
+    Schema,
+    Required,
+    PREVENT_EXTRA,
+)
+from voluptuous.schema_builder import Marker
+
+MAX_ATTEMPTS = 20
+_NUMBER_RANGE = 1000
+
+
+class _Generator:
+    def __init__(
+        self,
+        rng: random.Random,
+        string_length: int,
+        list_length: int,
+        max_depth: int,
+        optional_rate: float,
+    ) -> None:
+        self.rng = rng
+        self.string_length = string_length
+        self.list_length = list_length
+        self.max_depth = max_depth
+        self.optional_rate = optional_rate
+
+    def text(self, length: int = None) -> str:
+        length = self.string_length if length is None else length
+        return "".join(self.rng.choices(string.ascii_lowercase, k=length))
+
+    def free(self, depth: int) -> type:
+        # a value for an unconstrained slot, nested while depth allows
+        kinds = [str, int, float, bool]
+        if depth < self.max_depth:
+            kinds += [list, dict]
+        return self.value(self.rng.choice(kinds), depth)
+
+    def value(self, spec: type, depth: int = 0) -> type:
+        if isinstance(spec, Schema):
+            return self.value(spec.schema, depth)
+        if isinstance(spec, dict):
+            return self.mapping(spec, depth)
+        if isinstance(spec, (list, tuple)):
+            items = self.sequence(list(spec), depth)
+            return type(spec)(items)
+        if isinstance(spec, Marker):
+            return self.value(spec.schema, depth)
+        if isinstance(spec, type):
+            return self.instance(spec, depth)
+        if get_origin(spec) is not None:
+            return self.generic(spec, depth)
+        if isinstance(spec, Any):
+            return self.value(self.rng.choice(spec.validators), depth)
+        if isinstance(spec, All):
+            return self.all_of(spec, depth)
+        if isinstance(spec, In):
+            return self.rng.choice(list(spec.container))
+        if isinstance(spec, Range):
+            return self.in_range(spec)
+        if isinstance(spec, Coerce):
+            return self.instance(spec.type, depth)
+        if callable(spec):
+            raise ValueError(f"Cannot generate data for validator {spec}")
+        # literals validate by equality
+        return spec
+
+    def instance(self, kind: type, depth: int) -> type:
+        if kind is str:
+            return self.text()
+        if kind is bool:
+            return self.rng.random() < 0.5
+        if kind is int:
+            return self.rng.randint(-_NUMBER_RANGE, _NUMBER_RANGE)
+        if kind is float:
+            return self.rng.uniform(-_NUMBER_RANGE, _NUMBER_RANGE)
+        if kind is type(None):
+            return None
+        if kind is bytes:
+            return self.text().encode()
+        if kind is list:
+            if depth >= self.max_depth:
+                return []
+            return [self.free(depth + 1) for _ in range(self.list_length)]
+        if kind is dict:
+            if depth >= self.max_depth:
+                return {}
+            return {self.text(): self.free(depth + 1) for _ in range(self.list_length)}
+        try:
+            return kind()
+        except TypeError:
+            raise ValueError(f"Cannot generate data for type {kind}")
+
+    def generic(self, spec: type, depth: int) -> type:
+        origin, args = get_origin(spec), get_args(spec)
+        if origin is dict and len(args) == 2:
+            if depth >= self.max_depth:
+                return {}
+            return {
+                self.value(args[0], depth + 1): self.value(args[1], depth + 1)
+                for _ in range(self.list_length)
+            }
+        if origin in (list, set, frozenset) and args:
+            if depth >= self.max_depth:
+                return origin()
+            return origin(
+                self.value(args[0], depth + 1) for _ in range(self.list_length)
+            )
+        return self.instance(origin, depth)
+
+    def mapping(self, spec: dict, depth: int) -> dict:
+        data = {}
+        for key, value_spec in spec.items():
+            if isinstance(key, Marker) or not isinstance(key, type):
+                name = key.schema if isinstance(key, Marker) else key
+                # voluptuous keys are optional unless marked Required
+                if not isinstance(key, Required) and self.rng.random() >= (
+                    self.optional_rate
+                ):
+                    continue
+                data[name] = self.value(value_spec, depth + 1)
+            elif depth < self.max_depth:
+                # type keys, e.g. {str: int}, match any number of entries
+                for _ in range(self.list_length):
+                    data[self.value(key, depth + 1)] = self.value(value_spec, depth + 1)
+        return data
+
+    def sequence(self, specs: list, depth: int) -> list:
+        if not specs or depth >= self.max_depth:
+            return []
+        return [
+            self.value(self.rng.choice(specs), depth + 1)
+            for _ in range(self.list_length)
+        ]
+
+    def all_of(self, spec: All, depth: int) -> type:
+        validators = spec.validators
+        lengths = [v for v in validators if isinstance(v, Length)]
+        base = next((v for v in validators if not isinstance(v, Length)), str)
+        value = self.value(base, depth)
+        for length in lengths:
+            size = max(length.min or 0, min(len(value), length.max or len(value)))
+            if isinstance(value, str):
+                value = self.text(size)
+            elif isinstance(value, list):
+                value = (value * (size // max(1, len(value)) + 1))[:size]
+        return value
+
+    def in_range(self, spec: Range) -> type:
+        low = spec.min if spec.min is not None else -_NUMBER_RANGE
+        high = spec.max if spec.max is not None else low + 2 * _NUMBER_RANGE
+        if isinstance(low, int) and isinstance(high, int):
+            return self.rng.randint(low, high)
+        return self.rng.uniform(low, high)
+
+    def wrong(self, value: type) -> type:
+        # a value of a different type than `value`, voluptuous won't coerce it
+        if isinstance(value, str):
+            return self.rng.randint(0, _NUMBER_RANGE)
+        if isinstance(value, (list, dict, int, float)) or value is None:
+            return self.text()
+        return None
+
+    def near_miss(self, spec: type, data: type) -> type:
+        # one small, targeted mutation of valid data
+        if isinstance(spec, Schema):
+            spec = spec.schema
+        if not isinstance(spec, dict) or not isinstance(data, dict):
+            return self.wrong(data)
+        mutations = ["wrong_type", "extra_key"]
+        required = [k.schema for k in spec if isinstance(k, Required)]
+        if required:
+            mutations.append("missing_key")
+        mutation = self.rng.choice(mutations)
+        data = dict(data)
+        if mutation == "missing_key":
+            del data[self.rng.choice(required)]
+        elif mutation == "extra_key" or not data:
+            data[f"unexpected_{self.text(4)}"] = self.text()
+        else:
+            key = self.rng.choice(list(data))
+            specs = {
+                (k.schema if isinstance(k, Marker) else k): v for k, v in spec.items()
+            }
+            if key in specs and isinstance(data[key], dict):
+                data[key] = self.near_miss(specs[key], data[key])
+            else:
+                data[key] = self.wrong(data[key])
+        return data
+
+
+def generate_data(
+    schema: type,
+    string_length: int = 8,
+    list_length: int = 3,
+    max_depth: int = 3,
+    optional_rate: float = 1.0,
+    invalid: bool = False,
+    seed: int = None,
+) -> type:
+    # `schema` is a voluptuous Schema or the spec you'd pass to one; with
+    # invalid=True the result is a near miss that the schema rejects
+    if string_length < 0 or list_length < 0 or max_depth < 0:
+        raise ValueError(
+            f"Sizes must be >= 0, got {string_length}, {list_length}, {max_depth}"
+        )
+    if not 0 <= optional_rate <= 1:
+        raise ValueError(f"Optional rate {optional_rate} is not between 0 and 1")
+    spec = schema.schema if isinstance(schema, Schema) else schema
+    validator = (
+        schema if isinstance(schema, Schema) else Schema(spec, extra=PREVENT_EXTRA)
+    )
+    gen = _Generator(
+        random.Random(seed), string_length, list_length, max_depth, optional_rate
+    )
+    for _ in range(MAX_ATTEMPTS):
+        data = gen.value(spec)
+        if invalid:
+            data = gen.near_miss(spec, data)
+        try:
+            validator(data)
+            if not invalid:
+                return data
+        except Invalid:
+            if invalid:
+                return data
+    kind = "an invalid" if invalid else "a valid"
+    raise ValueError(f"Could not generate {kind} value for schema {spec}")
+
+
+def generate_input(node: type, **kwargs) -> dict[str:type]:
+    return generate_data(node._input_s, **kwargs)
+
+
+def generate_output(node: type, **kwargs) -> dict[str:type]:
+    return generate_data(node._output_s, **kwargs)
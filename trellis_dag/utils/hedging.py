@@ -0,0 +1,72 @@
+from collections import deque
+
+from .constants import OPENAI_MODELS
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200) -> None:
+        if window < 1:
+            raise ValueError(f"Window {window} must be positive")
+        self._latencies = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def record(self, latency: float) -> None:
+        self._latencies.append(latency)
+
+    def percentile(self, p: float) -> float:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        # nearest rank
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return ordered[idx]
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        initial_delay: float = None,
+        fallback_model: str = None,
+        window: int = 200,
+    ) -> None:
+        if not 0 < percentile <= 100:
+            raise ValueError(f"Percentile {percentile} is not in (0, 100]")
+        if fallback_model is not None and fallback_model not in OPENAI_MODELS:
+            raise ValueError(f"Model {fallback_model} is not a valid OpenAI model")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        # used until enough latencies are recorded, None means don't hedge yet
+        self.initial_delay = initial_delay
+        self.fallback_model = fallback_model
+        self.latencies = LatencyTracker(window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # what duplicates cost: the estimated prompt of every duplicate sent
+        # plus the completion of losers that answered anyway. A lower bound,
+        # a cancelled loser may be billed for output we never got to see
+        self.extra_prompt_tokens = 0
+        self.extra_completion_tokens = 0
+
+    def __repr__(self) -> str:
+        return f"HedgePolicy(percentile={self.percentile}, fallback_model={self.fallback_model})"
+
+    def delay(self) -> float:
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        return self.latencies.percentile(self.percentile)
+
+    def stats(self) -> dict[str:type]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+            "extra_prompt_tokens": self.extra_prompt_tokens,
+            "extra_completion_tokens": self.extra_completion_tokens,
+            "delay": self.delay(),
+        }
@@ -0,0 +1,89 @@
+import logging
+from os import getenv
+from reprlib import Repr
+
+from .constants import MAX_LOG_PAYLOAD
+from .env import load_env
+
+_repr = Repr()
+_repr.maxstring = MAX_LOG_PAYLOAD
+_repr.maxother = MAX_LOG_PAYLOAD
+_repr.maxdict = 20
+_repr.maxlist = 20
+_repr.maxlevel = 4
+
+
+class Payload:
+    # formatted only if a handler emits the record, and then truncated so a
+    # megabyte of LLM text doesn't end up in the log line
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: type, limit: int = MAX_LOG_PAYLOAD) -> None:
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = _repr.repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}...<{len(text) - self.limit} more chars>"
+
+    __repr__ = __str__
+
+
+class _Fields:
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: dict[str:type]) -> None:
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join(f"{k}={v}" for k, v in self.fields.items())
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields) -> None:
+    # fields stay typed on the record (record.event / record.fields) for
+    # structured handlers; the text form is only built when emitted
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(
+        level,
+        "%s %s",
+        event,
+        _Fields(fields),
+        extra={"event": event, "fields": fields},
+        stacklevel=2,
+    )
+
+
+def configure_logging(level: str = None) -> None:
+    # opt-in: importing trellis_dag leaves the application's logging alone
+    import logging.config
+
+    load_env()
+    config = {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {
+            "simple": {"format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"}
+        },
+        "handlers": {
+            "console_info": {
+                "class": "logging.StreamHandler",
+                "level": "DEBUG",
+                "formatter": "simple",
+                "stream": "ext://sys.stdout",
+            },
+            "console_error": {
+                "class": "logging.StreamHandler",
+                "level": "WARNING",
+                "formatter": "simple",
+                "stream": "ext://sys.stderr",
+            },
+        },
+        "root": {
+            "level": level or getenv("LOG_LEVEL") or "INFO",
+            "handlers": ["console_info", "console_error"],
+        },
+    }
+    logging.config.dictConfig(config)
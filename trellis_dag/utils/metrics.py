@@ -0,0 +1,366 @@
+import sys
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+from .constants import DEFAULT_LATENCY_BUCKETS, DEFAULT_METRICS_PORT
+from .schema import schema_cache_info
+
+# an in-process registry rendered in the Prometheus text exposition format
+# (https://prometheus.io/docs/instrumenting/exposition_formats/)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _label_order(item: tuple) -> tuple:
+    return tuple(map(str, item[0]))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(name={self.name}, labels={self.labelnames})"
+
+    def _key(self, labels: dict[str:type]) -> tuple:
+        # hot path, runs for every node; values are stringified at scrape time
+        if len(labels) == len(self.labelnames):
+            try:
+                return tuple([labels[name] for name in self.labelnames])
+            except KeyError:
+                pass
+        raise ValueError(
+            f"Metric {self.name} takes labels {self.labelnames}, got {tuple(labels)}"
+        )
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values = {}
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            (self.name, _format_labels(self.labelnames, key), value)
+            for key, value in sorted(items, key=_label_order)
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError(f"Counter {self.name} can only increase, got {amount}")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        buckets = sorted(buckets)
+        if not buckets or buckets != sorted(set(buckets)):
+            raise ValueError(f"Buckets {buckets} must be distinct and non-empty")
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        self.observe_many((value,), **labels)
+
+    def observe_many(self, values: list[float], **labels) -> None:
+        key = self._key(labels)
+        buckets = self.buckets
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per bucket counts (the last one is +Inf), then sum
+                state = self._values[key] = [[0] * (len(buckets) + 1), 0.0]
+            counts = state[0]
+            for value in values:
+                counts[bisect_left(buckets, value)] += 1
+                state[1] += value
+
+    def get(self, **labels) -> dict[str:float]:
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": sum(state[0]), "sum": state[1]}
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        with self._lock:
+            items = [(key, (list(c), s)) for key, (c, s) in self._values.items()]
+        samples = []
+        for key, (counts, total) in sorted(items, key=_label_order):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        _format_labels(self.labelnames, key, le),
+                        cumulative,
+                    )
+                )
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class _Collected:
+    # values read from elsewhere at scrape time, e.g. cache statistics
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        labelnames: tuple,
+        collect: Callable[[], list[tuple[tuple, float]]],
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        return [
+            (self.name, _format_labels(self.labelnames, key), value)
+            for key, value in sorted(self.collect())
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._metrics
+
+    def get(self, name: str) -> _Metric:
+        return self._metrics.get(name)
+
+    def _register(self, metric: _Metric) -> _Metric:
+        # asking twice for the same metric returns the first one
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or (
+            existing.labelnames != metric.labelnames
+        ):
+            raise ValueError(
+                f"Metric {metric.name} is already registered as {existing!r}"
+            )
+        return existing
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collected(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        labelnames: tuple,
+        collect: Callable[[], list[tuple[tuple, float]]],
+    ) -> None:
+        if kind not in ("counter", "gauge"):
+            raise ValueError(f"Collected metric kind {kind} is not counter or gauge")
+        self._register(_Collected(name, help, kind, labelnames, collect))
+
+    def clear(self) -> None:
+        # resets values, the metrics themselves stay registered
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, _Metric):
+                metric.clear()
+
+    def exposition(self) -> str:
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+NODE_EXECUTIONS = REGISTRY.counter(
+    "trellis_node_executions_total",
+    "Nodes that finished executing, by class and final status.",
+    ("node_class", "status"),
+)
+NODE_LATENCY = REGISTRY.histogram(
+    "trellis_node_duration_seconds",
+    "Time from a node starting to its output reaching its children.",
+    ("node_class",),
+)
+RUNS = REGISTRY.counter(
+    "trellis_dag_runs_total", "DAG runs that finished, by status.", ("status",)
+)
+RUN_LATENCY = REGISTRY.histogram(
+    "trellis_dag_run_duration_seconds", "Wall time of DAG.execute calls."
+)
+IN_FLIGHT_RUNS = REGISTRY.gauge(
+    "trellis_dag_runs_in_flight", "DAG.execute calls currently running."
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "trellis_llm_requests_total",
+    "LLM request attempts, by model and outcome (ok or the error type).",
+    ("model", "outcome"),
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "trellis_llm_request_duration_seconds",
+    "Latency of single LLM request attempts, retries excluded.",
+    ("model",),
+)
+LLM_RETRIES = REGISTRY.counter(
+    "trellis_llm_retries_total",
+    "LLM requests retried, by model and the error that caused the retry.",
+    ("model", "error"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "trellis_llm_tokens_total",
+    "Tokens reported by LLM responses, by model and kind.",
+    ("model", "kind"),
+)
+
+
+def _cache_samples(field: str) -> list[tuple[tuple, float]]:
+    samples = [(("schema",), schema_cache_info()[field])]
+    # only report cassettes when the application already loaded them
+    cassette = sys.modules.get("trellis_dag.providers.cassette")
+    if cassette is not None:
+        for path, stats in cassette.cassette_stats().items():
+            samples.append(((f"cassette:{path}",), stats[field]))
+    return samples
+
+
+REGISTRY.collected(
+    "trellis_cache_hits_total",
+    "Cache hits, for the compiled schema cache and each cassette.",
+    "counter",
+    ("cache",),
+    lambda: _cache_samples("hits"),
+)
+REGISTRY.collected(
+    "trellis_cache_misses_total",
+    "Cache misses, for the compiled schema cache and each cassette.",
+    "counter",
+    ("cache",),
+    lambda: _cache_samples("misses"),
+)
+
+
+def exposition(registry: MetricsRegistry = None) -> str:
+    return (registry or REGISTRY).exposition()
+
+
+def _handler(registry: MetricsRegistry) -> type:
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            body = registry.exposition().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            # scrapes every few seconds would flood stderr
+            pass
+
+    return MetricsHandler
+
+
+def start_metrics_server(
+    port: int = DEFAULT_METRICS_PORT,
+    addr: str = "127.0.0.1",
+    registry: MetricsRegistry = None,
+) -> type:
+    # serves the exposition on every path from a daemon thread; call
+    # .shutdown() on the returned server to stop it. http.server is only
+    # imported here, most processes never serve metrics
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((addr, port), _handler(registry or REGISTRY))
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="trellis-metrics", daemon=True
+    )
+    thread.start()
+    return server
@@ -0,0 +1,294 @@
+import os
+import random
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from .constants import DEFAULT_PROFILE_TOP
+
+# cProfile, pstats and tracemalloc are only imported once something is
+# profiled, dag.py imports this module for every application
+
+# tracemalloc is process wide: runs (and profilers) sharing it are counted so
+# the last one out stops it, and only if we were the ones who started it
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+# the cProfile.Profile enabled on each thread; only one can be active at a time
+# and Python 3.11 replaces an active one without complaint
+_active = threading.local()
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _started_tracing
+    import tracemalloc
+
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_users, _started_tracing
+    import tracemalloc
+
+    with _tracing_lock:
+        _tracing_users -= 1
+        # the application may be tracing too, its tracing is left alone
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def _memory_filters() -> tuple:
+    import tracemalloc
+
+    # allocations made by the profiling machinery itself are not the node's
+    return (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+
+def _function_name(key: tuple) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _hot_functions(profiles: list["cProfile.Profile"], top: int) -> list[dict]:
+    import pstats
+
+    profiles = [p for p in profiles if p.getstats()]
+    if not profiles:
+        return []
+    stats = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        stats.add(profile)
+    rows = [
+        {
+            "function": _function_name(key),
+            "calls": calls,
+            "self": self_time,
+            "cumulative": cumulative,
+        }
+        for key, (_, calls, self_time, cumulative, _) in stats.stats.items()
+        if "_lsprof.Profiler" not in key[2]
+    ]
+    rows.sort(key=lambda row: row["self"], reverse=True)
+    return rows[:top]
+
+
+class _NodeProfile:
+    __slots__ = (
+        "name",
+        "node_class",
+        "executions",
+        "phases",
+        "profile",
+        "allocated",
+        "peak",
+        "allocations",
+    )
+
+    def __init__(self, name: str, node_class: str) -> None:
+        import cProfile
+
+        self.name = name
+        self.node_class = node_class
+        self.executions = 0
+        # phase -> wall seconds spent under the profiler
+        self.phases = {}
+        # one profiler per node, enabled again for every execution
+        self.profile = cProfile.Profile()
+        self.allocated = 0
+        self.peak = 0
+        # "file:line" -> [bytes, blocks] allocated and still alive afterwards
+        self.allocations = {}
+
+    def add_allocations(self, diffs: list["tracemalloc.StatisticDiff"]) -> None:
+        for diff in diffs:
+            if diff.size_diff <= 0:
+                continue
+            frame = diff.traceback[0]
+            location = f"{frame.filename}:{frame.lineno}"
+            totals = self.allocations.setdefault(location, [0, 0])
+            totals[0] += diff.size_diff
+            totals[1] += diff.count_diff
+
+
+def _top_allocations(allocations: dict[str:list], top: int) -> list[dict]:
+    rows = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)
+    return [
+        {"location": location, "bytes": size, "blocks": blocks}
+        for location, (size, blocks) in rows[:top]
+    ]
+
+
+class NodeProfiler:
+    # opt-in cProfile + tracemalloc around selected nodes' execute calls and
+    # the edge functions they propagate through; results accumulate across
+    # runs, so one profiler can sample a long-lived DAG
+    def __init__(
+        self,
+        node_ids: list[str] = None,
+        classes: list[type] = None,
+        sample_rate: float = 1.0,
+        memory: bool = True,
+        top: int = DEFAULT_PROFILE_TOP,
+        seed: int = None,
+    ) -> None:
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"Sample rate {sample_rate} is not between 0 and 1")
+        if classes is not None and not all(isinstance(c, type) for c in classes):
+            raise ValueError(f"Classes {classes} must all be classes")
+        self.node_ids = set(node_ids) if node_ids is not None else None
+        self.classes = tuple(classes) if classes is not None else None
+        self.sample_rate = sample_rate
+        self.memory = memory
+        self.top = top
+        self.random = random.Random(seed)
+        self.nodes = {}
+        self.skipped = 0
+        # runs of this profiler holding tracemalloc on
+        self._tracing_runs = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"NodeProfiler(nodes={len(self.nodes)}, sample_rate={self.sample_rate})"
+
+    def selects(self, node: type) -> bool:
+        # nodes matching either filter (or every node, with none given),
+        # then sampled
+        if self.node_ids is not None or self.classes is not None:
+            by_id = self.node_ids is not None and node.get_id() in self.node_ids
+            by_class = self.classes is not None and isinstance(node, self.classes)
+            if not by_id and not by_class:
+                return False
+        return self.sample_rate >= 1 or self.random.random() < self.sample_rate
+
+    def start_run(self) -> None:
+        if self.memory:
+            _start_tracing()
+            with self._lock:
+                self._tracing_runs += 1
+
+    def stop_run(self) -> None:
+        # runs sharing this profiler may overlap, each drops its own hold
+        with self._lock:
+            if not self._tracing_runs:
+                return
+            self._tracing_runs -= 1
+        _stop_tracing()
+
+    def _entry(self, node: type) -> _NodeProfile:
+        node_id = node.get_id()
+        entry = self.nodes.get(node_id)
+        if entry is None:
+            entry = self.nodes[node_id] = _NodeProfile(
+                node.get_name(), type(node).__name__
+            )
+        return entry
+
+    @contextmanager
+    def measure(self, node: type, phase: str):
+        import tracemalloc
+
+        # another node (a concurrent one, maybe of another run) is being
+        # profiled on this thread, cProfile can't nest
+        if getattr(_active, "profile", None) is not None:
+            self.skipped += 1
+            yield
+            return
+        entry = self._entry(node)
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            filters = _memory_filters()
+            before = tracemalloc.take_snapshot().filter_traces(filters)
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        try:
+            entry.profile.enable()
+        except ValueError:
+            # the application's own profiler is active (Python 3.12+ says so)
+            self.skipped += 1
+            yield
+            return
+        _active.profile = entry.profile
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            entry.profile.disable()
+            _active.profile = None
+            entry.phases[phase] = entry.phases.get(phase, 0.0) + (
+                perf_counter() - start
+            )
+            if phase == "execute":
+                entry.executions += 1
+            # the application may have stopped tracing in the meantime
+            if memory and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                entry.allocated += current - baseline
+                entry.peak = max(entry.peak, peak - baseline)
+                after = tracemalloc.take_snapshot().filter_traces(filters)
+                entry.add_allocations(after.compare_to(before, "lineno"))
+
+    def report(self, top: int = None) -> dict[str:type]:
+        top = self.top if top is None else top
+        nodes = {}
+        classes = {}
+        for node_id, entry in self.nodes.items():
+            nodes[node_id] = {
+                "name": entry.name,
+                "class": entry.node_class,
+                "executions": entry.executions,
+                "phases": dict(entry.phases),
+                "functions": _hot_functions([entry.profile], top),
+                "allocated": entry.allocated,
+                "peak": entry.peak,
+                "allocations": _top_allocations(entry.allocations, top),
+            }
+            classes.setdefault(entry.node_class, []).append(entry)
+        by_class = {}
+        for node_class, entries in classes.items():
+            allocations = {}
+            for entry in entries:
+                for location, (size, blocks) in entry.allocations.items():
+                    totals = allocations.setdefault(location, [0, 0])
+                    totals[0] += size
+                    totals[1] += blocks
+            by_class[node_class] = {
+                "nodes": len(entries),
+                "executions": sum(e.executions for e in entries),
+                "functions": _hot_functions([e.profile for e in entries], top),
+                "allocated": sum(e.allocated for e in entries),
+                "peak": max(e.peak for e in entries),
+                "allocations": _top_allocations(allocations, top),
+            }
+        return {"nodes": nodes, "by_class": by_class, "skipped": self.skipped}
+
+    def format(self, top: int = None) -> str:
+        report = self.report(top)
+        lines = []
+        for node_class, data in sorted(report["by_class"].items()):
+            lines.append(
+                f"{node_class}: {data['nodes']} nodes, {data['executions']} executions, "
+                f"{data['allocated']} bytes retained, {data['peak']} bytes peak"
+            )
+            for row in data["functions"]:
+                lines.append(
+                    f"  {row['self']:10.6f}s self {row['cumulative']:10.6f}s cum "
+                    f"{row['calls']:8d} calls  {row['function']}"
+                )
+            for row in data["allocations"]:
+                lines.append(
+                    f"  {row['bytes']:10d} B {row['blocks']:8d} blocks  {row['location']}"
+                )
+        return "\n".join(lines)
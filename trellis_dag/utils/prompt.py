@@ -0,0 +1,93 @@
+from string import Formatter
+
+_formatter = Formatter()
+
+
+def _root_name(field_name: str) -> str:
+    # "{user.name}" and "{items[0]}" both need the "user" / "items" input key
+    for i, c in enumerate(field_name):
+        if c in ".[":
+            return field_name[:i]
+    return field_name
+
+
+class CompiledMessage:
+    __slots__ = ("role", "content", "extra", "variables", "_static", "_segments")
+
+    def __init__(self, message: dict[str:str]) -> None:
+        self.role = message["role"]
+        self.content = message["content"]
+        self.extra = tuple(
+            (k, v) for k, v in message.items() if k not in ("role", "content")
+        )
+        segments = []
+        variables = set()
+        nested = False
+        try:
+            for literal, field_name, format_spec, conversion in _formatter.parse(
+                self.content
+            ):
+                segments.append((literal, field_name, format_spec, conversion))
+                if field_name is not None:
+                    variables.add(_root_name(field_name))
+                    if format_spec and "{" in format_spec:
+                        nested = True
+        except ValueError:
+            # not a template (e.g. a JSON example with a lone brace), it's sent
+            # as written, like a template with a missing variable
+            segments = [(self.content, None, None, None)]
+            variables = set()
+        self.variables = frozenset(variables)
+        # text with no fields renders to its unescaped literal every time
+        self._static = "".join(s[0] for s in segments) if not variables else None
+        # nested format specs ("{x:{width}}") are rare, let str.format handle them
+        self._segments = None if nested else tuple(segments)
+
+    def render(self, input: dict[str:type]) -> dict[str:str]:
+        if not input:
+            content = self.content
+        elif self._static is not None:
+            content = self._static
+        elif not self.variables.issubset(input.keys()):
+            # keep the raw template when a variable is missing, like before
+            content = self.content
+        elif self._segments is None:
+            content = self.content.format(**input)
+        else:
+            parts = []
+            for literal, field_name, format_spec, conversion in self._segments:
+                if literal:
+                    parts.append(literal)
+                if field_name is None:
+                    continue
+                obj, _ = _formatter.get_field(field_name, (), input)
+                obj = _formatter.convert_field(obj, conversion)
+                parts.append(format(obj, format_spec))
+            content = "".join(parts)
+        msg = dict(self.extra)
+        msg["role"] = self.role
+        msg["content"] = content
+        return msg
+
+
+class PromptTemplate:
+    __slots__ = ("messages", "variables")
+
+    def __init__(self, messages: list[dict[str:str]]) -> None:
+        self.messages = tuple(CompiledMessage(msg) for msg in messages)
+        variables = set()
+        for msg in self.messages:
+            variables |= msg.variables
+        self.variables = frozenset(variables)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __repr__(self) -> str:
+        return f"PromptTemplate(messages={len(self.messages)}, variables={sorted(self.variables)})"
+
+    def missing_variables(self, input: dict[str:type]) -> frozenset[str]:
+        return self.variables.difference(input.keys())
+
+    def render(self, input: dict[str:type]) -> list[dict[str:str]]:
+        return [msg.render(input) for msg in self.messages]
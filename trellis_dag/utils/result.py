@@ -0,0 +1,19 @@
+from .timing import phase_totals
+
+
+class RunResult(list):
+    # the leaf outputs of a DAG run, as before, with run level data attached
+    def __init__(self, leaves: list[dict], run_id: str) -> None:
+        super().__init__(leaves)
+        self.run_id = run_id
+        self.usage = {}
+        # node id -> NodeTiming
+        self.timings = {}
+        # NodeProfiler.report() when the run was profiled
+        self.profile = None
+
+    def phase_totals(self) -> dict[str:float]:
+        return phase_totals(self.timings.values())
+
+    def __repr__(self) -> str:
+        return f"RunResult(run_id={self.run_id}, leaves={list.__repr__(self)})"
@@ -0,0 +1,212 @@
+from voluptuous import Schema, Required, PREVENT_EXTRA
+from voluptuous.schema_builder import UNDEFINED, Marker
+
+MAX_CACHED_SCHEMAS = 4096
+
+_schemas = {}
+_stats = {"hits": 0, "misses": 0}
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def _structure_key(spec: type) -> tuple:
+    # structurally equal specs map to the same key; types are part of the key
+    # so 1, 1.0 and True stay distinct
+    if isinstance(spec, dict):
+        items = [(_structure_key(k), _structure_key(v)) for k, v in spec.items()]
+        return (dict, tuple(sorted(items, key=repr)))
+    if isinstance(spec, (list, tuple)):
+        return (type(spec), tuple(_structure_key(v) for v in spec))
+    if isinstance(spec, (set, frozenset)):
+        return (type(spec), tuple(sorted((_structure_key(v) for v in spec), key=repr)))
+    if isinstance(spec, Marker):
+        # Required("a") == Optional("a") in voluptuous, so the class matters
+        return (
+            type(spec),
+            _structure_key(spec.schema),
+            spec.msg,
+            getattr(spec, "default", None),
+        )
+    try:
+        hash(spec)
+    except TypeError:
+        raise _Uncacheable()
+    return (type(spec), spec)
+
+
+def compile_schema(spec: type, extra: int = PREVENT_EXTRA) -> Schema:
+    # voluptuous compiles a validator per Schema, share them across nodes
+    try:
+        key = (_structure_key(spec), extra)
+    except _Uncacheable:
+        _stats["misses"] += 1
+        return Schema(spec, extra=extra)
+    schema = _schemas.get(key)
+    if schema is not None:
+        _stats["hits"] += 1
+        return schema
+    _stats["misses"] += 1
+    schema = Schema(spec, extra=extra)
+    if len(_schemas) < MAX_CACHED_SCHEMAS:
+        _schemas[key] = schema
+    return schema
+
+
+def schema_cache_info() -> dict[str:int]:
+    return {**_stats, "size": len(_schemas)}
+
+
+def clear_schema_cache() -> None:
+    _schemas.clear()
+    _stats["hits"] = _stats["misses"] = 0
+
+
+# static compatibility: True when every value matching `produced` also matches
+# `accepted`, False when no value can, None when we can't tell without data
+
+
+def _key_name(key: type) -> type:
+    return key.schema if isinstance(key, Marker) else key
+
+
+def _is_required(key: type) -> bool:
+    return isinstance(key, Required)
+
+
+def _needs_value(key: type) -> bool:
+    # a Required key with a default is filled in by voluptuous when missing
+    return _is_required(key) and key.default is UNDEFINED
+
+
+def _is_literal(key: type) -> bool:
+    # type keys like str and markers like Extra match many names, not one
+    return not callable(_key_name(key))
+
+
+def _same(a: type, b: type) -> bool:
+    try:
+        return _structure_key(a) == _structure_key(b)
+    except _Uncacheable:
+        return False
+
+
+def _check_dict(produced: dict, accepted: dict, partial: bool = False) -> bool:
+    # `partial` when other edges may supply the missing keys, i.e. at the top
+    # level of a child's input; a nested dict comes whole from one edge
+    if not all(_is_literal(key) for key in accepted) or not all(
+        _is_literal(key) for key in produced
+    ):
+        return None
+    accepted_keys = {}
+    for key, value in accepted.items():
+        try:
+            accepted_keys[_structure_key(_key_name(key))] = value
+        except _Uncacheable:
+            return None
+    result = True
+    produced_keys = {}
+    for key, value in produced.items():
+        try:
+            name = _structure_key(_key_name(key))
+        except _Uncacheable:
+            return None
+        produced_keys[name] = key
+        if name not in accepted_keys:
+            # an extra key only breaks validation if it's always there
+            if _is_required(key):
+                return False
+            result = None
+            continue
+        verdict = _compatible(value, accepted_keys[name])
+        if verdict is False and not _is_required(key):
+            verdict = None
+        if verdict is False:
+            return False
+        if verdict is None:
+            result = None
+    if partial:
+        return result
+    for key in accepted:
+        if not _needs_value(key):
+            continue
+        present = produced_keys.get(_structure_key(_key_name(key)))
+        if present is None:
+            return False
+        if not _is_required(present):
+            result = None
+    return result
+
+
+def check_compatible(
+    produced: type, accepted: type, extra: int = PREVENT_EXTRA
+) -> bool:
+    # `extra` is the accepting Schema's; anything but PREVENT_EXTRA lets keys
+    # through that we'd otherwise call a mismatch
+    if isinstance(produced, dict) and isinstance(accepted, dict):
+        verdict = _check_dict(produced, accepted, partial=True)
+    else:
+        verdict = _compatible(produced, accepted)
+    if verdict is False and extra != PREVENT_EXTRA:
+        return None
+    return verdict
+
+
+def _compatible(produced: type, accepted: type) -> bool:
+    if _same(produced, accepted):
+        return True
+    if accepted is dict:
+        if produced is dict or isinstance(produced, dict):
+            return True
+        if isinstance(produced, type) and not issubclass(produced, dict):
+            return False
+        return None
+    if isinstance(produced, dict) and isinstance(accepted, dict):
+        return _check_dict(produced, accepted)
+    if isinstance(produced, list) and isinstance(accepted, list):
+        if not produced or not accepted:
+            return None
+        for item in produced:
+            if not any(_compatible(item, a) for a in accepted):
+                return None
+        return True
+    if isinstance(accepted, type) and type(accepted) is type:
+        if isinstance(produced, type) and type(produced) is type:
+            if issubclass(produced, accepted):
+                return True
+            if issubclass(accepted, produced):
+                return None
+            return False
+        if isinstance(produced, (str, int, float, bool)):
+            return isinstance(produced, accepted)
+    return None
+
+
+def check_inputs(
+    produced: list[type], accepted: type, extra: int = PREVENT_EXTRA
+) -> bool:
+    # the child's input is the merge of what every incoming edge produces
+    if not produced:
+        return None
+    if len(produced) == 1 and not isinstance(accepted, dict):
+        return check_compatible(produced[0], accepted, extra)
+    if not isinstance(accepted, dict) or not all(isinstance(p, dict) for p in produced):
+        return None
+    result = True
+    for spec in produced:
+        verdict = check_compatible(spec, accepted, extra)
+        if verdict is False:
+            return False
+        if verdict is None:
+            result = None
+    required = [key for key in accepted if _is_required(key)]
+    for key in required:
+        name = _key_name(key)
+        if not any(
+            _is_required(k) and _same(_key_name(k), name)
+            for spec in produced
+            for k in spec
+        ):
+            return None
+    return result
@@ -1,7 +1,14 @@
 from enum import Enum
 
+
 class Status(Enum):
     PENDING = 0
     EXECUTING = 1
     SUCCESS = 2
-    FAILED = 3
\ No newline at end of file
+    FAILED = 3
+
+
+class BreakerState(Enum):
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
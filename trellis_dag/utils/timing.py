@@ -0,0 +1,75 @@
+from .constants import NODE_PHASES, PAYLOAD_SIZE_MAX_DEPTH
+
+
+def payload_size(value: type) -> int:
+    # approximate serialized size in bytes, without actually serializing
+    return _size(value, set(), PAYLOAD_SIZE_MAX_DEPTH)
+
+
+def _size(value: type, path: set, depth: int) -> int:
+    # `path` holds the containers we're inside of, a payload that contains
+    # itself is counted once instead of recursing forever
+    kind = type(value)
+    if kind is str or kind is bytes:
+        return len(value) + 2
+    if isinstance(value, (dict, list, tuple, set)):
+        if depth <= 0 or id(value) in path:
+            return 8
+        path.add(id(value))
+        size = 2 + len(value)
+        if isinstance(value, dict):
+            for key, item in value.items():
+                size += _size(key, path, depth - 1) + _size(item, path, depth - 1)
+        else:
+            for item in value:
+                size += _size(item, path, depth - 1)
+        path.discard(id(value))
+        return size
+    if isinstance(value, (str, bytes)):
+        return len(value) + 2
+    if value is None or kind is bool:
+        return 4
+    return 8
+
+
+class NodeTiming:
+    # seconds spent in each phase of one node execution, plus payload sizes
+    __slots__ = ("node_id", "name", "batch_size", "input_bytes", "output_bytes") + (
+        NODE_PHASES
+    )
+
+    def __init__(self, node_id: str, name: str) -> None:
+        self.node_id = node_id
+        self.name = name
+        self.batch_size = 1
+        # None unless sizes were asked for, they cost a walk of each payload
+        self.input_bytes = None
+        self.output_bytes = None
+        self.queue_wait = self.pre_hook = self.validate_input = self.execute = 0.0
+        self.post_hook = self.validate_output = self.propagate = 0.0
+
+    def __repr__(self) -> str:
+        return f"NodeTiming(node_id={self.node_id}, total={self.total:.6f})"
+
+    @property
+    def total(self) -> float:
+        return sum(getattr(self, phase) for phase in NODE_PHASES)
+
+    def to_dict(self) -> dict[str:type]:
+        return {
+            "node_id": self.node_id,
+            "name": self.name,
+            "batch_size": self.batch_size,
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+            **{phase: getattr(self, phase) for phase in NODE_PHASES},
+            "total": self.total,
+        }
+
+
+def phase_totals(timings: list[NodeTiming]) -> dict[str:float]:
+    totals = dict.fromkeys(NODE_PHASES, 0.0)
+    for timing in timings:
+        for phase in NODE_PHASES:
+            totals[phase] += getattr(timing, phase)
+    return totals
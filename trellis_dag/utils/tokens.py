@@ -0,0 +1,85 @@
+import re
+from math import ceil
+
+from .constants import (
+    OPENAI_CONTEXT_WINDOWS,
+    TOKENS_PER_MESSAGE,
+    TOKENS_PER_NAME,
+    TOKENS_PER_REPLY,
+    TRUNCATION_STRATEGIES,
+)
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+_TRIM_MARKER = "\n...\n"
+
+
+def estimate_tokens(text: str) -> int:
+    # offline approximation of cl100k_base: roughly 4 ascii chars per token,
+    # never fewer tokens than words + punctuation, non-ascii chars count as one each
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    by_chars = ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+    return max(by_chars, len(_PIECES.findall(text)))
+
+
+def estimate_message_tokens(messages: list[dict[str:str]]) -> int:
+    total = TOKENS_PER_REPLY
+    for msg in messages:
+        total += TOKENS_PER_MESSAGE
+        for k, v in msg.items():
+            if isinstance(v, str):
+                total += estimate_tokens(v)
+            if k == "name":
+                total += TOKENS_PER_NAME
+    return total
+
+
+def context_window(model: str) -> int:
+    if model not in OPENAI_CONTEXT_WINDOWS:
+        raise ValueError(f"Model {model} has no known context window")
+    return OPENAI_CONTEXT_WINDOWS[model]
+
+
+def _drop_oldest(messages: list[dict[str:str]], budget: int) -> list[dict[str:str]]:
+    # drop the oldest non-system turns, always keeping the latest message
+    messages = list(messages)
+    while estimate_message_tokens(messages) > budget:
+        idx = next(
+            (i for i, msg in enumerate(messages[:-1]) if msg.get("role") != "system"),
+            None,
+        )
+        if idx is None:
+            break
+        del messages[idx]
+    return messages
+
+
+def _trim_middle(messages: list[dict[str:str]], budget: int) -> list[dict[str:str]]:
+    # cut text out of the middle of the longest message until the prompt fits
+    messages = [dict(msg) for msg in messages]
+    while True:
+        excess = estimate_message_tokens(messages) - budget
+        if excess <= 0:
+            return messages
+        longest = max(messages, key=lambda m: len(m.get("content") or ""))
+        content = longest.get("content") or ""
+        # ~4 chars per token, plus the marker we insert
+        cut = min(len(content), excess * 4 + len(_TRIM_MARKER))
+        if cut <= len(_TRIM_MARKER) or len(content) <= len(_TRIM_MARKER):
+            return messages
+        keep = len(content) - cut
+        head, tail = keep // 2 + keep % 2, keep // 2
+        longest["content"] = (
+            content[:head] + _TRIM_MARKER + (content[-tail:] if tail else "")
+        )
+
+
+def truncate_messages(
+    messages: list[dict[str:str]], budget: int, strategy: str
+) -> list[dict[str:str]]:
+    if strategy not in TRUNCATION_STRATEGIES:
+        raise ValueError(f"Truncation strategy {strategy} is not valid")
+    if strategy == "drop_oldest":
+        return _drop_oldest(messages, budget)
+    return _trim_middle(messages, budget)
@@ -0,0 +1,444 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+# one span model for the whole package: a run span, a span per node on a lane
+# of its own, LLM attempts below those and, while a Chrome trace is being
+# written, each node's phases. A span goes to the sinks that were active when
+# it started, the run's TraceRecorder (execute(trace_path=...)) and the
+# configured Tracer (see tracing.py), so both outputs share one set of spans
+# and parent/child links
+
+_current = ContextVar("trellis_current_span", default=None)
+_recorder = ContextVar("trellis_trace_recorder", default=None)
+_tracer = None
+_otel = None
+
+
+def _new_id(bits: int) -> str:
+    return format(random.getrandbits(bits), f"0{bits // 4}x")
+
+
+def _otel_parent() -> tuple[str, str]:
+    # adopt the application's active OpenTelemetry span, if there is one, so
+    # our spans show up inside the service's own traces
+    global _otel
+    if _otel is None:
+        try:
+            from opentelemetry import trace
+
+            _otel = trace
+        except ImportError:
+            _otel = False
+    if not _otel:
+        return None
+    context = _otel.get_current_span().get_span_context()
+    if not context.is_valid:
+        return None
+    return format(context.trace_id, "032x"), format(context.span_id, "016x")
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "cat",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "lane",
+        "start_time",
+        "end_time",
+        "attributes",
+        "events",
+        "status",
+        "description",
+        "service_name",
+        "_start",
+        "_end",
+        "_sinks",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        cat: str,
+        trace_id: str,
+        parent_id: str,
+        lane: int,
+        attributes: dict[str:type],
+        sinks: tuple,
+    ) -> None:
+        self.name = name
+        self.cat = cat
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.lane = lane
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.attributes = dict(attributes) if attributes else {}
+        self.events = []
+        self.status = "UNSET"
+        self.description = None
+        self.service_name = None
+        self._start = perf_counter()
+        self._end = None
+        self._sinks = sinks
+
+    def __repr__(self) -> str:
+        return f"Span(name={self.name}, span_id={self.span_id}, status={self.status})"
+
+    @property
+    def duration(self) -> float:
+        if self._end is None:
+            return None
+        return self._end - self._start
+
+    def is_recording(self) -> bool:
+        return self.end_time is None
+
+    def set_attribute(self, key: str, value: type) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict[str:type]) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: dict[str:type] = None) -> None:
+        self.events.append(
+            {"name": name, "timestamp": time.time_ns(), "attributes": attributes or {}}
+        )
+
+    def set_status(self, status: str, description: str = None) -> None:
+        if status not in ("UNSET", "OK", "ERROR"):
+            raise ValueError(f"Span status {status} is not one of UNSET, OK or ERROR")
+        self.status = status
+        self.description = description
+
+    def record_exception(self, error: BaseException) -> None:
+        self.add_event(
+            "exception",
+            {
+                "exception.type": type(error).__name__,
+                "exception.message": str(error),
+            },
+        )
+
+    def end(self) -> None:
+        if self.end_time is not None:
+            return
+        self._end = perf_counter()
+        self.end_time = time.time_ns()
+        for sink in self._sinks:
+            sink.on_end(self)
+
+    def to_dict(self) -> dict[str:type]:
+        return {
+            "name": self.name,
+            "context": {"trace_id": self.trace_id, "span_id": self.span_id},
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "status": {"status_code": self.status, "description": self.description},
+            "attributes": self.attributes,
+            "events": self.events,
+            "resource": {"service.name": self.service_name},
+        }
+
+
+class _NoopSpan:
+    # handed out when nothing is traced so call sites need no checks
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "Span(noop)"
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: type) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict[str:type]) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: dict[str:type] = None) -> None:
+        pass
+
+    def set_status(self, status: str, description: str = None) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _NoopContext:
+    __slots__ = ()
+
+    def __enter__(self) -> _NoopSpan:
+        return NOOP_SPAN
+
+    def __exit__(self, exc_type: type, exc: BaseException, tb: type) -> None:
+        pass
+
+
+_NOOP_CONTEXT = _NoopContext()
+
+
+class TraceRecorder:
+    # a span sink writing Chrome trace-event "X" (complete) events; load the
+    # written file in chrome://tracing or ui.perfetto.dev
+    def __init__(self, name: str = "trellis") -> None:
+        self.name = name
+        self.events = []
+        self.origin = perf_counter()
+        self.pid = os.getpid()
+        self._lanes = {0: "dag"}
+        self._free = []
+        # span id -> span holding a lane of its own
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def now(self) -> float:
+        return (perf_counter() - self.origin) * 1e6
+
+    def open_lane(self, span: Span) -> int:
+        # overlapping nodes each get a lane, freed again when their span ends
+        with self._lock:
+            lane = self._free.pop() if self._free else len(self._lanes)
+            self._lanes[lane] = f"lane {lane}"
+            self._open[span.span_id] = span
+        return lane
+
+    def on_end(self, span: Span) -> None:
+        event = {
+            # node spans are all called "node", their lanes read better by name
+            "name": (
+                span.attributes.get("node.name", span.name)
+                if span.cat == "node"
+                else span.name
+            ),
+            "cat": span.cat,
+            "ph": "X",
+            "ts": (span._start - self.origin) * 1e6,
+            "dur": max(0.0, (span._end - span._start) * 1e6),
+            "pid": self.pid,
+            "tid": span.lane,
+        }
+        if span.attributes:
+            event["args"] = dict(span.attributes)
+        with self._lock:
+            self.events.append(event)
+            if self._open.pop(span.span_id, None) is not None:
+                self._free.append(span.lane)
+
+    def instant(self, name: str, cat: str, lane: int, args: dict) -> None:
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "i",
+            "s": "t",
+            "ts": self.now(),
+            "pid": self.pid,
+            "tid": lane,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def to_dict(self) -> dict[str:type]:
+        # spans still open (e.g. the node that failed) are closed at the end
+        for span in list(self._open.values()):
+            span.set_attribute("unfinished", True)
+            span.end()
+        meta = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "args": {"name": self.name},
+            }
+        ] + [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": lane,
+                "args": {"name": label},
+            }
+            for lane, label in sorted(self._lanes.items())
+        ]
+        return {"traceEvents": meta + self.events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, default=str)
+
+
+def _start(
+    name: str,
+    cat: str,
+    attributes: dict[str:type],
+    parent: Span,
+    sinks: tuple,
+    own_lane: bool,
+) -> Span:
+    parent = parent if isinstance(parent, Span) else _current.get()
+    if parent is not None:
+        span = Span(
+            name, cat, parent.trace_id, parent.span_id, parent.lane, attributes, sinks
+        )
+    else:
+        adopted = _otel_parent()
+        if adopted is not None:
+            span = Span(name, cat, adopted[0], adopted[1], 0, attributes, sinks)
+        else:
+            span = Span(name, cat, _new_id(128), None, 0, attributes, sinks)
+    for sink in sinks:
+        if isinstance(sink, TraceRecorder):
+            if own_lane:
+                span.lane = sink.open_lane(span)
+        else:
+            span.service_name = sink.service_name
+    return span
+
+
+def start_span(
+    name: str,
+    cat: str = "trellis",
+    attributes: dict[str:type] = None,
+    parent: Span = None,
+    own_lane: bool = False,
+):
+    # the parent defaults to the current span; the new span is not made
+    # current, see use_span
+    recorder = _recorder.get()
+    tracer = _tracer
+    if recorder is None and tracer is None:
+        return NOOP_SPAN
+    if recorder is None:
+        sinks = (tracer,)
+    elif tracer is None:
+        sinks = (recorder,)
+    else:
+        sinks = (recorder, tracer)
+    return _start(name, cat, attributes, parent, sinks, own_lane)
+
+
+@contextmanager
+def use_span(span: Span, end_on_exit: bool = False):
+    # makes `span` the parent of spans started in this context, including in
+    # tasks created inside it
+    if not isinstance(span, Span):
+        yield span
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        if span.status == "UNSET":
+            span.set_status("ERROR", f"{type(e).__name__}: {e}")
+        span.set_attribute("error.type", type(e).__name__)
+        span.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        if end_on_exit:
+            span.end()
+
+
+def start_as_current_span(
+    name: str, cat: str = "trellis", attributes: dict[str:type] = None
+):
+    if _recorder.get() is None and _tracer is None:
+        return _NOOP_CONTEXT
+    return use_span(start_span(name, cat, attributes), end_on_exit=True)
+
+
+class _Phase:
+    # a Chrome-trace-only detail span, never made current
+    __slots__ = ("recorder", "name", "cat", "parent", "args", "span")
+
+    def __init__(
+        self, recorder: TraceRecorder, name: str, cat: str, parent: Span, args: dict
+    ) -> None:
+        self.recorder = recorder
+        self.name = name
+        self.cat = cat
+        self.parent = parent
+        self.args = args
+
+    def __enter__(self) -> Span:
+        self.span = _start(
+            self.name, self.cat, self.args, self.parent, (self.recorder,), False
+        )
+        return self.span
+
+    def __exit__(self, exc_type: type, exc: BaseException, tb: type) -> None:
+        if exc_type is not None:
+            self.span.set_status("ERROR")
+            self.span.set_attribute("error.type", exc_type.__name__)
+        self.span.end()
+
+
+def span(name: str, cat: str = "trellis", parent: Span = None, **args):
+    # the fine grained phases only matter on a timeline, so they only exist
+    # while a run writes a Chrome trace; a shared no-op otherwise
+    recorder = _recorder.get()
+    if recorder is None:
+        return _NOOP_CONTEXT
+    return _Phase(recorder, name, cat, parent, args)
+
+
+def mark(name: str, cat: str = "trellis", **args) -> None:
+    current = _current.get()
+    if current is not None:
+        current.add_event(name, args)
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.instant(name, cat, current.lane if current is not None else 0, args)
+
+
+def get_current_span():
+    span = _current.get()
+    return span if span is not None else NOOP_SPAN
+
+
+def get_recorder() -> TraceRecorder:
+    return _recorder.get()
+
+
+@contextmanager
+def recording(recorder: TraceRecorder):
+    if recorder is None:
+        yield None
+        return
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def get_tracer() -> type:
+    return _tracer
+
+
+def set_tracer(tracer: type) -> type:
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
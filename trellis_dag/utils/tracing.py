@@ -0,0 +1,157 @@
+import atexit
+import json
+import sys
+import threading
+from typing import TextIO
+
+from .constants import DEFAULT_SPAN_BATCH_SIZE
+from .trace import (
+    NOOP_SPAN,
+    Span,
+    _start,
+    get_current_span,
+    get_tracer,
+    set_tracer,
+    start_as_current_span,
+    start_span,
+    use_span,
+)
+
+# OpenTelemetry-shaped export of trace.py's spans that needs no SDK: the run,
+# node and LLM attempt spans, exported as JSON lines
+
+__all__ = [
+    "NOOP_SPAN",
+    "Span",
+    "SpanExporter",
+    "InMemorySpanExporter",
+    "ConsoleSpanExporter",
+    "FileSpanExporter",
+    "Tracer",
+    "configure_tracing",
+    "get_current_span",
+    "get_tracer",
+    "set_tracer",
+    "start_as_current_span",
+    "start_span",
+    "use_span",
+]
+
+
+class SpanExporter:
+    def export(self, spans: list[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self) -> None:
+        self.spans = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+    def clear(self) -> None:
+        self.spans = []
+
+
+class ConsoleSpanExporter(SpanExporter):
+    def __init__(self, stream: TextIO = None) -> None:
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        stream = self.stream or sys.stdout
+        lines = "".join(
+            json.dumps(span.to_dict(), default=str) + "\n" for span in spans
+        )
+        with self._lock:
+            stream.write(lines)
+            stream.flush()
+
+
+class FileSpanExporter(ConsoleSpanExporter):
+    # one JSON span per line, appended, so several runs can share a file
+    def __init__(self, path: str) -> None:
+        super().__init__(open(path, "a"))
+        self.path = path
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self.stream.close()
+
+
+class Tracer:
+    # a span sink: finished spans are buffered and handed to the exporter in
+    # batches, from a worker thread once a batch fills up and otherwise at the
+    # end of each run (DAG.execute flushes off the event loop) or at exit
+    def __init__(
+        self,
+        exporter: SpanExporter = None,
+        service_name: str = "trellis",
+        batch_size: int = DEFAULT_SPAN_BATCH_SIZE,
+    ) -> None:
+        if exporter is not None and not isinstance(exporter, SpanExporter):
+            raise ValueError(f"Exporter {exporter} is not a valid SpanExporter")
+        if batch_size < 1:
+            raise ValueError(f"Batch size {batch_size} must be positive")
+        self.exporter = exporter if exporter is not None else ConsoleSpanExporter()
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def __repr__(self) -> str:
+        return f"Tracer(service_name={self.service_name}, exporter={self.exporter})"
+
+    def start_span(
+        self,
+        name: str,
+        attributes: dict[str:type] = None,
+        parent: Span = None,
+    ) -> Span:
+        return _start(name, "trellis", attributes, parent, (self,), False)
+
+    def start_as_current_span(self, name: str, attributes: dict[str:type] = None):
+        return use_span(self.start_span(name, attributes), end_on_exit=True)
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def on_end(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            threading.Thread(
+                target=self.flush, name="trellis-spans", daemon=True
+            ).start()
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        # exporters see whole batches one at a time, in order
+        with self._export_lock:
+            self.exporter.export(batch)
+
+    def shutdown(self) -> None:
+        self.flush()
+        self.exporter.shutdown()
+
+
+def configure_tracing(
+    exporter: SpanExporter = None, service_name: str = "trellis"
+) -> Tracer:
+    # replaces the shared tracer; configure_tracing(None) prints to stdout,
+    # set_tracer(None) turns tracing off again
+    tracer = Tracer(exporter, service_name)
+    previous = set_tracer(tracer)
+    if previous is not None:
+        previous.shutdown()
+    return tracer
@@ -0,0 +1,141 @@
+import time
+from collections import deque
+
+from .constants import OPENAI_PRICING
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    # longest priced prefix wins, so gpt-4-32k-0613 is priced as gpt-4-32k
+    base = max(
+        (m for m in OPENAI_PRICING if model == m or model.startswith(m + "-")),
+        key=len,
+        default=None,
+    )
+    if base is None:
+        return 0.0
+    prompt_price, completion_price = OPENAI_PRICING[base]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+class UsageRecord:
+    __slots__ = (
+        "timestamp",
+        "run_id",
+        "node_id",
+        "node_name",
+        "model",
+        "prompt_tokens",
+        "completion_tokens",
+        "cost",
+    )
+
+    def __init__(
+        self,
+        node_id: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        run_id: str = None,
+        node_name: str = None,
+        timestamp: float = None,
+    ) -> None:
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.run_id = run_id
+        self.node_id = node_id
+        self.node_name = node_name
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+    def __repr__(self) -> str:
+        return f"UsageRecord(node_id={self.node_id}, model={self.model}, total_tokens={self.prompt_tokens + self.completion_tokens})"
+
+    def to_dict(self) -> dict[str:type]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+def _empty_summary() -> dict[str:type]:
+    return {
+        "requests": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cost": 0.0,
+    }
+
+
+def summarize(records: list[UsageRecord], group_by: str = None) -> dict[str:type]:
+    if group_by not in (None, "node", "run", "model"):
+        raise ValueError(f"Cannot group usage by {group_by}")
+    attr = {"node": "node_id", "run": "run_id", "model": "model"}.get(group_by)
+    groups = {}
+    for r in records:
+        s = groups.setdefault(getattr(r, attr) if attr else None, _empty_summary())
+        s["requests"] += 1
+        s["prompt_tokens"] += r.prompt_tokens
+        s["completion_tokens"] += r.completion_tokens
+        s["total_tokens"] += r.prompt_tokens + r.completion_tokens
+        s["cost"] += r.cost
+    if attr is None:
+        return groups.get(None, _empty_summary())
+    return groups
+
+
+class UsageLedger:
+    def __init__(self, max_records: int = 100_000) -> None:
+        # oldest records fall off once the ledger is full
+        self.records = deque(maxlen=max_records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def record(
+        self,
+        node_id: str,
+        model: str,
+        usage: dict[str:int],
+        run_id: str = None,
+        node_name: str = None,
+        timestamp: float = None,
+    ) -> UsageRecord:
+        record = UsageRecord(
+            node_id,
+            model,
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+            run_id=run_id,
+            node_name=node_name,
+            timestamp=timestamp,
+        )
+        self.records.append(record)
+        return record
+
+    def query(
+        self,
+        since: float = None,
+        until: float = None,
+        run_id: str = None,
+        node_id: str = None,
+        model: str = None,
+    ) -> list[UsageRecord]:
+        return [
+            r
+            for r in self.records
+            if (since is None or r.timestamp >= since)
+            and (until is None or r.timestamp < until)
+            and (run_id is None or r.run_id == run_id)
+            and (node_id is None or r.node_id == node_id)
+            and (model is None or r.model == model)
+        ]
+
+    def summarize(
+        self, group_by: str = None, since: float = None, until: float = None, **filters
+    ) -> dict[str:type]:
+        return summarize(self.query(since, until, **filters), group_by)
+
+    def top(
+        self, n: int = 10, group_by: str = "node", key: str = "total_tokens", **filters
+    ) -> list[tuple]:
+        groups = self.summarize(group_by, **filters)
+        return sorted(groups.items(), key=lambda kv: kv[1][key], reverse=True)[:n]